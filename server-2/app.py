@@ -2,20 +2,42 @@ from flask import g
 from apscheduler.schedulers.background import BackgroundScheduler
 import pytz
 import logging
+import os
 import sqlite3
+import time
 import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+import click
 from flask_compress import Compress
 from flask_caching import Cache
-from scraping.ucsc_courses import scrape_all_courses, scrape_count
-from scraping.ratings import get_basic_professor_info
+import grade_aggregates
+from sqlite_pool import SQLITE_CACHE_SIZE, SQLITE_CACHED_STATEMENTS, SQLITE_MMAP_SIZE, data_version
+from scraping import class_api
+from scraping.archive import PageArchive
+from scraping.ucsc_courses import iter_all_courses, iter_archived_courses, scrape_count
+from scraping.terms import CURRENT_TERM, SCRAPE_TERMS
+from scraping.ratings import (
+    RMP_BATCH_SIZE,
+    get_basic_professor_info,
+    get_basic_professor_info_batch,
+    refresh_teacher_directory,
+)
 from helper_functions import (
     find_matching_instructor,
-    get_course_gpa,
+    iter_in_background,
     parse_prerequisites,
 )
-from config import app, db, slugtistics_db_path
-from models.data_models import CourseModel, LastUpdateModel
-from routes import courses_bp, init_prereq_dict
+from config import app, db, pisa_archive_path, slugtistics_db_path
+from models.data_models import (
+    CourseModel,
+    CourseFingerprintModel,
+    LastUpdateModel,
+    TermModel,
+)
+from routes import courses_bp, init_prereq_dict, served_courses, served_term
 
 # Initialize Flask extensions
 Compress(app)
@@ -26,8 +48,29 @@ logger = logging.getLogger(__name__)
 
 courses_cache = {}
 instructor_cache = {}
-gpa_cache = {}
+# enrichments in flight, instructor_cache isn't cleared under them
+enrichments_running = 0
+caches_lock = threading.Lock()
 scheduler = None
+page_archive = None
+slugtistics_wal = False
+# (data version of slugtistics.db, GradeBook), shared by every build thread
+grade_book = None
+grade_book_lock = threading.Lock()
+
+# how many scraped courses can wait for enrichment before the scraper pauses
+PIPELINE_BUFFER = 200
+
+# rows written between commits while a build is in progress, nobody reads an
+# unfinished build so there's no reason to hold one long write transaction
+BUILD_COMMIT_EVERY = 500
+
+# seat count/status refresh interval, turn it down during enrollment week
+STATUS_REFRESH_MINUTES = int(os.getenv("STATUS_REFRESH_MINUTES", 60))
+
+# where builds and status refreshes get their courses: "pisa" scrapes the
+# html listing, "api" pulls every subject from SCX_CLASS_LIST (scraping/class_api.py)
+COURSE_SOURCE = os.getenv("COURSE_SOURCE", "pisa")
 
 
 # initalize db tables
@@ -42,20 +85,44 @@ def init_db():
 
 
 # get the gpa tables
+# the build only reads them apart from the aggregate rebuild after a new grade
+# release (which takes its own write lock), so connections start deferred
+# instead of locking the db for writes, and WAL (a property of the file) is
+# only switched on once
 def get_slugtistics_db():
+    global slugtistics_wal
     if "slugtistics_db" not in g:
         g.slugtistics_db = sqlite3.connect(
             str(slugtistics_db_path),
             timeout=30,
             check_same_thread=False,
-            isolation_level="IMMEDIATE",
+            cached_statements=SQLITE_CACHED_STATEMENTS,
         )
-        g.slugtistics_db.execute("PRAGMA journal_mode=WAL")
-        g.slugtistics_db.execute("PRAGMA cache_size=-2000")
+        if not slugtistics_wal:
+            g.slugtistics_db.execute("PRAGMA journal_mode=WAL")
+            slugtistics_wal = True
+        g.slugtistics_db.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        g.slugtistics_db.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
         g.slugtistics_db.row_factory = sqlite3.Row
     return g.slugtistics_db
 
 
+# gpas and historical instructors of every course, read from the grade
+# aggregates once per version of the db no matter how many terms are building
+# at the same time. the lock also keeps term threads from rebuilding the
+# aggregates on top of each other
+def get_grade_book():
+    global grade_book
+    with grade_book_lock:
+        if grade_book is None or grade_book[0] != data_version(slugtistics_db_path):
+            slugtistics_db = get_slugtistics_db()
+            grade_aggregates.ensure_grade_aggregates(slugtistics_db)
+            # taken after the rebuild, which moves the version itself
+            version = data_version(slugtistics_db_path)
+            grade_book = (version, grade_aggregates.load_grade_book(slugtistics_db))
+        return grade_book[1]
+
+
 # close gpa tables when done
 @app.teardown_appcontext
 def close_slugtistics_db(exception=None):
@@ -64,151 +131,281 @@ def close_slugtistics_db(exception=None):
         db.close()
 
 
+# raw page archive the scrapers write to, None unless PISA_ARCHIVE is set
+def get_archive():
+    global page_archive
+    if page_archive is None and pisa_archive_path:
+        page_archive = PageArchive(pisa_archive_path)
+    return page_archive
+
+
 # this gets all the up to date info for class count, class status(open, closed, etc)
 # also changes discussion count
 # (free will to change it to whatever)
+# only classes that had discussion sections at the last build (or are new)
+# get their detail page fetched, everything else comes from the listing
 def update_course_statuses():
     logger.info("Updating course count and status")
     try:
         with app.app_context():
-            LastUpdateModel.query.delete()
+            # only the term being served, other terms get their counts daily
+            served = served_term(db.session)
+            term = served.term if served is not None else CURRENT_TERM
+            LastUpdateModel.query.filter_by(term=term).delete()
             clear_caches()
-            updated_courses = scrape_count()
+            existing_courses = {
+                str(course.enroll_num): course
+                for course in served_courses(db.session).all()
+            }
+            if COURSE_SOURCE == "api":
+                updated_courses = class_api.scrape_count(
+                    known_sections={
+                        enroll_num: course.discussion_sections or []
+                        for enroll_num, course in existing_courses.items()
+                    },
+                    archive=get_archive(),
+                    term=term,
+                )
+            else:
+                has_sections = {
+                    enroll_num: bool(course.discussion_sections)
+                    for enroll_num, course in existing_courses.items()
+                }
+                updated_courses = scrape_count(
+                    has_sections=has_sections, archive=get_archive(), term=term
+                )
             for course in updated_courses:
-                enroll_num = course.enroll_num
-                existing_course = CourseModel.query.filter_by(
-                    enroll_num=enroll_num
-                ).first()
+                existing_course = existing_courses.get(str(course.enroll_num))
                 if existing_course:
                     existing_course.class_status = course.class_status
                     existing_course.class_count = course.class_count
-                    existing_course.discussion_sections = course.discussion_sections
-            db.session.add(LastUpdateModel())
+                    # None when the detail page was skipped or failed
+                    if course.discussion_sections is not None:
+                        existing_course.discussion_sections = course.discussion_sections
+            db.session.add(LastUpdateModel(term=term))
             db.session.commit()
             logger.info("Course statuses updated successfully.")
     except Exception as e:
         logger.error(f"Trouble updating course statuses: {str(e)}")
 
 
+# detail page fingerprints from the term's last scrape, enroll_num -> fingerprint
+def load_fingerprints(term=CURRENT_TERM):
+    return {
+        row.enroll_num: {
+            "hash": row.content_hash,
+            "etag": row.etag,
+            "last_modified": row.last_modified,
+            "details": row.details,
+        }
+        for row in CourseFingerprintModel.query.filter_by(term=term).all()
+    }
+
+
+# only keep fingerprints for courses that are still listed
+def save_fingerprints(fingerprints, enroll_nums, term=CURRENT_TERM):
+    try:
+        CourseFingerprintModel.query.filter_by(term=term).delete()
+        for enroll_num in enroll_nums:
+            fingerprint = fingerprints.get(enroll_num)
+            if not fingerprint:
+                continue
+            db.session.add(
+                CourseFingerprintModel(
+                    term=term,
+                    enroll_num=enroll_num,
+                    content_hash=fingerprint["hash"],
+                    etag=fingerprint["etag"],
+                    last_modified=fingerprint["last_modified"],
+                    details=fingerprint["details"],
+                )
+            )
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Error saving detail page fingerprints: {str(e)}")
+        db.session.rollback()
+
+
+# rmp ratings for an instructor, what enrich_course uses unless told otherwise
+def fetch_instructor_ratings(matched_instructor, course):
+    instructor_ratings = get_basic_professor_info(matched_instructor, course.code)
+    return instructor_ratings.to_dict() if instructor_ratings else None
+
+
+# the instructor enrich_course would look up for a course, None when the
+# instructor_cache already has the answer
+def instructor_to_look_up(course, course_instructors):
+    teacher = course.instructor
+    if teacher == "Staff" or ("." not in teacher and teacher in instructor_cache):
+        return None
+    historical_instructors = course_instructors.get(course.code, [])
+    return find_matching_instructor(teacher, historical_instructors) or teacher
+
+
+# rmp ratings for every uncached instructor of a chunk of courses in a few
+# batched requests, returns a lookup_ratings for enrich_course that answers
+# from them (and falls back to fetch_instructor_ratings for anything else)
+def prefetch_instructor_ratings(courses, course_instructors):
+    lookups = {}
+    for course in courses:
+        matched_instructor = instructor_to_look_up(course, course_instructors)
+        if matched_instructor is not None:
+            lookups.setdefault((matched_instructor, course.code), None)
+
+    try:
+        results = get_basic_professor_info_batch(list(lookups))
+    except Exception as e:
+        logger.error(f"Error fetching instructor ratings: {str(e)}")
+        return fetch_instructor_ratings
+    for key, instructor_ratings in zip(list(lookups), results):
+        lookups[key] = instructor_ratings.to_dict() if instructor_ratings else None
+
+    def lookup_ratings(matched_instructor, course):
+        key = (matched_instructor, course.code)
+        if key in lookups:
+            return lookups[key]
+        return fetch_instructor_ratings(matched_instructor, course)
+
+    return lookup_ratings
+
+
+# instructor matching, ratings and gpa for one scraped course
+# returns the dict that ends up stored as a CourseModel row
+# grades: GradeBook the gpas come from
+# lookup_ratings(matched_instructor, course) replaces the rmp lookup
+def enrich_course(
+    course, grades, course_instructors, lookup_ratings=fetch_instructor_ratings
+):
+    teacher = course.instructor
+    course_code = course.code
+
+    matched_instructor = instructor_to_look_up(course, course_instructors)
+    if matched_instructor is not None:
+        try:
+            instructor_ratings = lookup_ratings(matched_instructor, course)
+        except Exception as e:
+            logger.error(f"Error fetching instructor ratings: {str(e)}")
+            instructor_ratings = None
+
+        instructor_cache[teacher] = (
+            matched_instructor,
+            instructor_ratings,
+        )
+
+    if teacher != "Staff":
+        matched_instructor, instructor_ratings = instructor_cache[teacher]
+    else:
+        matched_instructor, instructor_ratings = teacher, None
+
+    gpa = grades.gpa(course_code, matched_instructor)
+
+    if instructor_ratings and "." in matched_instructor:
+        try:
+            matched_instructor = instructor_ratings["name"]
+        except KeyError:
+            logger.warning(
+                f"No 'name' field found in instructor_ratings for {matched_instructor}"
+            )
+
+    return {
+        "code": course_code,
+        "name": course.name,
+        "ge": course.ge,
+        "instructor": matched_instructor,
+        "instructor_rating": instructor_ratings,
+        "gpa": gpa,
+        "schedule": course.schedule,
+        "location": course.location,
+        "enroll_num": course.enroll_num,
+        "class_status": course.class_status,
+        "class_count": course.class_count,
+        "link": course.link,
+        "class_type": course.class_type,
+        "description": course.description,
+        "class_notes": course.class_notes,
+        "enrollment_reqs": {
+            "description": course.enrollment_reqs,
+            "courses": parse_prerequisites(course.enrollment_reqs),
+        },
+        "discussion_sections": course.discussion_sections,
+        "credits": course.credits,
+        "career": course.career,
+        "grading": course.grading,
+        "course_type": course.course_type,
+    }
+
+
+# scrape -> enrich pipeline, yields one ready-made course dict at a time
+# the scraper runs on its own thread and can only get PIPELINE_BUFFER courses
+# ahead of enrichment, so scraping, rmp/gpa lookups and db writes all overlap
+# fingerprints: see load_fingerprints, updated in place by the scraper
+# courses: scraped courses to enrich instead of a fresh scrape of term
+# lookup_ratings: see enrich_course, rmp lookups (the default) are batched
+# RMP_BATCH_SIZE courses at a time
+def iter_enriched_courses(
+    fingerprints=None,
+    courses=None,
+    lookup_ratings=fetch_instructor_ratings,
+    term=CURRENT_TERM,
+):
+    global enrichments_running
+    # every gpa and the instructor list come out of the precomputed grade aggregates
+    grades = get_grade_book()
+    course_instructors = grades.course_instructors()
+
+    if courses is None:
+        iter_courses = (
+            class_api.iter_api_courses if COURSE_SOURCE == "api" else iter_all_courses
+        )
+        courses = iter_courses(
+            fingerprints=fingerprints, archive=get_archive(), term=term
+        )
+    scraped_courses = iter_in_background(courses, maxsize=PIPELINE_BUFFER)
+    with caches_lock:
+        enrichments_running += 1
+    try:
+        while chunk := list(islice(scraped_courses, RMP_BATCH_SIZE)):
+            chunk_lookup_ratings = lookup_ratings
+            if lookup_ratings is fetch_instructor_ratings:
+                chunk_lookup_ratings = prefetch_instructor_ratings(
+                    chunk, course_instructors
+                )
+            for course in chunk:
+                yield enrich_course(
+                    course, grades, course_instructors, chunk_lookup_ratings
+                )
+    finally:
+        # stops the scrape too if the build gave up on us early
+        scraped_courses.close()
+        with caches_lock:
+            enrichments_running -= 1
+
+
 # scraping all courses and getting gpa for each class and ratings as well
 # prob only need to do every day/two days, information won't change that much
 # scraping course count and status and discussion way more important
 # tentative, can maybe update even longer
+# full_refresh ignores the stored fingerprints and re-parses every detail page
+# note: store_courses_in_db streams straight from iter_enriched_courses instead
 @cache.cached(timeout=300, key_prefix="all_courses")
-def get_all_courses():
-    global courses_cache, instructor_cache, gpa_cache
+def get_all_courses(full_refresh=False):
+    global courses_cache
 
     if not courses_cache:
         logger.info("Cache miss - fetching all courses")
         try:
-            scraped_courses = scrape_all_courses()
-            slugtistics_db = get_slugtistics_db()
-
-            with slugtistics_db:
-                cursor = slugtistics_db.cursor()
-                cursor.execute(
-                    'SELECT DISTINCT "SubjectCatalogNbr", "Instructors" FROM GradeData'
-                )
-                historical_data = cursor.fetchall()
-                course_instructors = {}
-
-                for course_code, instructor in historical_data:
-                    if course_code not in course_instructors:
-                        course_instructors[course_code] = []
-                    course_instructors[course_code].append(instructor)
-
-                for course in scraped_courses:
-
-                    subject = course.code.split()[0]
-
-                    if subject not in courses_cache:
-                        courses_cache[subject] = []
-
-                    teacher = course.instructor
-                    course_code = course.code
-                    print(course_code)
-
-                    if teacher != "Staff" and (
-                        "." in teacher or teacher not in instructor_cache
-                    ):
-                        historical_instructors = course_instructors.get(course_code, [])
-                        matched_instructor = (
-                            find_matching_instructor(teacher, historical_instructors)
-                            or teacher
-                        )
-
-                        try:
-                            instructor_ratings = get_basic_professor_info(
-                                matched_instructor, course_code
-                            )
-                            instructor_ratings = (
-                                instructor_ratings.to_dict()
-                                if instructor_ratings
-                                else None
-                            )
-                        except Exception as e:
-                            logger.error(f"Error fetching instructor ratings: {str(e)}")
-                            instructor_ratings = None
-
-                        instructor_cache[teacher] = (
-                            matched_instructor,
-                            instructor_ratings,
-                        )
-
-                    if teacher != "Staff":
-                        matched_instructor, instructor_ratings = instructor_cache[
-                            teacher
-                        ]
-                    else:
-                        matched_instructor, instructor_ratings = teacher, None
-
-                    gpa_key = (course_code, matched_instructor)
-
-                    if gpa_key not in gpa_cache:
-                        gpa_cache[gpa_key] = get_course_gpa(
-                            cursor, course_code, matched_instructor
-                        )
-
-                    if instructor_ratings and "." in matched_instructor:
-                        try:
-                            matched_instructor = instructor_ratings["name"]
-                        except KeyError:
-                            logger.warning(
-                                f"No 'name' field found in instructor_ratings for {matched_instructor}"
-                            )
-
-                    course_info = {
-                        "code": course_code,
-                        "name": course.name,
-                        "ge": course.ge,
-                        "instructor": matched_instructor,
-                        "instructor_rating": instructor_ratings,
-                        "gpa": gpa_cache[gpa_key],
-                        "schedule": course.schedule,
-                        "location": course.location,
-                        "enroll_num": course.enroll_num,
-                        "class_status": course.class_status,
-                        "class_count": course.class_count,
-                        "link": course.link,
-                        "class_type": course.class_type,
-                        "description": course.description,
-                        "class_notes": course.class_notes,
-                        "enrollment_reqs": {
-                            "description": course.enrollment_reqs,
-                            "courses": parse_prerequisites(course.enrollment_reqs),
-                        },
-                        "discussion_sections": course.discussion_sections,
-                        "credits": course.credits,
-                        "career": course.career,
-                        "grading": course.grading,
-                        "course_type": course.course_type,
-                    }
-                    # stores by subject
-                    # so {cse: cse 101, cse 30, etc}
-                    # not exact values but example
-                    courses_cache[subject].append(course_info)
-
-            logger.info(f"Successfully cached {len(scraped_courses)} courses")
+            fingerprints = {} if full_refresh else load_fingerprints(CURRENT_TERM)
+            enroll_nums = []
+            for course_info in iter_enriched_courses(fingerprints, term=CURRENT_TERM):
+                # stores by subject
+                # so {cse: cse 101, cse 30, etc}
+                # not exact values but example
+                subject = course_info["code"].split()[0]
+                courses_cache.setdefault(subject, []).append(course_info)
+                enroll_nums.append(course_info["enroll_num"])
+            save_fingerprints(fingerprints, enroll_nums, CURRENT_TERM)
+
+            logger.info(f"Successfully cached {len(enroll_nums)} courses")
 
         except Exception as e:
             logger.error(f"Error in get_all_courses: {str(e)}")
@@ -218,103 +415,327 @@ def get_all_courses():
 
 
 # clear all cache
+# the status refresh and term switches can call this while builds are still
+# enriching, instructor_cache is left alone then (enrich_course reads back
+# what it just put in it) and build_all_terms clears it once they're all done
 def clear_caches():
-    global courses_cache, instructor_cache, gpa_cache
-    courses_cache = {}
-    instructor_cache = {}
-    gpa_cache = {}
+    global courses_cache
+    with caches_lock:
+        courses_cache = {}
+        if enrichments_running:
+            logger.info("Build in progress, keeping the instructor cache")
+        else:
+            instructor_cache.clear()
     cache.clear()
     logger.info("All caches cleared")
 
 
-# store all of the ready-made courses to db to use
-def store_courses_in_db():
+# turn one enriched course dict into a CourseModel row of a term's build
+def build_course_model(course, term=None, build=None):
+    subject, catalog_num = course["code"].strip().split(" ", 1)
+
+    has_enrollment_reqs = bool(
+        course.get("enrollment_reqs", {}).get("description", "").strip()
+    )
+
+    return CourseModel(
+        term=term,
+        build=build,
+        ge=course["ge"],
+        subject=subject,
+        catalog_num=catalog_num,
+        name=course["name"],
+        instructor=course["instructor"],
+        link=course["link"],
+        class_count=course["class_count"],
+        enroll_num=course["enroll_num"],
+        class_type=course.get("class_type", ""),
+        schedule=course["schedule"],
+        location=course["location"],
+        gpa=course["gpa"],
+        instructor_ratings=course["instructor_rating"],
+        class_status=course["class_status"],
+        description=course["description"],
+        class_notes=course["class_notes"],
+        enrollment_reqs=course["enrollment_reqs"],
+        discussion_sections=course["discussion_sections"],
+        credits=course["credits"],
+        career=course["career"],
+        grading=course["grading"],
+        course_type=course["course_type"],
+        has_enrollment_reqs=has_enrollment_reqs,
+    )
+
+
+# term builds: every scrape of a term is written as a new build (rows tagged
+# with term + build id) next to the build being served, and only once it's
+# complete does the term's pointer move over to it, in one small commit.
+# the routes read through that pointer, so a build never serves half a term
+# and a term switch is just flipping TermModel.is_active
+def start_build(term):
+    build = int(time.time())
+    record = db.session.get(TermModel, term)
+    if record is None:
+        record = TermModel(term=term, status="building")
+        db.session.add(record)
+
+    # leftovers of a build that died half way
+    if record.building is not None:
+        CourseModel.query.filter(
+            CourseModel.term == term, CourseModel.build == record.building
+        ).delete()
+
+    record.building = build
+    if record.build is None:
+        record.status = "building"
+    db.session.commit()
+    return build
+
+
+# activate: serve this term once the build is in, None = only if it is
+# CURRENT_TERM or nothing is being served yet
+def finish_build(term, build, course_count, activate=None):
+    record = db.session.get(TermModel, term)
+    previous = record.build
+    record.build = build
+    record.building = None
+    record.status = "ready"
+    record.course_count = course_count
+
+    LastUpdateModel.query.filter_by(term=term).delete()
+    db.session.add(LastUpdateModel(term=term))
+
+    if activate is None:
+        active = TermModel.query.filter_by(is_active=True).first()
+        activate = term == CURRENT_TERM or active is None
+    if activate:
+        TermModel.query.filter(TermModel.term != term).update({"is_active": False})
+        record.is_active = True
+    db.session.commit()
+
+    # the old build is unreachable now
+    if previous is not None and previous != build:
+        CourseModel.query.filter(
+            CourseModel.term == term, CourseModel.build == previous
+        ).delete()
+    # rows from before terms were tracked
+    CourseModel.query.filter(CourseModel.term.is_(None)).delete()
+    db.session.commit()
+    logger.info(
+        f"Term {term} build {build} is ready ({course_count} courses)"
+        + (", now serving it" if record.is_active else "")
+    )
+
+
+def abandon_build(term, build):
+    db.session.rollback()
+    CourseModel.query.filter(
+        CourseModel.term == term, CourseModel.build == build
+    ).delete()
+    record = db.session.get(TermModel, term)
+    if record is not None:
+        record.building = None
+        if record.build is None:
+            record.status = "failed"
+    db.session.commit()
+
+
+# serve a term that already has a finished build, returns False if it has none
+def activate_term(term):
+    record = db.session.get(TermModel, term)
+    if record is None or record.build is None:
+        return False
+    TermModel.query.filter(TermModel.term != term).update({"is_active": False})
+    record.is_active = True
+    db.session.commit()
+    clear_caches()
+    logger.info(f"Now serving term {term}")
+    return True
+
+
+# write enriched courses as rows of a build, returns the stored enroll_nums
+def write_course_rows(courses, term, build):
+    enroll_nums = []
+
+    # courses come out of the scrape -> enrich pipeline one at a time
+    # and go straight into the session
+    for course in courses:
+        try:
+            db.session.add(build_course_model(course, term, build))
+            enroll_nums.append(course["enroll_num"])
+            # the build isn't served until finish_build, so rows can be
+            # committed as we go instead of holding the term in one transaction
+            if len(enroll_nums) % BUILD_COMMIT_EVERY == 0:
+                db.session.commit()
+        # exceptions, ignore
+        except Exception as e:
+            logger.error(f"Error processing course: {str(e)}")
+            continue
+
+    db.session.commit()
+    return enroll_nums
+
+
+# scrape (or re-parse) courses into a new build of term and switch to it
+# returns the stored enroll_nums, [] if nothing was stored
+def build_term(term, courses, activate=None):
+    build = start_build(term)
+    try:
+        enroll_nums = write_course_rows(courses, term, build)
+    except Exception:
+        abandon_build(term, build)
+        raise
+
+    # logger, ignore
+    if not enroll_nums:
+        logger.warning(f"No courses found to store for term {term}")
+        abandon_build(term, build)
+        return enroll_nums
+
+    finish_build(term, build, len(enroll_nums), activate)
+    # logs and exceptions, ignore from here
+    logger.info(f"Successfully stored {len(enroll_nums)} courses in database")
+    return enroll_nums
+
+
+def term_is_ready(term):
+    with app.app_context():
+        record = db.session.get(TermModel, term)
+        return record is not None and record.build is not None
+
+
+def _store_term(term, full_refresh=False):
+    with app.app_context():
+        try:
+            fingerprints = {} if full_refresh else load_fingerprints(term)
+            enroll_nums = build_term(
+                term, iter_enriched_courses(fingerprints, term=term)
+            )
+            if enroll_nums:
+                save_fingerprints(fingerprints, enroll_nums, term)
+
+        except Exception as e:
+            logger.error(f"Error storing courses for term {term}: {str(e)}")
+            db.session.rollback()
+            raise
+
+
+# store all of the ready-made courses of a term to db to use
+# pass full_refresh=True to re-download and re-parse every detail page
+def store_courses_in_db(full_refresh=False, term=CURRENT_TERM):
     # logger ignore
-    logger.info("Starting scheduled course storage process...")
+    logger.info(f"Starting scheduled course storage process for term {term}...")
     # clearing cache to work with new info
     clear_caches()
+    _store_term(term, full_refresh)
+
+
+# daily job: build every term in SCRAPE_TERMS at the same time, the served
+# one keeps being served until its new build is done and the upcoming one
+# is ready (ratings and gpa caches warm from the same run) before it's needed
+def build_all_terms(full_refresh=False):
+    logger.info(f"Building terms {SCRAPE_TERMS}...")
+    clear_caches()
+
+    with ThreadPoolExecutor(max_workers=len(SCRAPE_TERMS)) as executor:
+        builds = {
+            term: executor.submit(_store_term, term, full_refresh)
+            for term in SCRAPE_TERMS
+        }
+        for term, future in builds.items():
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Build of term {term} failed: {str(e)}")
+
+    # routes and caches pick up whatever got flipped
+    clear_caches()
+
+
+# rebuild a term from the page archive after a parser fix
+# parsing + gpa only: ratings are carried over from the served rows (by
+# enroll_num, then by instructor) so nothing goes out to pisa or rmp
+def reparse_courses_from_archive(term=CURRENT_TERM):
+    archive = get_archive()
+    if archive is None:
+        raise RuntimeError("PISA_ARCHIVE is not set, there is no archive to re-parse")
+
+    logger.info(f"Re-parsing term {term} from {archive.path}...")
+    clear_caches()
 
     with app.app_context():
         try:
-            # getting the readymade info from scraping and ratings and gpa
-
-            all_courses = get_all_courses()
-            # now time to store it
-
-            # logger, ignore
-            if not all_courses:
-                logger.warning("No courses found to store")
-                return
-            # clear out db for course info
-            CourseModel.query.delete()
-            LastUpdateModel.query.delete()
-
-            # count total courses added
-            courses_added = 0
-            # go through each course
-            for subject, courses in all_courses.items():
-                for course in courses:
-                    try:
-
-                        subject, catalog_num = course["code"].strip().split(" ", 1)
-
-                        has_enrollment_reqs = bool(course.get("enrollment_reqs", {}).get("description", "").strip())
-
-                        # setting up coursemodel so that
-                        # course information can be stored to db
-                        new_course = CourseModel(
-                            ge=course["ge"],
-                            subject=subject,
-                            catalog_num=catalog_num,
-                            name=course["name"],
-                            instructor=course["instructor"],
-                            link=course["link"],
-                            class_count=course["class_count"],
-                            enroll_num=course["enroll_num"],
-                            class_type=course.get("class_type", ""),
-                            schedule=course["schedule"],
-                            location=course["location"],
-                            gpa=course["gpa"],
-                            instructor_ratings=course["instructor_rating"],
-                            class_status=course["class_status"],
-                            description=course["description"],
-                            class_notes=course["class_notes"],
-                            enrollment_reqs=course["enrollment_reqs"],
-                            discussion_sections=course["discussion_sections"],
-                            credits=course["credits"],
-                            career=course["career"],
-                            grading=course["grading"],
-                            course_type=course["course_type"],
-                            has_enrollment_reqs=has_enrollment_reqs,
-                        )
-
-                        db.session.add(new_course)
-                        courses_added += 1
-                        # add all courses to db after increments of 100
-                        if courses_added % 100 == 0:
-                            db.session.commit()
-                    # exceptions, ignore
-                    except Exception as e:
-                        logger.error(f"Error processing course: {str(e)}")
-                        continue
-
-            # add new last update time to db
-            db.session.add(LastUpdateModel())
-            # finally commit the rest of the courses
-            # now all courses in db
-            db.session.commit()
-
-            # logs and exceptions, ignore from here
-            logger.info(f"Successfully stored {courses_added} courses in database")
+            ratings_by_enroll_num = {}
+            ratings_by_instructor = {}
+            for row in served_courses(db.session, term).all():
+                ratings_by_enroll_num[str(row.enroll_num)] = row.instructor_ratings
+                if row.instructor_ratings:
+                    ratings_by_instructor[row.instructor] = row.instructor_ratings
+
+            def known_ratings(matched_instructor, course):
+                return ratings_by_enroll_num.get(
+                    str(course.enroll_num)
+                ) or ratings_by_instructor.get(matched_instructor)
+
+            listing = (
+                class_api.iter_archived_listing(archive, term)
+                if COURSE_SOURCE == "api"
+                else None
+            )
+            build_term(
+                term,
+                iter_enriched_courses(
+                    courses=iter_archived_courses(archive, term, listing=listing),
+                    lookup_ratings=known_ratings,
+                ),
+            )
 
         except Exception as e:
-            logger.error(f"Error storing courses: {str(e)}")
+            logger.error(f"Error re-parsing courses: {str(e)}")
             db.session.rollback()
             raise
 
 
+# flask --app app reparse-archive [--term 2258]
+@app.cli.command("reparse-archive")
+@click.option("--term", type=int, default=CURRENT_TERM)
+def reparse_archive_command(term):
+    """rebuild a term from the raw page archive, no scraping"""
+    init_db()
+    reparse_courses_from_archive(term)
+
+
+# flask --app app build-terms, scrape every term in PISA_SCRAPE_TERMS now
+@app.cli.command("build-terms")
+@click.option("--full-refresh", is_flag=True)
+def build_terms_command(full_refresh):
+    """scrape and build every configured term"""
+    init_db()
+    build_all_terms(full_refresh)
+
+
+# flask --app app refresh-rmp-directory, for RMP_MATCH=directory
+@app.cli.command("refresh-rmp-directory")
+def refresh_rmp_directory_command():
+    """refetch every ucsc teacher on rmp into the local directory"""
+    directory = refresh_teacher_directory()
+    click.echo(f"{len(directory)} teachers")
+
+
+# flask --app app activate-term 2260
+@app.cli.command("activate-term")
+@click.argument("term", type=int)
+def activate_term_command(term):
+    """switch the served term to one that has a finished build"""
+    init_db()
+    with app.app_context():
+        if not activate_term(term):
+            raise click.ClickException(f"Term {term} has no finished build yet")
+
+
 # scheduler, this is where daily scraping + hourly enrollment counts is happening
-def init_scheduler():
+# build_now: start the daily term builds right away instead of in 24 hours
+def init_scheduler(build_now=False):
     global scheduler
     if scheduler is None:
         scheduler = BackgroundScheduler()
@@ -322,21 +743,33 @@ def init_scheduler():
         scheduler.add_job(
             update_course_statuses,
             "interval",
-            hours=1,
+            minutes=STATUS_REFRESH_MINUTES,
             id="update_course_statuses_job",
             misfire_grace_time=None,
             coalesce=True,
             max_instances=1,
         )
         scheduler.add_job(
-            store_courses_in_db,
+            build_all_terms,
             "interval",
             hours=24,
-            id="store_courses_in_db_job",
+            id="build_all_terms_job",
             misfire_grace_time=None,
             coalesce=True,
             max_instances=1,
+            **({"next_run_time": datetime.now(scheduler.timezone)} if build_now else {}),
         )
+        if not build_now:
+            # terms that were never built (e.g. the upcoming one) shouldn't
+            # have to wait a day for the first daily run
+            for term in SCRAPE_TERMS:
+                if not term_is_ready(term):
+                    scheduler.add_job(
+                        store_courses_in_db,
+                        kwargs={"term": term},
+                        id=f"first_build_{term}_job",
+                        misfire_grace_time=None,
+                    )
 
         try:
             scheduler.start()
@@ -359,13 +792,21 @@ def init_app():
 
         app.register_blueprint(courses_bp)
         init_db()
-        # comment out store_courses_in_db() if you didn't change any
-        # of the scraping part and you alr ran once
 
-        store_courses_in_db()
+        if term_is_ready(CURRENT_TERM):
+            # already built (last run, or prebuilt as the upcoming term):
+            # serve it now and refresh it in the background
+            with app.app_context():
+                activate_term(CURRENT_TERM)
+            build_now = True
+        else:
+            # cold start, nothing to serve for this term until it's scraped
+            store_courses_in_db()
+            build_now = False
+
         init_prereq_dict(app)
         #update_course_statuses() #METHOD!!!
-        init_scheduler()
+        init_scheduler(build_now)
         logger.info("Application initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing application: {str(e)}")
@@ -0,0 +1,103 @@
+"""
+peak memory of parsing one full-term results page
+
+    python -m benchmarks.listing_memory [captured_listing.html] [--panels 6000]
+
+with a captured page it is parsed as-is, otherwise a page with --panels copies
+of a sample panel is generated. every mode runs in its own interpreter so the
+peak RSS numbers don't bleed into each other
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ["soup-tree", "lxml-tree", "lxml-stream"]
+
+SAMPLE_PANEL = """
+<div class="panel panel-default row" id="rowpanel_{i}">
+ <div class="panel-heading panel-heading-custom"><h2><span class="sr-only">Open</span>
+  <a id="class_id_{i}" href="index.php?action=detail&amp;class_data=YToyOntzOjU6IjpTVFJNIjt{i}">CSE {n} - 01&nbsp;&nbsp;&nbsp;Intro Data Structures &amp; Algorithms</a></h2></div>
+ <div class="panel-body"><div class="row">
+  <div class="col-xs-6 col-sm-3"><a>Class Number:</a> {enroll}</div>
+  <div class="col-xs-6 col-sm-3"><i class="sr-only">Instructor:</i> Smith,J.</div>
+  <div class="col-xs-6 col-sm-6"><i class="sr-only">Location:</i> LEC: Baskin Auditorium 101</div>
+  <div class="col-xs-6 col-sm-6"><i class="sr-only">Day and Time:</i> MWF 09:20AM-10:25AM</div>
+  <div class="col-xs-6 col-sm-3"> 120 of 150 Enrolled</div>
+  <div class="col-xs-6 col-sm-3 hide-print">Instruction Mode: <b> In Person </b></div>
+  <div class="col-xs-6 col-sm-3 hide-print">Materials: <a href="#">Textbook info</a></div>
+ </div></div>
+</div>
+"""
+
+
+def generate_page(path, panels):
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write('<html><body><div class="center-block">')
+        for i in range(panels):
+            fp.write(SAMPLE_PANEL.format(i=i, n=100 + i % 200, enroll=20000 + i))
+        fp.write('</div><a href="#" onclick="action(\'next\')">next</a></body></html>')
+
+
+def max_rss_mb():
+    # ru_maxrss is KiB on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode, path):
+    from scraping.ucsc_courses import (
+        LISTING_CHUNK_SIZE,
+        iter_listing_page,
+        parse_listing_page,
+    )
+
+    before = max_rss_mb()
+    start = time.perf_counter()
+
+    if mode == "lxml-stream":
+        count = 0
+        with open(path, "rb") as fp:
+            chunks = iter(lambda: fp.read(LISTING_CHUNK_SIZE), b"")
+            for _ in iter_listing_page(chunks, backend="lxml"):
+                count += 1
+    else:
+        with open(path, encoding="utf-8") as fp:
+            html = fp.read()
+        courses, _ = parse_listing_page(html, backend=mode.split("-")[0])
+        count = len(courses)
+
+    elapsed = time.perf_counter() - start
+    peak = max_rss_mb()
+    print(f"{mode:12} {count:6d} courses  {elapsed:6.2f}s  peak RSS {peak:7.1f} MB  (+{peak - before:.1f} MB over imports)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("page", nargs="?", help="captured results page (rec_dur=2000)")
+    parser.add_argument("--panels", type=int, default=6000)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.page)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.page
+        if not path:
+            path = os.path.join(tmp, "listing.html")
+            generate_page(path, args.panels)
+        print(f"page: {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+        for mode in MODES:
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.listing_memory", path, "--mode", mode],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+ratings subsystem benchmark against the offline rmp stand-in (see benchmarks/rmp_mock.py)
+
+    python -m benchmarks.ratings_load [fixtures/rmp.json] --latency 50 --threads 8
+
+without a fixture corpus one is generated first (--teachers, --lookups).
+reports, for every matching mode (one search per name, aliased batches, the
+local teacher directory): lookups/sec, upstream requests and match accuracy
+against the corpus' expected teachers. then hammers /instructor_ratings with
+--clients concurrent clients asking for a handful of popular instructors and
+reports p50/p99 latency and how many requests reached rmp
+
+the durable ratings cache is off for all of it, every number is cold
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["RMP_CACHE"] = ""
+
+MODES = ["search", "batch", "directory"]
+
+
+def mount(fixtures, latency, jitter, error_rate):
+    from benchmarks.rmp_mock import RMP, MockRMPAdapter
+    from scraping import ratings
+
+    adapter = MockRMPAdapter(fixtures, latency=latency, jitter=jitter, error_rate=error_rate, seed=0)
+    ratings.rmp_client.session.mount(RMP, adapter)
+    ratings.teacher_directory = None
+    return adapter
+
+
+def run_lookups(mode, lookups, threads):
+    """BasicProfessorInfo (None for no match) for every lookup, in order"""
+    from scraping import ratings
+
+    ratings.RMP_MATCH = "directory" if mode == "directory" else "search"
+    pairs = [(name, course) for name, course, _ in lookups]
+
+    if mode == "batch":
+        # the build pipeline batches RMP_BATCH_SIZE courses at a time
+        chunks = [pairs[i : i + ratings.RMP_BATCH_SIZE] for i in range(0, len(pairs), ratings.RMP_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = [info for chunk in executor.map(ratings.get_basic_professor_info_batch, chunks) for info in chunk]
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(lambda pair: ratings.get_basic_professor_info(*pair), pairs))
+
+    return results
+
+
+def accuracy(lookups, results, fixtures):
+    """
+    share of lookups that matched the expected teacher (or nothing, for people
+    rmp doesn't have). BasicProfessorInfo has no id, so a match is judged on
+    name + course codes, which only a real twin in the corpus could share
+    """
+    teachers = {teacher["id"]: teacher for teacher in fixtures["teachers"]}
+
+    def correct(info, expected):
+        if expected is None or info is None:
+            return info is None and expected is None
+        teacher = teachers[expected]
+        return (
+            info.name == f"{teacher['firstName']} {teacher['lastName']}"
+            and info.course_codes == teacher["courseCodes"]
+        )
+
+    hits = sum(correct(info, expected) for (_, _, expected), info in zip(lookups, results))
+    return hits / max(len(lookups), 1)
+
+
+def route_load(lookups, clients, requests_per_client, popular):
+    """p50/p99 seconds of /instructor_ratings with many clients asking for the same few instructors"""
+    from flask import Flask
+
+    from routes import courses_bp, instructor_ratings_flight
+
+    app = Flask("ratings_load")
+    app.register_blueprint(courses_bp)
+    instructor_ratings_flight.clear()
+    hot = [(name, course) for name, course, expected in lookups if expected][:popular]
+
+    def client(n):
+        latencies = []
+        with app.test_client() as test_client:
+            for i in range(requests_per_client):
+                name, course = hot[(n + i) % len(hot)]
+                start = time.perf_counter()
+                test_client.get("/instructor_ratings", query_string={"instructor": name, "course": course})
+                latencies.append(time.perf_counter() - start)
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = sorted(latency for result in executor.map(client, range(clients)) for latency in result)
+    return {
+        "requests": len(latencies),
+        "p50": statistics.median(latencies),
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures", nargs="?", help="rmp corpus, generated if missing")
+    parser.add_argument("--teachers", type=int, default=2000, help="size of the synthetic corpus")
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=50, help="per request latency in ms")
+    parser.add_argument("--jitter", type=float, default=10, help="+- latency jitter in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--clients", type=int, default=32, help="concurrent /instructor_ratings clients")
+    parser.add_argument("--client-requests", type=int, default=20)
+    parser.add_argument("--popular", type=int, default=5, help="distinct instructors the clients ask for")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.fixtures
+        if not path:
+            from benchmarks.rmp_mock import synthesize
+
+            path = os.path.join(tmp, "rmp.json")
+            synthesize(path, teachers=args.teachers, lookups=args.lookups)
+        with open(path, encoding="utf-8") as fp:
+            fixtures = json.load(fp)
+        lookups = fixtures["lookups"][: args.lookups]
+        latency, jitter = args.latency / 1000, args.jitter / 1000
+
+        print(f"corpus: {path}  latency: {args.latency}ms +- {args.jitter}ms  errors: {args.error_rate:.0%}")
+        print(f"{'mode':10} {'lookups':>8} {'lookups/s':>10} {'requests':>9} {'accuracy':>9}")
+        for mode in args.modes.split(","):
+            adapter = mount(fixtures, latency, jitter, args.error_rate)
+            start = time.perf_counter()
+            results = run_lookups(mode, lookups, args.threads)
+            seconds = time.perf_counter() - start
+            print(
+                f"{mode:10} {len(lookups):8d} {len(lookups) / seconds:10.1f}"
+                f" {adapter.stats['requests']:9d} {accuracy(lookups, results, fixtures):9.1%}"
+            )
+
+        adapter = mount(fixtures, latency, jitter, args.error_rate)
+        result = route_load(lookups, args.clients, args.client_requests, args.popular)
+        print(
+            f"/instructor_ratings: {result['requests']} requests from {args.clients} clients,"
+            f" p50 {result['p50'] * 1000:.1f}ms  p99 {result['p99'] * 1000:.1f}ms,"
+            f" {adapter.stats['requests']} reached rmp"
+        )
+
+
+if __name__ == "__main__":
+    main()
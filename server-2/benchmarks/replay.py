@@ -0,0 +1,318 @@
+"""
+offline stand-in for pisa.ucsc.edu
+
+ReplayAdapter is a requests transport adapter that answers from a directory of
+recorded pages instead of the network, with configurable latency, so the
+scraper can be run and timed without touching the real site:
+
+    session = create_session()
+    session.mount("https://pisa.ucsc.edu/", ReplayAdapter("fixtures/pisa", latency=0.05))
+    scrape_all_courses(session=session)
+
+for the sharded listing, where every worker process needs its own session:
+
+    factory = functools.partial(replay_session, "fixtures/pisa", 0.05)
+    scrape_all_courses(session=factory(), sharded=True, session_factory=factory)
+
+fixtures are either recorded from the live site once
+
+    python -m benchmarks.replay record fixtures/pisa
+
+or generated (no network at all)
+
+    python -m benchmarks.replay synth fixtures/pisa --courses 6000
+
+layout: <dir>/index.json maps a request key to the list of responses served
+for it in order (the listing's "next" action posts the same form every time),
+bodies live in <dir>/pages/
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import parse_qsl
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+PISA = "https://pisa.ucsc.edu/class_search/"
+# form fields that decide which listing page comes back
+LISTING_FIELDS = ("action", "binds[:subject]")
+
+
+def request_key(request):
+    """GETs are keyed by full url, listing POSTs by url + the fields that matter"""
+    if request.method == "GET" or not request.body:
+        return f"{request.method} {request.url}"
+
+    body = request.body
+    if isinstance(body, bytes):
+        body = body.decode()
+    form = dict(parse_qsl(body, keep_blank_values=True))
+    fields = "&".join(f"{name}={form.get(name, '')}" for name in LISTING_FIELDS)
+    return f"{request.method} {request.url} {fields}"
+
+
+def _build_response(request, status, headers, body, adapter):
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response.raw = io.BytesIO(body)
+    response.url = request.url
+    response.request = request
+    response.reason = "OK" if status < 400 else "Error"
+    response.encoding = "utf-8"
+    response.connection = adapter
+    return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    serves recorded responses, sleeping `latency` seconds (+- jitter) per request
+    unknown requests get a 404, stats has request/byte counts for benchmarks
+    """
+
+    def __init__(self, directory, latency=0.0, jitter=0.0):
+        super().__init__()
+        self.directory = directory
+        self.latency = latency
+        self.jitter = jitter
+        with open(os.path.join(directory, "index.json"), encoding="utf-8") as fp:
+            self.index = json.load(fp)
+        self._served = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes": 0, "misses": 0, "not_modified": 0}
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        key = request_key(request)
+        with self._lock:
+            self.stats["requests"] += 1
+            entries = self.index.get(key)
+            if not entries:
+                self.stats["misses"] += 1
+                return _build_response(request, 404, {}, b"", self)
+            # walk through the recorded sequence, then keep serving the last one
+            position = self._served.get(key, 0)
+            self._served[key] = position + 1
+            entry = entries[min(position, len(entries) - 1)]
+
+        headers = entry.get("headers", {})
+        etag = headers.get("ETag")
+        if etag and request.headers.get("If-None-Match") == etag:
+            with self._lock:
+                self.stats["not_modified"] += 1
+            return _build_response(request, 304, headers, b"", self)
+
+        with open(os.path.join(self.directory, "pages", entry["file"]), "rb") as fp:
+            body = fp.read()
+        with self._lock:
+            self.stats["bytes"] += len(body)
+        return _build_response(request, entry.get("status", 200), headers, body, self)
+
+    def close(self):
+        pass
+
+
+class FixtureWriter:
+    def __init__(self, directory):
+        self.directory = directory
+        self.index = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "pages"), exist_ok=True)
+
+    def add(self, key, body, status=200, headers=None):
+        name = f"{hashlib.sha1(key.encode()).hexdigest()}"
+        with self._lock:
+            entries = self.index.setdefault(key, [])
+            name = f"{name}-{len(entries)}.html"
+            entries.append({"file": name, "status": status, "headers": headers or {}})
+        with open(os.path.join(self.directory, "pages", name), "wb") as fp:
+            fp.write(body)
+
+    def save(self):
+        with open(os.path.join(self.directory, "index.json"), "w", encoding="utf-8") as fp:
+            json.dump(self.index, fp, indent=1)
+
+
+class RecordingAdapter(HTTPAdapter):
+    """real network adapter that also writes every response into a FixtureWriter"""
+
+    def __init__(self, writer, **kwargs):
+        super().__init__(**kwargs)
+        self.writer = writer
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        body = response.content
+        headers = {
+            name: response.headers[name]
+            for name in ("ETag", "Last-Modified", "Content-Type")
+            if name in response.headers
+        }
+        self.writer.add(request_key(request), body, response.status_code, headers)
+        # hand the body back as a fresh stream so stream=True callers still work
+        return _build_response(request, response.status_code, response.headers, body, self)
+
+
+LISTING_PANEL = """
+<div class="panel panel-default row" id="rowpanel_{i}">
+ <div class="panel-heading panel-heading-custom"><h2><span class="sr-only">{status}</span>
+  <a id="class_id_{enroll}" href="{link}">{subject} {number} - 01&nbsp;&nbsp;&nbsp;Sample Course {i}</a></h2></div>
+ <div class="panel-body"><div class="row">
+  <div class="col-xs-6 col-sm-3"><a>Class Number:</a> {enroll}</div>
+  <div class="col-xs-6 col-sm-3"><i class="sr-only">Instructor:</i> Lastname{teacher},F.</div>
+  <div class="col-xs-6 col-sm-6"><i class="sr-only">Location:</i> LEC: Baskin Auditorium 101</div>
+  <div class="col-xs-6 col-sm-6"><i class="sr-only">Day and Time:</i> MWF 09:20AM-10:25AM</div>
+  <div class="col-xs-6 col-sm-3"> {enrolled} of 150 Enrolled</div>
+  <div class="col-xs-6 col-sm-3 hide-print">Instruction Mode: <b> In Person </b></div>
+ </div></div>
+</div>
+"""
+
+DETAIL_PAGE = """<html><body>
+<div class="panel panel-default row"><div class="panel-heading panel-heading-custom"><h2>{subject} {number} - 01 Sample Course {i}</h2></div>
+<div class="panel-body"><dl class="dl-horizontal"><dt>Career</dt><dd>Undergraduate</dd><dt>Grading</dt><dd>Letter Grade</dd>
+<dt>Class Number</dt><dd>{enroll}</dd><dt>Type</dt><dd>Lecture</dd><dt>Credits</dt><dd>5 units</dd><dt>General Education</dt><dd>{ge}</dd></dl></div></div>
+<div class="panel panel-default row"><div class="panel-heading panel-heading-custom"><h2>Description</h2></div><div class="panel-body">{description}</div></div>
+<div class="panel panel-default row"><div class="panel-heading panel-heading-custom"><h2>Enrollment Requirements</h2></div><div class="panel-body">Prerequisite(s): {subject} {prereq}.</div></div>
+{sections}
+</body></html>"""
+
+SECTIONS_PANEL = """<div class="panel panel-default row"><div class="panel-heading panel-heading-custom"><h2>Associated Discussion Sections or Labs</h2></div><div class="panel-body">{rows}</div></div>"""
+
+SECTION_ROW = """<div class="row"><div class="col-xs-6 col-sm-3">#{enroll} DIS 01{letter}</div><div class="col-xs-6 col-sm-3">Tu 08:00AM-09:05AM</div><div class="col-xs-6 col-sm-3">Staff</div><div class="col-xs-6 col-sm-3">Loc: J Baskin 165</div><div class="col-xs-6 col-sm-3">Enrl: 30 / 35</div><div class="col-xs-6 col-sm-3">Wait: 0 / 0</div><div class="col-xs-6 col-sm-3">Open</div></div>"""
+
+SUBJECTS = ["AM", "ANTH", "CSE", "ECE", "ECON", "MATH", "PHYS", "PSYC", "STAT", "WRIT"]
+
+
+def synthesize(directory, courses=2000, per_page=2000, sections_every=3):
+    """generate a fake term of `courses` classes laid out like pisa's pages"""
+    writer = FixtureWriter(directory)
+    landing = "".join(f'<option value="{subject}">{subject}</option>' for subject in SUBJECTS)
+    writer.add(
+        f"GET {PISA}",
+        f'<html><body><select id="subject" name="binds[:subject]"><option value="">All Subjects</option>{landing}</select></body></html>'.encode(),
+    )
+
+    panels = []
+    for i in range(courses):
+        enroll = 20000 + i
+        subject = SUBJECTS[i % len(SUBJECTS)]
+        number = 1 + (i * 7) % 199
+        link = "index.php?action=detail&class_data=" + base64.b64encode(f"{enroll}".encode()).decode()
+        panels.append(
+            LISTING_PANEL.format(
+                i=i,
+                enroll=enroll,
+                subject=subject,
+                number=number,
+                link=link.replace("&", "&amp;"),
+                status="Open" if i % 4 else "Closed",
+                teacher=i % 300,
+                enrolled=i % 150,
+            )
+        )
+
+        sections = ""
+        if sections_every and i % sections_every == 0:
+            rows = "".join(
+                SECTION_ROW.format(enroll=50000 + i * 4 + n, letter="ABCD"[n]) for n in range(4)
+            )
+            sections = SECTIONS_PANEL.format(rows=rows)
+        detail = DETAIL_PAGE.format(
+            i=i,
+            enroll=enroll,
+            subject=subject,
+            number=number,
+            ge="" if i % 5 else "MF",
+            description="Covers the usual material for this course. " * 8,
+            prereq=max(1, number - 10),
+            sections=sections,
+        )
+        writer.add(
+            f"GET {PISA}{link}",
+            detail.encode(),
+            headers={"ETag": f'"{hashlib.sha1(detail.encode()).hexdigest()}"'},
+        )
+
+    # whole catalog search, plus one search per subject for the sharded listing
+    _add_listing(writer, "", panels, per_page)
+    for n, subject in enumerate(SUBJECTS):
+        _add_listing(writer, subject, panels[n :: len(SUBJECTS)], per_page)
+
+    writer.save()
+    return writer.index
+
+
+def _add_listing(writer, subject, panels, per_page):
+    pages = [panels[start : start + per_page] for start in range(0, len(panels), per_page)]
+    for number, page in enumerate(pages):
+        action = "results" if number == 0 else "next"
+        next_button = (
+            '<a href="#" onclick="action(\'next\')">next</a>' if number < len(pages) - 1 else ""
+        )
+        body = f'<html><body><div class="center-block">{"".join(page)}</div>{next_button}</body></html>'
+        writer.add(f"POST {PISA}index.php action={action}&binds[:subject]={subject}", body.encode())
+    # the page pisa answers with once paging runs past the end
+    writer.add(f"POST {PISA}index.php action=next&binds[:subject]={subject}", b"<html><body></body></html>")
+
+
+def replay_session(directory, latency=0.0, jitter=0.0, pool_size=None):
+    """
+    create_session() with a ReplayAdapter mounted for pisa, picklable through
+    functools.partial so sharded listing workers can build their own
+    """
+    from scraping.ucsc_courses import DETAIL_WORKERS, create_session
+
+    session = create_session(pool_size=pool_size or DETAIL_WORKERS)
+    session.mount(PISA, ReplayAdapter(directory, latency=latency, jitter=jitter))
+    return session
+
+
+def record(directory):
+    """scrape the live site once through a RecordingAdapter"""
+    from scraping.ucsc_courses import DETAIL_WORKERS, create_session, scrape_all_courses
+
+    writer = FixtureWriter(directory)
+    session = create_session(pool_size=DETAIL_WORKERS + 1)
+    session.mount(
+        "https://pisa.ucsc.edu/",
+        RecordingAdapter(writer, pool_connections=DETAIL_WORKERS + 1, pool_maxsize=DETAIL_WORKERS + 1),
+    )
+    courses = scrape_all_courses(session=session)
+    writer.save()
+    return courses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    synth_parser = commands.add_parser("synth", help="generate fixtures offline")
+    synth_parser.add_argument("directory")
+    synth_parser.add_argument("--courses", type=int, default=2000)
+    synth_parser.add_argument("--per-page", type=int, default=2000)
+    synth_parser.add_argument("--sections-every", type=int, default=3)
+    record_parser = commands.add_parser("record", help="record fixtures from pisa.ucsc.edu")
+    record_parser.add_argument("directory")
+    args = parser.parse_args()
+
+    if args.command == "synth":
+        index = synthesize(args.directory, args.courses, args.per_page, args.sections_every)
+        print(f"wrote {sum(len(entries) for entries in index.values())} responses to {args.directory}")
+    else:
+        courses = record(args.directory)
+        print(f"recorded {len(courses)} courses to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
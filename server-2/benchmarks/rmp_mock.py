@@ -0,0 +1,288 @@
+"""
+offline stand-in for the RateMyProfessors graphql endpoint
+
+MockRMP answers the queries scraping/ratings.py sends (single newSearch
+searches, aliased batches, the paged teacher directory, a teacher's paged
+ratings) from a fixture corpus of teacher nodes, with configurable latency
+and error rate. it can be used in process as a requests transport adapter:
+
+    from scraping import ratings
+    ratings.rmp_client.session.mount(RMP, MockRMPAdapter("fixtures/rmp.json", latency=0.05))
+
+or as a real local server the client is pointed at:
+
+    python -m benchmarks.rmp_mock serve fixtures/rmp.json --port 8765
+    RMPClient(url="http://127.0.0.1:8765/graphql")
+
+fixtures are generated (no network at all):
+
+    python -m benchmarks.rmp_mock synth fixtures/rmp.json --teachers 2000
+
+layout: {"teachers": [node, ...], "lookups": [[instructor, course, teacher id or null], ...]}
+nodes carry every field any query asks for (plus their "ratings"), lookups
+are pisa style names with the teacher each one should match, for accuracy
+"""
+import argparse
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+RMP = "https://www.ratemyprofessors.com/"
+
+# rmp only hands back the first page of a fuzzy search
+SEARCH_PAGE_SIZE = 8
+
+FIRST_NAMES = ["Alex", "Ana", "Ben", "Carla", "Chen", "David", "Elena", "Jia", "Jose", "Maria", "Priya", "Sam"]
+LAST_NAMES = ["Lee", "Garcia", "Nguyen", "Smith", "Patel", "Kim", "Lopez", "Wang", "Brown", "Chen", "Singh", "Young"]
+TAGS = ["Tough grader", "Clear grading criteria", "Lots of homework", "Caring", "Amazing lectures", "Test heavy"]
+DEPARTMENTS = {"CSE": "Computer Science", "MATH": "Mathematics", "PHYS": "Physics", "ECON": "Economics", "STAT": "Statistics"}
+
+
+class MockRMP:
+    """the graphql side, shared by the adapter and the http server"""
+
+    def __init__(self, fixtures, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        if isinstance(fixtures, str):
+            with open(fixtures, encoding="utf-8") as fp:
+                fixtures = json.load(fp)
+        self.teachers = fixtures["teachers"]
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "searches": 0, "errors": 0}
+
+    def search(self, text, first=SEARCH_PAGE_SIZE, after=None, course_filter=None):
+        """one newSearch.teachers connection, roughly rmp's fuzzy match"""
+        words = [word for word in (text or "").lower().split() if word]
+        if words:
+            # the last name has to be in there, a matching initial ranks higher
+            matches = [t for t in self.teachers if words[0] in t["lastName"].lower()]
+            initial = words[1][0] if len(words) > 1 else ""
+            matches.sort(key=lambda t: not t["firstName"].lower().startswith(initial))
+        else:
+            matches = self.teachers
+
+        start = int(after or 0)
+        page = matches[start : start + first]
+        return {
+            "edges": [{"node": self._node(teacher, course_filter)} for teacher in page],
+            "pageInfo": {
+                "hasNextPage": start + first < len(matches),
+                "endCursor": str(start + first),
+            },
+        }
+
+    def ratings(self, teacher_id, first, after=None):
+        """node(id:) { ... on Teacher { ratings } } for one teacher"""
+        teacher = next((t for t in self.teachers if t["id"] == teacher_id), None)
+        if teacher is None:
+            return None
+        ratings = teacher.get("ratings", [])
+        start = int(after or 0)
+        return {
+            "ratings": {
+                "edges": [{"node": rating} for rating in ratings[start : start + first]],
+                "pageInfo": {
+                    "hasNextPage": start + first < len(ratings),
+                    "endCursor": str(start + first),
+                },
+            }
+        }
+
+    def _node(self, teacher, course_filter):
+        ratings = teacher.get("ratings", [])
+        if course_filter:
+            ratings = [rating for rating in ratings if rating["class"] == course_filter]
+        return {**teacher, "ratings": {"edges": [{"node": rating} for rating in ratings[:10]]}}
+
+    def answer(self, body):
+        """(http status, json answer) for a graphql request body"""
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        with self._lock:
+            self.stats["requests"] += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.stats["errors"] += 1
+        if failed:
+            return 503, {"errors": [{"message": "Service Unavailable"}]}
+
+        query = body.get("query", "")
+        variables = body.get("variables") or {}
+        data = {}
+        # aliased batch: tN: newSearch { teachers(query: $qN) ... }
+        for alias, name in re.findall(r"(\w+):\s*newSearch\s*\{\s*teachers\(query:\s*\$(\w+)", query):
+            data[alias] = {"teachers": self.search(variables[name]["text"])}
+        if not data and re.search(r"\bnode\(id:", query):
+            data["node"] = self.ratings(variables["id"], variables["first"], variables.get("after"))
+        elif not data:
+            first = variables.get("first", SEARCH_PAGE_SIZE)
+            data["newSearch"] = {
+                "teachers": self.search(
+                    variables["query"]["text"],
+                    first=first,
+                    after=variables.get("after"),
+                    course_filter=variables.get("courseFilter"),
+                )
+            }
+        with self._lock:
+            self.stats["searches"] += len(data)
+        return 200, {"data": data}
+
+
+class MockRMPAdapter(BaseAdapter):
+    """requests transport adapter answering from a MockRMP"""
+
+    def __init__(self, fixtures, **kwargs):
+        super().__init__()
+        self.rmp = fixtures if isinstance(fixtures, MockRMP) else MockRMP(fixtures, **kwargs)
+
+    @property
+    def stats(self):
+        return self.rmp.stats
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        status, answer = self.rmp.answer(json.loads(request.body or b"{}"))
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+        response.raw = io.BytesIO(json.dumps(answer).encode())
+        response.url = request.url
+        response.request = request
+        response.reason = "OK" if status < 400 else "Error"
+        response.encoding = "utf-8"
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+def serve(rmp, host="127.0.0.1", port=8765):
+    """ThreadingHTTPServer answering POST /graphql from a MockRMP (not started)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            status, answer = rmp.answer(json.loads(self.rfile.read(length) or b"{}"))
+            body = json.dumps(answer).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def synthesize(path, teachers=2000, lookups=1000, seed=0):
+    """
+    a fake school: teachers share last names and initials on purpose (and
+    across departments) so the scoring has something to get wrong
+    """
+    rng = random.Random(seed)
+    nodes = []
+    for i in range(teachers):
+        first = rng.choice(FIRST_NAMES)
+        # a few rare last names so not every search collides
+        last = rng.choice(LAST_NAMES) if i % 4 else f"{rng.choice(LAST_NAMES)}{i}"
+        subject = rng.choice(list(DEPARTMENTS))
+        courses = sorted({f"{subject}{rng.randint(1, 199)}" for _ in range(rng.randint(1, 5))})
+        distribution = [rng.randint(0, 20) for _ in range(5)]
+        ratings = [
+            {
+                "comment": "Fine class.",
+                "date": f"{rng.randint(2016, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 00:00:00 +0000 UTC",
+                "class": rng.choice(courses),
+                "helpfulRating": rng.randint(1, 5),
+                "clarityRating": rng.randint(1, 5),
+                "difficultyRating": rng.randint(1, 5),
+                "thumbsUpTotal": rng.randint(0, 9),
+                "thumbsDownTotal": rng.randint(0, 9),
+                "wouldTakeAgain": rng.choice([0, 1]),
+                "isForCredit": True,
+                "isForOnlineClass": False,
+                "attendanceMandatory": "non mandatory",
+                "ratingTags": "--".join(rng.sample(TAGS, rng.randint(0, 3))),
+                "flagStatus": "UNFLAGGED",
+                "textbookUse": -1,
+            }
+            for _ in range(rng.randint(0, 15))
+        ]
+        nodes.append(
+            {
+                "id": f"VGVhY2hlci0{i}",
+                "firstName": first,
+                "lastName": last,
+                "department": DEPARTMENTS[subject],
+                "avgRating": round(rng.uniform(1, 5), 1),
+                "avgDifficulty": round(rng.uniform(1, 5), 1),
+                "numRatings": sum(distribution),
+                "wouldTakeAgainPercent": round(rng.uniform(0, 100), 1),
+                "courseCodes": [{"courseName": code, "courseCount": rng.randint(1, 9)} for code in courses],
+                "ratingsDistribution": {f"r{n + 1}": count for n, count in enumerate(distribution)},
+                "ratings": ratings,
+            }
+        )
+
+    cases = []
+    for _ in range(lookups):
+        teacher = rng.choice(nodes)
+        course = rng.choice(teacher["courseCodes"])["courseName"]
+        code = re.sub(r"(\D+)(\d.*)", r"\1 \2", course)
+        # pisa shows "F. Last" about half the time
+        name = (
+            f"{teacher['firstName'][0]}. {teacher['lastName']}"
+            if rng.random() < 0.5
+            else f"{teacher['firstName']} {teacher['lastName']}"
+        )
+        cases.append([name, code, teacher["id"]])
+    # people rmp has never heard of
+    for i in range(lookups // 10):
+        cases.append([f"{rng.choice(FIRST_NAMES)} Unknown{i}", "CSE 101", None])
+
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump({"teachers": nodes, "lookups": cases}, fp)
+    return {"teachers": nodes, "lookups": cases}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    synth_parser = commands.add_parser("synth", help="generate a fixture corpus")
+    synth_parser.add_argument("path")
+    synth_parser.add_argument("--teachers", type=int, default=2000)
+    synth_parser.add_argument("--lookups", type=int, default=1000)
+    serve_parser = commands.add_parser("serve", help="answer graphql over http")
+    serve_parser.add_argument("path")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--latency", type=float, default=0, help="per request latency in ms")
+    serve_parser.add_argument("--error-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    if args.command == "synth":
+        corpus = synthesize(args.path, args.teachers, args.lookups)
+        print(f"wrote {len(corpus['teachers'])} teachers and {len(corpus['lookups'])} lookups to {args.path}")
+    else:
+        server = serve(MockRMP(args.path, latency=args.latency / 1000, error_rate=args.error_rate), port=args.port)
+        print(f"serving {args.path} on http://127.0.0.1:{args.port}/graphql")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+scraper throughput against the offline pisa replay (see benchmarks/replay.py)
+
+    python -m benchmarks.scraper_throughput [fixtures/pisa] --latency 50 --workers 1,4,8,16
+
+without a fixture directory a synthetic term (--courses) is generated first.
+every (job, parser, workers) combination runs in its own interpreter and
+reports courses/sec, requests/sec and peak RSS
+"""
+import argparse
+import functools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+JOBS = ["scrape_all_courses", "scrape_count"]
+
+
+def run_one(fixtures, job, workers, latency, jitter, sharded):
+    from benchmarks.replay import ReplayAdapter, replay_session
+    from scraping import ucsc_courses
+
+    adapter = ReplayAdapter(fixtures, latency=latency, jitter=jitter)
+    session = ucsc_courses.create_session(pool_size=workers + 1)
+    session.mount("https://pisa.ucsc.edu/", adapter)
+    # listing shards run in their own processes, so their requests aren't in adapter.stats
+    session_factory = functools.partial(replay_session, fixtures, latency, jitter)
+
+    start = time.perf_counter()
+    courses = getattr(ucsc_courses, job)(
+        max_workers=workers,
+        session=session,
+        sharded=sharded,
+        session_factory=session_factory,
+    )
+    elapsed = time.perf_counter() - start
+
+    print(
+        json.dumps(
+            {
+                "courses": len(courses),
+                "seconds": elapsed,
+                "requests": adapter.stats["requests"],
+                "misses": adapter.stats["misses"],
+                "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures", nargs="?", help="replay directory, generated if missing")
+    parser.add_argument("--courses", type=int, default=2000, help="size of the synthetic term")
+    parser.add_argument("--latency", type=float, default=20, help="per request latency in ms")
+    parser.add_argument("--jitter", type=float, default=5, help="+- latency jitter in ms")
+    parser.add_argument("--workers", default="1,4,8,16")
+    parser.add_argument("--parsers", default="lxml,soup")
+    parser.add_argument("--jobs", default=",".join(JOBS))
+    parser.add_argument("--sharded", action="store_true", help="per-subject listing across processes")
+    parser.add_argument("--run", nargs=2, metavar=("JOB", "WORKERS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        job, workers = args.run
+        run_one(args.fixtures, job, int(workers), args.latency / 1000, args.jitter / 1000, args.sharded)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures = args.fixtures
+        if not fixtures:
+            from benchmarks.replay import synthesize
+
+            fixtures = os.path.join(tmp, "pisa")
+            synthesize(fixtures, courses=args.courses)
+
+        print(
+            f"fixtures: {fixtures}  latency: {args.latency}ms +- {args.jitter}ms"
+            + ("  (sharded listing)" if args.sharded else "")
+        )
+        print(f"{'job':20} {'parser':6} {'workers':>7} {'courses':>8} {'courses/s':>10} {'req/s':>8} {'peak RSS':>9}")
+        for job in args.jobs.split(","):
+            for parser_backend in args.parsers.split(","):
+                for workers in args.workers.split(","):
+                    output = subprocess.run(
+                        [
+                            sys.executable, "-m", "benchmarks.scraper_throughput", fixtures,
+                            "--latency", str(args.latency), "--jitter", str(args.jitter),
+                            "--run", job, workers,
+                        ] + (["--sharded"] if args.sharded else []),
+                        env={**os.environ, "PISA_PARSER": parser_backend},
+                        capture_output=True,
+                        text=True,
+                        check=True,
+                    ).stdout
+                    result = json.loads(output.strip().splitlines()[-1])
+                    seconds = result["seconds"] or 1e-9
+                    print(
+                        f"{job:20} {parser_backend:6} {workers:>7} {result['courses']:8d}"
+                        f" {result['courses'] / seconds:10.1f} {result['requests'] / seconds:8.1f}"
+                        f" {result['peak_rss_mb']:7.1f}MB"
+                        + (f"  ({result['misses']} unknown requests)" if result["misses"] else "")
+                    )
+
+
+if __name__ == "__main__":
+    main()
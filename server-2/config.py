@@ -2,6 +2,7 @@ from flask import Flask
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import event
 import os
 from pathlib import Path
 from datetime import datetime
@@ -14,6 +15,9 @@ CORS(app)
 current_dir = Path(__file__).parent
 slugtistics_db_path = current_dir / "slugtistics.db"
 
+# raw pisa pages are kept here for offline re-parses when set (see scraping/archive.py)
+pisa_archive_path = os.getenv("PISA_ARCHIVE")
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///courses.db?cache=shared")
 
 app.config.update(
@@ -30,6 +34,14 @@ app.config.update(
 )
 
 db = SQLAlchemy(app)
+
+# WAL so readers aren't blocked while a build commits its rows in chunks
+# (write_course_rows commits every BUILD_COMMIT_EVERY rows)
+if DATABASE_URL.startswith("sqlite"):
+    with app.app_context():
+        @event.listens_for(db.engine, "connect")
+        def set_sqlite_wal(dbapi_connection, connection_record):
+            dbapi_connection.execute("PRAGMA journal_mode=WAL")
 migrate = Migrate(app, db)
 
 courses_cache = {}
@@ -0,0 +1,120 @@
+"""
+materialized grade-count aggregates over slugtistics.db's GradeData
+
+GradeData has a row per (course, instructor, term) offering, but the build's
+gpa lookups only ever want the summed grade counts per course or per (course,
+instructor). those sums are built once into two tables keyed by exactly that:
+
+    GradeCourseAggregate      ("SubjectCatalogNbr")                 -> grade counts
+    GradeInstructorAggregate  ("SubjectCatalogNbr", "Instructors")  -> grade counts
+
+and load_grade_book turns them straight into a GradeBook, so the build reads
+one row per key instead of every term's rows. they're rebuilt when GradeData's
+fingerprint (row count, max rowid, total grades) no longer matches the one in
+GradeAggregateMeta, e.g. after a new grade release is loaded. term-range
+queries still need the per-term rows, see grade_engine.TermIndex
+"""
+import sqlite3
+from typing import Optional
+
+import numpy as np
+
+from grade_engine import GRADES, GradeBook, GradeStats
+
+COURSE_TABLE = "GradeCourseAggregate"
+INSTRUCTOR_TABLE = "GradeInstructorAggregate"
+META_TABLE = "GradeAggregateMeta"
+# bumped whenever the tables' layout changes, so old ones get rebuilt
+AGGREGATE_VERSION = 2
+
+_GRADE_COLUMNS = ", ".join(f'"{grade}"' for grade in GRADES)
+_GRADE_DEFINITIONS = ", ".join(f'"{grade}" INTEGER NOT NULL' for grade in GRADES)
+# GradeData has a few negative/garbage cells, they count as nobody (same as GradeMatrix)
+GRADE_SUMS = ", ".join(f'COALESCE(SUM(MAX(COALESCE("{grade}", 0), 0)), 0)' for grade in GRADES)
+
+
+def grade_data_fingerprint(conn: sqlite3.Connection) -> str:
+    """changes whenever rows are added to, removed from or regraded in GradeData"""
+    total = " + ".join(f'COALESCE(SUM("{grade}"), 0)' for grade in GRADES)
+    count, max_rowid, grades = conn.execute(
+        f"SELECT COUNT(*), COALESCE(MAX(rowid), 0), {total} FROM GradeData"
+    ).fetchone()
+    return f"v{AGGREGATE_VERSION}:{count}:{max_rowid}:{grades}"
+
+
+def _stored_fingerprint(conn: sqlite3.Connection) -> Optional[str]:
+    try:
+        row = conn.execute(
+            f"SELECT value FROM {META_TABLE} WHERE key = 'fingerprint'"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def build_grade_aggregates(conn: sqlite3.Connection, fingerprint: Optional[str] = None) -> None:
+    """(re)build both aggregate tables from GradeData in one transaction"""
+    fingerprint = fingerprint or grade_data_fingerprint(conn)
+    # DDL doesn't open sqlite3's implicit transaction, readers must never see
+    # the tables dropped or half filled
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    with conn:
+        conn.execute(f"DROP TABLE IF EXISTS {COURSE_TABLE}")
+        conn.execute(f"DROP TABLE IF EXISTS {INSTRUCTOR_TABLE}")
+        conn.execute(
+            f'CREATE TABLE {COURSE_TABLE} ("SubjectCatalogNbr" TEXT PRIMARY KEY, {_GRADE_DEFINITIONS})'
+        )
+        conn.execute(
+            f'CREATE TABLE {INSTRUCTOR_TABLE} ("SubjectCatalogNbr" TEXT NOT NULL, "Instructors" TEXT NOT NULL,'
+            f' {_GRADE_DEFINITIONS}, PRIMARY KEY ("SubjectCatalogNbr", "Instructors"))'
+        )
+        conn.execute(
+            f'INSERT INTO {COURSE_TABLE} ("SubjectCatalogNbr", {_GRADE_COLUMNS})'
+            f' SELECT "SubjectCatalogNbr", {GRADE_SUMS} FROM GradeData'
+            ' WHERE "SubjectCatalogNbr" IS NOT NULL GROUP BY "SubjectCatalogNbr"'
+        )
+        # a missing instructor is '' like in GradeMatrix, so the course's
+        # instructor rows still add up to its course row
+        conn.execute(
+            f'INSERT INTO {INSTRUCTOR_TABLE} ("SubjectCatalogNbr", "Instructors", {_GRADE_COLUMNS})'
+            f' SELECT "SubjectCatalogNbr", COALESCE("Instructors", \'\'), {GRADE_SUMS} FROM GradeData'
+            ' WHERE "SubjectCatalogNbr" IS NOT NULL'
+            ' GROUP BY "SubjectCatalogNbr", COALESCE("Instructors", \'\')'
+        )
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(
+            f"INSERT OR REPLACE INTO {META_TABLE} (key, value) VALUES ('fingerprint', ?)",
+            (fingerprint,),
+        )
+
+
+def ensure_grade_aggregates(conn: sqlite3.Connection) -> bool:
+    """rebuild the aggregates if GradeData changed since they were built, True if it did"""
+    fingerprint = grade_data_fingerprint(conn)
+    if fingerprint == _stored_fingerprint(conn):
+        return False
+    build_grade_aggregates(conn, fingerprint)
+    return True
+
+
+def _grade_stats(rows, key_width):
+    if not rows:
+        return GradeStats([], np.zeros((0, len(GRADES)), dtype=np.int64))
+    keys = [row[0] if key_width == 1 else tuple(row[:key_width]) for row in rows]
+    counts = np.array([tuple(row)[key_width:] for row in rows], dtype=np.int64)
+    return GradeStats(keys, counts)
+
+
+def load_grade_book(conn: sqlite3.Connection) -> GradeBook:
+    """
+    GradeBook of the aggregate tables, same numbers as GradeBook.load(conn)
+    raises sqlite3.OperationalError if they were never built
+    """
+    by_course = conn.execute(
+        f'SELECT "SubjectCatalogNbr", {_GRADE_COLUMNS} FROM {COURSE_TABLE}'
+    ).fetchall()
+    by_instructor = conn.execute(
+        f'SELECT "SubjectCatalogNbr", "Instructors", {_GRADE_COLUMNS} FROM {INSTRUCTOR_TABLE}'
+    ).fetchall()
+    return GradeBook(_grade_stats(by_course, 1), _grade_stats(by_instructor, 2))
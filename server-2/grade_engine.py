@@ -0,0 +1,276 @@
+"""
+numpy grade-distribution engine over slugtistics.db's GradeData
+
+GradeMatrix.load pulls GradeData into one contiguous (rows x 16) int array of
+grade counts (A+ .. F, P, NP, W) with integer course and instructor ids per
+row. grade_stats then sums it per key (course, or (course, instructor)) and
+computes gpa, pass rate, withdraw rate and grade-point percentiles for every
+key in one vectorized pass, as plain numbers
+
+    matrix = GradeMatrix.load(conn)
+    by_course = grade_stats(matrix)
+    by_instructor = grade_stats(matrix, by_instructor=True)
+    by_instructor.get("CSE 101", "Tantalo,Patrick")  # {"gpa": 3.12, ...}
+
+GradeBook bundles both for the build's per course gpa lookups (the build
+loads it from grade_aggregates' precomputed tables instead). TermIndex
+keeps running (prefix) grade counts per key in term order, so the counts of
+any term range are the difference of two prefix rows:
+
+    index = TermIndex(matrix, by_instructor=True)
+    index.stats(("CSE 101", "Tantalo,Patrick"), from_term=2238)
+"""
+import re
+
+import numpy as np
+
+from scraping.terms import QUARTERS
+
+LETTER_GRADES = ["A+", "A", "A-", "B+", "B", "B-", "C+", "C", "C-", "D+", "D", "D-", "F"]
+GRADES = LETTER_GRADES + ["P", "NP", "W"]
+
+GRADE_POINTS = np.array([4.0, 4.0, 3.7, 3.3, 3.0, 2.7, 2.3, 2.0, 1.7, 1.3, 1.0, 0.7, 0.0])
+
+LETTERS = slice(0, len(LETTER_GRADES))
+P, NP, W = (GRADES.index(grade) for grade in ("P", "NP", "W"))
+# a C is the lowest grade that earns a P, so it's the bar for passing
+PASSING = slice(0, LETTER_GRADES.index("C") + 1)
+
+PERCENTILES = (25, 50, 75)
+
+QUARTER_CODES = {name.lower(): code for code, name in QUARTERS.items()}
+
+
+def parse_term(term):
+    """
+    pisa term code (see scraping/terms.py) of a GradeData "Term", a code
+    already ("2238") or a name ("Fall 2023", "2023 Fall"). 0 if it's neither,
+    so unknown terms sort before every real one
+    """
+    text = str(term or "").strip()
+    if text.isdigit():
+        return int(text)
+    quarter = re.search(r"[a-z]+", text.lower())
+    year = re.search(r"\d{4}", text)
+    if not quarter or not year or quarter.group() not in QUARTER_CODES:
+        return 0
+    return 2000 + (int(year.group()) - 2000) * 10 + QUARTER_CODES[quarter.group()]
+
+
+class GradeMatrix:
+    def __init__(self, counts, course_ids, instructor_ids, courses, instructors, terms=None):
+        self.counts = counts
+        self.course_ids = course_ids
+        self.instructor_ids = instructor_ids
+        self.courses = courses
+        self.instructors = instructors
+        # pisa term code of every row, see parse_term
+        self.terms = np.zeros(len(counts), dtype=np.int64) if terms is None else terms
+
+    def __len__(self):
+        return len(self.counts)
+
+    @classmethod
+    def load(cls, conn):
+        columns = ", ".join(f'COALESCE("{grade}", 0)' for grade in GRADES)
+        rows = conn.execute(
+            f'SELECT "SubjectCatalogNbr", COALESCE("Instructors", \'\'), "Term", {columns}'
+            ' FROM GradeData WHERE "SubjectCatalogNbr" IS NOT NULL'
+        ).fetchall()
+        if not rows:
+            return cls(
+                np.zeros((0, len(GRADES)), dtype=np.int64),
+                np.zeros(0, dtype=np.int64),
+                np.zeros(0, dtype=np.int64),
+                [],
+                [],
+            )
+
+        courses, course_ids = np.unique([row[0] for row in rows], return_inverse=True)
+        instructors, instructor_ids = np.unique([row[1] for row in rows], return_inverse=True)
+        terms = np.array([parse_term(row[2]) for row in rows], dtype=np.int64)
+        counts = np.array([tuple(row)[3:] for row in rows], dtype=np.int64)
+        # GradeData has a few negative/garbage cells, they count as nobody
+        np.clip(counts, 0, None, out=counts)
+        return cls(
+            counts, course_ids, instructor_ids, courses.tolist(), instructors.tolist(), terms
+        )
+
+
+class GradeStats:
+    """per key arrays, row i of every array belongs to keys[i]"""
+
+    def __init__(self, keys, counts):
+        self.keys = keys
+        self.index = {key: i for i, key in enumerate(keys)}
+        self.counts = counts
+
+        letters = counts[:, LETTERS]
+        self.graded = letters.sum(axis=1)
+        self.students = counts.sum(axis=1)
+        self.gpa = _divide(letters @ GRADE_POINTS, self.graded)
+        self.pass_rate = _divide(
+            letters[:, PASSING].sum(axis=1) + counts[:, P], self.graded + counts[:, P] + counts[:, NP]
+        )
+        self.withdraw_rate = _divide(counts[:, W], self.students)
+        self.percentiles = {q: _grade_percentile(letters, self.graded, q) for q in PERCENTILES}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def get(self, *key):
+        """the numbers of one key as a dict, None if GradeData doesn't have it"""
+        i = self.index.get(key if len(key) > 1 else key[0])
+        if i is None:
+            return None
+        return {
+            "gpa": _number(self.gpa[i]),
+            "pass_rate": _number(self.pass_rate[i], 3),
+            "withdraw_rate": _number(self.withdraw_rate[i], 3),
+            "graded": int(self.graded[i]),
+            "students": int(self.students[i]),
+            **{f"p{q}": _number(self.percentiles[q][i]) for q in PERCENTILES},
+            "grades": dict(zip(GRADES, self.counts[i].tolist())),
+        }
+
+
+class GradeBook:
+    """
+    course and (course, instructor) stats of one GradeData load, either summed
+    from its rows or read from grade_aggregates' tables
+    """
+
+    def __init__(self, by_course, by_instructor):
+        self.by_course = by_course
+        self.by_instructor = by_instructor
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        return cls(grade_stats(matrix), grade_stats(matrix, by_instructor=True))
+
+    @classmethod
+    def load(cls, conn):
+        return cls.from_matrix(GradeMatrix.load(conn))
+
+    def course_instructors(self):
+        """course code -> every instructor GradeData has for it"""
+        instructors = {}
+        for course_code, instructor in self.by_instructor.keys:
+            if instructor:
+                instructors.setdefault(course_code, []).append(instructor)
+        return instructors
+
+    def gpa(self, course_code, instructor=None):
+        """
+        the instructor's gpa if they have letter grades (and aren't staff or an
+        initial), else the course's
+        """
+        if instructor and instructor.lower() != "staff" and "." not in instructor:
+            i = self.by_instructor.index.get((course_code, instructor))
+            if i is not None and self.by_instructor.graded[i]:
+                return _number(self.by_instructor.gpa[i])
+        i = self.by_course.index.get(course_code)
+        if i is not None and self.by_course.graded[i]:
+            return _number(self.by_course.gpa[i])
+        return None
+
+
+class TermIndex:
+    """
+    cumulative grade counts per key (course, or (course, instructor)) in term
+    order: a key's rows sit at starts[i]:ends[i] of terms/prefix, and the
+    counts of a term range are prefix[hi] - prefix[lo], with lo/hi a binary
+    search into the key's terms
+    """
+
+    def __init__(self, matrix, by_instructor=False):
+        group_ids, self.keys = _groups(matrix, by_instructor)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+
+        order = np.lexsort((matrix.terms, group_ids))
+        groups = group_ids[order]
+        self.terms = matrix.terms[order]
+        self.prefix = np.zeros((len(order) + 1, len(GRADES)), dtype=np.int64)
+        np.cumsum(matrix.counts[order], axis=0, out=self.prefix[1:])
+
+        ids = np.arange(len(self.keys))
+        self.starts = np.searchsorted(groups, ids, side="left")
+        self.ends = np.searchsorted(groups, ids, side="right")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def key_terms(self, key):
+        """the term codes a key has rows for, oldest first"""
+        i = self.index.get(key)
+        if i is None:
+            return []
+        return np.unique(self.terms[self.starts[i] : self.ends[i]]).tolist()
+
+    def latest_term(self):
+        return int(self.terms.max()) if len(self.terms) else None
+
+    def counts(self, key, from_term=None, to_term=None):
+        """summed grade counts of a key over from_term..to_term (both inclusive, None = open)"""
+        i = self.index.get(key)
+        if i is None:
+            return None
+        start, end = self.starts[i], self.ends[i]
+        terms = self.terms[start:end]
+        lo = start + (np.searchsorted(terms, from_term, side="left") if from_term is not None else 0)
+        hi = start + (np.searchsorted(terms, to_term, side="right") if to_term is not None else end - start)
+        return self.prefix[max(hi, lo)] - self.prefix[lo]
+
+    def stats(self, key, from_term=None, to_term=None):
+        """GradeStats.get of a key over a term range, None if the key has no rows"""
+        counts = self.counts(key, from_term, to_term)
+        if counts is None:
+            return None
+        return GradeStats([key], counts[None]).get(key)
+
+
+def grade_stats(matrix, by_instructor=False):
+    """GradeStats per course, or per (course, instructor)"""
+    group_ids, keys = _groups(matrix, by_instructor)
+    counts = np.zeros((len(keys), len(GRADES)), dtype=np.int64)
+    np.add.at(counts, group_ids, matrix.counts)
+    return GradeStats(keys, counts)
+
+
+def _groups(matrix, by_instructor):
+    """(group id of every row, key of every group)"""
+    if not by_instructor:
+        return matrix.course_ids, list(matrix.courses)
+    # one integer per (course, instructor) pair, only the pairs that occur get a row
+    width = max(len(matrix.instructors), 1)
+    groups, group_ids = np.unique(matrix.course_ids * width + matrix.instructor_ids, return_inverse=True)
+    keys = [(matrix.courses[group // width], matrix.instructors[group % width]) for group in groups.tolist()]
+    return group_ids, keys
+
+
+def _divide(numerator, denominator):
+    return np.divide(
+        numerator, denominator, out=np.full(len(numerator), np.nan), where=denominator > 0
+    )
+
+
+def _grade_percentile(letters, graded, q):
+    """
+    the grade point the q-th percentile student got, per row: the lowest grade
+    whose cumulative count (counting up from F) reaches q% of the class
+    """
+    ascending = letters[:, ::-1].cumsum(axis=1)
+    reached = ascending >= (graded * q / 100)[:, None]
+    first = reached.argmax(axis=1)
+    points = GRADE_POINTS[::-1][first]
+    return np.where(graded > 0, points, np.nan)
+
+
+def _number(value, digits=2):
+    return None if np.isnan(value) else round(float(value), digits)
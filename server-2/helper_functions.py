@@ -1,6 +1,9 @@
-import base64
 import json
+import os
+import queue
 import re
+import threading
+import time
 import requests
 
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -8,12 +11,26 @@ from pathlib import Path
 from typing import Any, Optional, Sequence
 from venv import logger
 
+from scraping.class_api import API_URL, class_url, subject_classes
+from scraping.rate_limit import create_limited_session
+from scraping.terms import CURRENT_TERM
+
 ### unused imports
 # import os
 # from click import File
 # import pdfplumber
 
-quarter = 2252
+# default term for the class api and class urls, set with PISA_TERM
+quarter = CURRENT_TERM
+
+# pooled + paced session for the my.ucsc.edu class api
+api_session = create_limited_session()
+
+# class api answers per (subject, term), (fetched at, classes)
+# short lived, only meant to fold together lookups that land close together
+SUBJECT_CACHE_SECONDS = int(os.getenv("CLASS_API_CACHE_SECONDS", 60))
+subject_cache = {}
+subject_cache_lock = threading.Lock()
 
 
 def normalize_instructor_name(name: str) -> str:
@@ -36,94 +53,6 @@ def get_initials(name: str) -> list:
     return [part[0].upper() for part in parts[:-1]]
 
 
-def calculate_gpa(grade_distribution: Optional[dict]) -> str:
-    if not grade_distribution:
-        return "N/A"
-
-    grade_points = {
-        "A+": 4.0,
-        "A": 4.0,
-        "A-": 3.7,
-        "B+": 3.3,
-        "B": 3.0,
-        "B-": 2.7,
-        "C+": 2.3,
-        "C": 2.0,
-        "C-": 1.7,
-        "D+": 1.3,
-        "D": 1.0,
-        "D-": 0.7,
-        "F": 0.0,
-    }
-
-    total_points = 0
-    total_students = 0
-
-    for grade, count in grade_distribution.items():
-        if count is None:
-            count = 0
-
-        count = int(count)
-
-        if grade in grade_points and count > 0:
-            total_points += grade_points[grade] * count
-            total_students += count
-
-    if total_students == 0:
-        return "N/A"
-
-    gpa = total_points / total_students
-    return f"{gpa:.2f}"
-
-
-def get_course_gpa(cursor, course_code: str, instructor: str = None) -> float:
-    """
-    Retrieve GPA for a specific course, trying instructor-specific first then falling back to overall course GPA
-
-    Args:
-        cursor: Database cursor
-        course_code: Course code (e.g., "MATH 19A")
-        instructor: Instructor name to filter by (optional)
-
-    Returns:
-        float: Calculated GPA based on grade distribution
-    """
-    base_query = """
-        SELECT 
-            COALESCE(SUM("A+"), 0) as "A+", COALESCE(SUM("A"), 0) as "A", COALESCE(SUM("A-"), 0) as "A-",
-            COALESCE(SUM("B+"), 0) as "B+", COALESCE(SUM("B"), 0) as "B", COALESCE(SUM("B-"), 0) as "B-",
-            COALESCE(SUM("C+"), 0) as "C+", COALESCE(SUM("C"), 0) as "C", COALESCE(SUM("C-"), 0) as "C-",
-            COALESCE(SUM("D+"), 0) as "D+", COALESCE(SUM("D"), 0) as "D", COALESCE(SUM("D-"), 0) as "D-",
-            COALESCE(SUM("F"), 0) as "F"
-        FROM GradeData 
-        WHERE "SubjectCatalogNbr" = ?
-    """
-
-    try:
-        if instructor and instructor.lower() != "staff" and "." not in instructor:
-            instructor_query = base_query + ' AND "Instructors" = ?'
-            cursor.execute(instructor_query, (course_code, instructor))
-            result = cursor.fetchone()
-
-            if result:
-                grade_distribution = {k: v for k, v in dict(result).items() if v > 0}
-                if grade_distribution:
-                    return calculate_gpa(grade_distribution)
-
-        cursor.execute(base_query, (course_code,))
-        result = cursor.fetchone()
-
-        if result:
-            grade_distribution = {k: v for k, v in dict(result).items() if v > 0}
-            if grade_distribution:
-                return calculate_gpa(grade_distribution)
-
-        return None
-
-    except Exception:  # as e
-        return None
-
-
 def find_matching_instructor(instructor: str, historical_instructors: list) -> str:
 
     if not instructor or not isinstance(historical_instructors, list):
@@ -169,6 +98,110 @@ def find_matching_instructor(instructor: str, historical_instructors: list) -> s
     return instructor
 
 
+def iter_in_background(iterable, maxsize: int = 100):
+    """
+    Run an iterator on a background thread and hand its items over through a bounded queue.
+    The producer blocks once maxsize items are waiting, so it never runs far ahead of the consumer.
+    Exceptions raised by the producer are re-raised in the consumer.
+    If the consumer stops early (break, exception, close()), the producer stops pulling items,
+    closes the source generator on its own thread (so its finally blocks run) and is joined.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    source = iter(iterable)
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in source:
+                if not put(("item", item)):
+                    return
+            put(("done", None))
+        except Exception as e:
+            put(("error", e))
+        finally:
+            # a generator can only be closed by the thread running it
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            kind, value = items.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        # consumer went away early (or finished), let the producer thread exit
+        stop.set()
+        producer.join()
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one and keep the result for ttl seconds.
+    Callers that arrive while a call is running wait for it and share its result (or its exception).
+    Exceptions are never cached, the next caller tries again.
+    """
+
+    def __init__(self, ttl: float = 300, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._results = {}  # key -> (expires at, value)
+        self._in_flight = {}  # key -> (done event, [value, exception])
+
+    def do(self, key, func):
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = (threading.Event(), [None, None])
+                self._in_flight[key] = flight
+
+        done, outcome = flight
+        if not leader:
+            done.wait()
+        else:
+            try:
+                outcome[0] = func()
+            except Exception as e:
+                outcome[1] = e
+            with self._lock:
+                if outcome[1] is None:
+                    if key not in self._results and len(self._results) >= self.maxsize:
+                        # oldest entry first (dicts keep insertion order)
+                        self._results.pop(next(iter(self._results)))
+                    self._results[key] = (time.monotonic() + self.ttl, outcome[0])
+                del self._in_flight[key]
+            done.set()
+
+        if outcome[1] is not None:
+            raise outcome[1]
+        return outcome[0]
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
 def split_course_code(course_code: str) -> tuple[str, str]:
     """Split course code into subject and catalog number, handling both space and dash formats"""
     parts = course_code.split(" ", 1)
@@ -183,88 +216,109 @@ def split_course_code(course_code: str) -> tuple[str, str]:
 
 
 def fetch_courses_parallel(
-    course_codes: list[str], max_workers: int = 10
+    course_codes: list[str], max_workers: int = 10, term: Optional[int] = None
 ) -> dict[str, dict]:
+    """
+    Resolve course codes against the class api, one request per subject.
+    Codes are grouped by subject, every subject is fetched once (in parallel, over the
+    pooled api session) and each code is looked up in that subject's catalog index.
+    A code without a catalog number maps to the subject's whole class list.
+    """
     api_cache = {}
 
-    def fetch_single_course(course_code: str) -> tuple[str, dict]:
-        try:
-            result = None
-            subject, catalog_num = split_course_code(course_code)
-            if not catalog_num:
-                result = fetch_course_from_api(subject)
-            else:
-                result = fetch_course_from_api(subject, catalog_num)
+    codes_by_subject = {}
+    for course_code in course_codes:
+        subject, catalog_num = split_course_code(course_code)
+        codes_by_subject.setdefault(subject, []).append((course_code, catalog_num))
 
-            return course_code, result
+    def fetch_subject(subject: str) -> tuple[str, Optional[list]]:
+        try:
+            return subject, fetch_subject_from_api(subject, term)
         except Exception as e:
-            logger.error(f"Error processing course {course_code}: {e}")
-            return course_code, None
+            logger.error(f"Error processing subject {subject}: {e}")
+            return subject, None
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {
-            executor.submit(fetch_single_course, code): code for code in course_codes
+            executor.submit(fetch_subject, subject): subject for subject in codes_by_subject
         }
 
         for future in as_completed(futures):
             try:
-                course_code, result = future.result()
-                if result is not None:
-                    api_cache[course_code] = result
+                subject, classes = future.result()
             except Exception as e:
                 logger.error(f"Error in future processing: {e}")
-                course_code = futures[future]
-                logger.error(f"Failed course code: {course_code}")
+                logger.error(f"Failed subject: {futures[future]}")
+                continue
+            if classes is None:
+                continue
+
+            catalog = catalog_index(classes)
+            for course_code, catalog_num in codes_by_subject[subject]:
+                result = catalog.get(catalog_num.strip()) if catalog_num else classes
+                if result is not None:
+                    api_cache[course_code] = result
 
     return api_cache
 
 
-def generate_class_url(class_nbr: int):
+def generate_class_url(class_nbr: int, term: Optional[int] = None):
+    return class_url(class_nbr, term or quarter)
 
-    # create the php-style serialized data string
-    class_data = (
-        f'a:2:{{s:5:":STRM";s:4:"{quarter}";s:10:":CLASS_NBR";s:5:"{class_nbr}";}}'
-    )
 
-    # base 64
-    encoded_class_data = base64.b64encode(class_data.encode()).decode()
+def catalog_index(classes: list) -> dict[str, dict]:
+    """catalog_nbr -> first class listed under it"""
+    index = {}
+    for course in classes:
+        catalog_nbr = (course.get("catalog_nbr") or "").strip()
+        if catalog_nbr:
+            index.setdefault(catalog_nbr, course)
+    return index
 
-    return f"https://pisa.ucsc.edu/class_search/index.php?action=detail&class_data={encoded_class_data}"
 
+def fetch_subject_from_api(subject: str, term: Optional[int] = None) -> Optional[list]:
+    """
+    Every class of a subject from the class api, None if the request failed.
+    Answers are kept for SUBJECT_CACHE_SECONDS so back to back lookups in the same
+    subject share one request.
+    """
+    key = (subject, term or quarter)
+    now = time.monotonic()
+    with subject_cache_lock:
+        cached = subject_cache.get(key)
+    if cached is not None and now - cached[0] < SUBJECT_CACHE_SECONDS:
+        return cached[1]
 
-def fetch_course_from_api(subject: str, catalog_nbr: Optional[str] = None) -> dict:
     try:
-        url = f"https://my.ucsc.edu/PSIGW/RESTListeningConnector/PSFT_CSPRD/SCX_CLASS_LIST.v1/{quarter}"
-
-        params = {"subject": subject}
-        if catalog_nbr is not None:
-            params["catalog_nbr"] = catalog_nbr
-
-        response = requests.get(url, params=params, timeout=10)
+        response = api_session.get(
+            f"{API_URL}{term or quarter}", params={"subject": subject}, timeout=10
+        )
 
         if response.status_code == 200:
-            data = response.json()
+            classes = subject_classes(response.json())
+            with subject_cache_lock:
+                subject_cache[key] = (now, classes)
+            return classes
 
-            if catalog_nbr is not None:
-                matching_courses = [
-                    course
-                    for course in data
-                    if course.get("catalog_nbr") == catalog_nbr
-                ]
-                return matching_courses[0] if matching_courses else None
-
-            return data  
-
-        logger.error(f"API request failed for {subject} {catalog_nbr}. Status code: {response.status_code}")
+        logger.error(f"API request failed for {subject}. Status code: {response.status_code}")
         logger.error(f"Response content: {response.text}")
         return None
 
     except Exception as e:
-        logger.error(f"API error for {subject} {catalog_nbr}: {str(e)}")
+        logger.error(f"API error for {subject}: {str(e)}")
         logger.error(f"Error type: {type(e)}")
         return None
 
 
+def fetch_course_from_api(
+    subject: str, catalog_nbr: Optional[str] = None, term: Optional[int] = None
+) -> dict:
+    classes = fetch_subject_from_api(subject, term)
+    if classes is None or catalog_nbr is None:
+        return classes
+    return catalog_index(classes).get(catalog_nbr.strip())
+
+
 def get_majors() -> dict[str, Any]:
     majors_path = Path("scraping", "majors")
     majors_data = dict()
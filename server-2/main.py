@@ -1,35 +1,103 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-import sqlite3
 import os
+import threading
+
+from grade_engine import GradeMatrix, TermIndex, parse_term
+from response_cache import ResponseCache
+from sqlite_pool import ReadOnlyPool, data_version
 
 app = Flask(__name__)
 # Allow *any* origin to hit every endpoint:
 CORS(app, resources={r"/*": {"origins": "*"}})
 DB_PATH = os.path.join(os.path.dirname(__file__), 'slugtistics.db')
 
+# read-only connections shared by every request and thread
+db_pool = ReadOnlyPool(DB_PATH)
+
+# hot queries, kept as constants so each pooled connection prepares them once
+ALL_CLASSES_QUERY = 'SELECT DISTINCT "SubjectCatalogNbr" FROM GradeData ORDER BY SubjectCatalogNbr'
+CLASS_INFO_QUERY = 'SELECT * FROM GradeData WHERE SubjectCatalogNbr = ?'
+
+
+# answers are reused until slugtistics.db changes, see response_cache.py
+response_cache = ResponseCache(lambda: data_version(DB_PATH))
+
 
 # Helper to query the database
 def query_db(query, args=(), one=False):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute(query, args)
-    rows = cur.fetchall()
-    conn.close()
-    return (rows[0] if rows else None) if one else rows
+    return db_pool.query(query, args, one)
+
+
+# term-range indexes over GradeData, (data version, by course, by (course, instructor))
+# rebuilt on the first request after the db file changes
+grade_indexes = None
+grade_indexes_lock = threading.Lock()
+
+
+def get_grade_indexes():
+    global grade_indexes
+    version = data_version(DB_PATH)
+    with grade_indexes_lock:
+        if grade_indexes is None or grade_indexes[0] != version:
+            with db_pool.connection() as conn:
+                matrix = GradeMatrix.load(conn)
+            grade_indexes = (version, TermIndex(matrix), TermIndex(matrix, by_instructor=True))
+        return grade_indexes[1:]
+
+
+# from/to: terms as pisa codes or names ("Fall 2023"), both inclusive
+# years: only the last n years of the data, overrides from
+def term_range(args, index):
+    from_term = parse_term(args["from"]) if args.get("from") else None
+    to_term = parse_term(args["to"]) if args.get("to") else None
+    years = args.get("years", type=int)
+    if years and index.latest_term():
+        # pisa codes step by 10 a year, same quarter n years ago is excluded
+        from_term = index.latest_term() - 10 * years + 1
+    return from_term, to_term
+
+
+# term_range plus since: only terms from the given instructor's first one on
+# (their first term with the class, from the TermIndex)
+# None if that instructor never taught the class
+def class_term_range(args, subject_catalog_nbr, index):
+    from_term, to_term = term_range(args, index)
+    since = args.get("since")
+    if since:
+        started = get_grade_indexes()[1].key_terms((subject_catalog_nbr, since))
+        if not started:
+            return None
+        from_term = max(from_term or 0, started[0])
+    return from_term, to_term
 
 # Route 1: Get all unique classes
 @app.route('/classes', methods=['GET'])
+@response_cache.cached
 def get_all_classes():
-    rows = query_db('SELECT DISTINCT "SubjectCatalogNbr" FROM GradeData ORDER BY SubjectCatalogNbr')
+    rows = query_db(ALL_CLASSES_QUERY)
     classes = [row['SubjectCatalogNbr'] for row in rows]
     return jsonify(classes)
 
 # Route 2: Get full info for a given class (includes P/NP and W)
+# from/to/years/since: see class_term_range. the range is resolved like
+# /class-gpa's, but this lists the class's raw GradeData rows and the
+# TermIndex only has summed counts, so the rows in range are picked out of
+# the class's own rows (one class, never a scan of the table)
 @app.route('/class-info/<subject_catalog_nbr>', methods=['GET'])
+@response_cache.cached
 def get_class_info(subject_catalog_nbr):
-    rows = query_db('SELECT * FROM GradeData WHERE SubjectCatalogNbr = ?', [subject_catalog_nbr])
+    rows = query_db(CLASS_INFO_QUERY, [subject_catalog_nbr])
+    if any(request.args.get(arg) for arg in ("from", "to", "years", "since")):
+        term_bounds = class_term_range(request.args, subject_catalog_nbr, get_grade_indexes()[0])
+        if term_bounds is None:
+            return jsonify({"error": "instructor never taught this class"}), 404
+        from_term, to_term = term_bounds
+        rows = [
+            row for row in rows
+            if (from_term is None or parse_term(row["Term"]) >= from_term)
+            and (to_term is None or parse_term(row["Term"]) <= to_term)
+        ]
     result = []
     for row in rows:
         result.append({
@@ -49,6 +117,35 @@ def get_class_info(subject_catalog_nbr):
 
     return jsonify(result)
 
+# Route 3: GPA and grade stats for a class over a range of terms
+# instructor: only their sections
+# since/from/to/years: see class_term_range
+@app.route('/class-gpa/<subject_catalog_nbr>', methods=['GET'])
+@response_cache.cached
+def get_class_gpa(subject_catalog_nbr):
+    by_course, by_instructor = get_grade_indexes()
+    instructor = request.args.get("instructor")
+    index, key = (
+        (by_instructor, (subject_catalog_nbr, instructor)) if instructor
+        else (by_course, subject_catalog_nbr)
+    )
+    if key not in index:
+        return jsonify({"error": "class not found"}), 404
+
+    term_bounds = class_term_range(request.args, subject_catalog_nbr, index)
+    if term_bounds is None:
+        return jsonify({"error": "instructor never taught this class"}), 404
+    from_term, to_term = term_bounds
+
+    stats = index.stats(key, from_term, to_term)
+    return jsonify({
+        "SubjectCatalogNbr": subject_catalog_nbr,
+        "Instructors": instructor,
+        "from": from_term,
+        "to": to_term,
+        **stats,
+    })
+
 
 if __name__ == '__main__':
     app.run(port=8080, debug=True)
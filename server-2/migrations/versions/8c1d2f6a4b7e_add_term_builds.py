@@ -0,0 +1,47 @@
+"""add term and build to course rows
+
+Revision ID: 8c1d2f6a4b7e
+Revises: 3fa0152c944f
+Create Date: 2025-08-18 10:12:31.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1d2f6a4b7e'
+down_revision = '3fa0152c944f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'course_models' in tables:
+        with op.batch_alter_table('course_models', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('term', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('build', sa.Integer(), nullable=True))
+            batch_op.create_index('ix_course_models_term_build', ['term', 'build'], unique=False)
+
+    if 'last_update' in tables:
+        with op.batch_alter_table('last_update', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('term', sa.Integer(), nullable=True))
+            batch_op.create_index(batch_op.f('ix_last_update_term'), ['term'], unique=False)
+
+    # primary key becomes (term, enroll_num), it's only a cache of detail
+    # pages so it's dropped and db.create_all() makes the new one
+    if 'course_fingerprints' in tables:
+        op.drop_table('course_fingerprints')
+
+
+def downgrade():
+    with op.batch_alter_table('last_update', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_last_update_term'))
+        batch_op.drop_column('term')
+
+    with op.batch_alter_table('course_models', schema=None) as batch_op:
+        batch_op.drop_index('ix_course_models_term_build')
+        batch_op.drop_column('build')
+        batch_op.drop_column('term')
@@ -18,6 +18,7 @@ class JSONType(TypeDecorator):
 class LastUpdateModel(db.Model):
     __tablename__ = 'last_update'
     id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.Integer, index=True)  # Term the update was for
     update_time = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(pytz.timezone('America/Los_Angeles')))
 class VisitorModel(db.Model):
     __tablename__ = 'visitors'
@@ -49,7 +50,10 @@ class Course(db.Model):
     gpa = db.Column(db.String(10))
 class CourseModel(db.Model):
     __tablename__ = 'course_models'
+    __table_args__ = (db.Index('ix_course_models_term_build', 'term', 'build'),)
     id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.Integer)  # Pisa term code (e.g. 2258 = Fall 2025)
+    build = db.Column(db.Integer)  # Which build of the term the row belongs to, see TermModel
 
     
     ge = db.Column(db.String(5))  # General Education requirement (e.g., 'GE-A')
@@ -75,3 +79,27 @@ class CourseModel(db.Model):
     grading = db.Column(db.String(20)) 
     course_type = db.Column(db.String(20))
     has_enrollment_reqs = db.Column(db.Boolean, nullable=False, default=False)
+
+
+class CourseFingerprintModel(db.Model):
+    __tablename__ = 'course_fingerprints'
+
+    term = db.Column(db.Integer, primary_key=True)  # Class numbers are only unique within a term
+    enroll_num = db.Column(db.String(10), primary_key=True)  # Class number the detail page belongs to
+    content_hash = db.Column(db.String(64))  # sha256 of the detail page body
+    etag = db.Column(db.String(200))  # ETag header pisa sent back, if any
+    last_modified = db.Column(db.String(50))  # Last-Modified header, if any
+    details = db.Column(JSONType)  # Parsed detail page so unchanged pages can skip parsing
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(pytz.timezone('America/Los_Angeles')), onupdate=lambda: datetime.now(pytz.timezone('America/Los_Angeles')))
+
+
+class TermModel(db.Model):
+    __tablename__ = 'terms'
+
+    term = db.Column(db.Integer, primary_key=True)  # Pisa term code
+    build = db.Column(db.Integer)  # Build id of the last complete build, the rows that get served
+    building = db.Column(db.Integer)  # Build id currently being written, if any
+    status = db.Column(db.String(10), default='building')  # 'building', 'ready' or 'failed'
+    course_count = db.Column(db.Integer, default=0)  # Courses in the served build
+    is_active = db.Column(db.Boolean, nullable=False, default=False)  # The term the site serves, only one at a time
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(pytz.timezone('America/Los_Angeles')), onupdate=lambda: datetime.now(pytz.timezone('America/Los_Angeles')))
@@ -0,0 +1,114 @@
+"""
+versioned response cache for the grade-data endpoints
+
+slugtistics.db only changes when a new grade release is loaded, so a 200
+answer of a view is kept (raw and gzipped, built once) per endpoint, view
+args and query string, under the data version it was built from. a new
+version (see sqlite_pool.data_version, which also moves on WAL commits that
+haven't reached the main db file yet) drops every entry. the ETag is the
+version plus a hash of the body, so a conditional request with a matching
+If-None-Match is a 304 without running the view at all
+
+    @app.route("/classes")
+    @response_cache.cached
+    def get_all_classes(): ...
+"""
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, request
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 4096))
+RESPONSE_CACHE_MAX_AGE = int(os.getenv("RESPONSE_CACHE_MAX_AGE", 300))
+# below this gzip isn't worth the header
+GZIP_MIN_SIZE = 512
+
+
+class CachedResponse:
+    def __init__(self, body, mimetype, etag):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9) if len(body) >= GZIP_MIN_SIZE else None
+        self.mimetype = mimetype
+        self.etag = etag
+
+
+class ResponseCache:
+    def __init__(self, version, size=RESPONSE_CACHE_SIZE, max_age=RESPONSE_CACHE_MAX_AGE):
+        # version(): the current data version, anything hashable
+        self.version = version
+        self.size = size
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._entries_version = None
+        self._lock = threading.Lock()
+
+    def _key(self):
+        return (
+            request.endpoint,
+            tuple(sorted((request.view_args or {}).items())),
+            tuple(sorted(request.args.items(multi=True))),
+        )
+
+    def _get(self, key, version):
+        with self._lock:
+            if version != self._entries_version:
+                self._entries.clear()
+                self._entries_version = version
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, version, entry):
+        with self._lock:
+            if version != self._entries_version:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def _respond(self, entry):
+        if entry.etag in request.if_none_match:
+            response = Response(status=304)
+        elif entry.gzipped is not None and "gzip" in request.accept_encodings:
+            response = Response(entry.gzipped, mimetype=entry.mimetype)
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = Response(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        response.headers["Vary"] = "Accept-Encoding"
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response
+
+    def cached(self, view):
+        """cache a view's 200 answers, anything else passes through untouched"""
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version = self.version()
+            key = self._key()
+            entry = self._get(key, version)
+            if entry is None:
+                response = view(*args, **kwargs)
+                # views may return (response, status)
+                if isinstance(response, tuple) or response.status_code != 200:
+                    return response
+                body = response.get_data()
+                etag = f"{version}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"
+                entry = CachedResponse(body, response.mimetype, etag)
+                self._put(key, version, entry)
+            return self._respond(entry)
+
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._entries_version = None
@@ -2,19 +2,38 @@ from datetime import datetime, timedelta
 import re
 from flask import Blueprint, jsonify, request, session
 from contextlib import contextmanager
-from sqlalchemy import func, case
+from sqlalchemy import func, case, exists, or_
 from tenacity import retry, stop_after_attempt, wait_exponential
 import logging
+import os
 import re
-from scraping.ratings import get_detailed_professor_info
-from models.data_models import CourseModel, LastUpdateModel, VisitorModel, db
+import threading
+from scraping.ratings import get_detailed_professor_info, get_professor_review_stats
+from models.data_models import (
+    CourseModel,
+    LastUpdateModel,
+    TermModel,
+    VisitorModel,
+    db,
+)
 from config import app
-from helper_functions import get_major_courses, get_majors, compute_recommendations
+from helper_functions import (
+    SingleFlight,
+    compute_recommendations,
+    get_major_courses,
+    get_majors,
+)
 from PyPDF2 import PdfReader, errors as pdf_errors
 
 
 logger = logging.getLogger(__name__)
 courses_bp = Blueprint("courses", __name__)
+
+# a popular course page asks for the same instructor from many users at once,
+# one rmp lookup per (instructor, course) answers all of them for a while
+INSTRUCTOR_RATINGS_TTL = int(os.getenv("INSTRUCTOR_RATINGS_TTL", 600))
+instructor_ratings_flight = SingleFlight(ttl=INSTRUCTOR_RATINGS_TTL)
+review_stats_flight = SingleFlight(ttl=INSTRUCTOR_RATINGS_TTL)
 # chatbot, ignore
 # course_recommender = None
 # def init_course_recommender(app):
@@ -34,20 +53,83 @@ courses_bp = Blueprint("courses", __name__)
 #         raise
 
 
+# course -> prereqs of the served build, rebuilt once a build flip changes
+# which (term, build) is served (see current_prereq_dict)
 prereq_dict ={}
+prereq_build = None
+prereq_lock = threading.Lock()
+
+
+# the term (and build of it) that gets served: the active one, or a specific
+# term that has a finished build (?term=2260 to look at the upcoming term)
+# None when nothing has been built per term yet
+def served_term(session, term=None):
+    query = session.query(TermModel).filter(TermModel.build.isnot(None))
+    if term is not None:
+        return query.filter(TermModel.term == term).first()
+    return query.filter(TermModel.is_active.is_(True)).first()
+
+
+# CourseModel rows of the served build. the term/build pointer is a subquery of
+# the same SELECT as the rows, so both come from one snapshot: finish_build
+# flipping the pointer and deleting the old build's rows can't leave a request
+# holding the old build id with no rows behind it
+def served_courses(session, term=None):
+    pointer = TermModel.build.isnot(None) & (
+        TermModel.term == term if term is not None else TermModel.is_active.is_(True)
+    )
+    serves = exists().where(
+        pointer, TermModel.term == CourseModel.term, TermModel.build == CourseModel.build
+    )
+    query = session.query(CourseModel)
+    if term is not None:
+        return query.filter(serves)
+    # before the first term build everything in the table is served
+    return query.filter(or_(serves, ~exists().where(pointer)))
+
+
+def served_last_update(session, term=None):
+    served = served_term(session, term)
+    query = session.query(LastUpdateModel)
+    if served is not None:
+        query = query.filter(LastUpdateModel.term == served.term)
+    return query.order_by(LastUpdateModel.id.desc()).first()
+
+
+def refresh_prereq_dict(session):
+    """prereq_dict, rebuilt first if the served (term, build) changed since it was made"""
+    global prereq_dict, prereq_build
+    served = served_term(session)
+    build = (served.term, served.build) if served is not None else None
+    with prereq_lock:
+        if prereq_dict and build == prereq_build:
+            return prereq_dict
+        prereqs = {}
+        rows = served_courses(session).with_entities(
+            CourseModel.subject, CourseModel.catalog_num, CourseModel.enrollment_reqs
+        )
+        for subject, catalog_num, enrollment_reqs in rows:
+            prereqs[f"{subject} {catalog_num}"] = enrollment_reqs["courses"]
+        # swapped in whole, readers never see a half built dict
+        prereq_dict, prereq_build = prereqs, build
+        return prereq_dict
+
+
+def current_prereq_dict():
+    with app.app_context():
+        session = db.session()
+        try:
+            return refresh_prereq_dict(session)
+        finally:
+            session.close()
 
 
 def init_prereq_dict(app):
     "make prereq dict"
-    global prereq_dict
     with app.app_context():
         session = db.session()
         try:
-            courses = session.query(CourseModel).all()
-            for course in courses:
-                key = f"{course.subject} {course.catalog_num}"
-                prereq_dict[key] = course.enrollment_reqs["courses"]
-            return prereq_dict
+            return refresh_prereq_dict(session)
 
         except Exception as e:
             logger.error(f"Error initializing prereq_list: {str(e)}")
@@ -86,8 +168,36 @@ def execute_with_retry(query_func):
 def get_instructor_ratings():
     instructor = request.args.get("instructor")
     course = request.args.get("course")
-    instructor_ratings = get_detailed_professor_info(instructor, course)
-    return instructor_ratings.to_dict() if instructor_ratings else None
+
+    def lookup():
+        instructor_ratings = get_detailed_professor_info(instructor, course)
+        return instructor_ratings.to_dict() if instructor_ratings else None
+
+    try:
+        instructor_ratings = instructor_ratings_flight.do((instructor, course), lookup)
+    except ValueError as e:
+        # no instructor, or "Staff"
+        return jsonify({"error": str(e)}), 400
+    if instructor_ratings is None:
+        return jsonify({"error": "Instructor not found"}), 404
+    return jsonify(instructor_ratings)
+
+
+# tag frequencies, difficulty over time and per-course numbers over every
+# review of an instructor (course narrows it down to that class's reviews)
+@courses_bp.route("/instructor_review_stats", methods=["GET"])
+def get_instructor_review_stats():
+    instructor = request.args.get("instructor")
+    course = request.args.get("course")
+    try:
+        stats = review_stats_flight.do(
+            (instructor, course), lambda: get_professor_review_stats(instructor, course)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if stats is None:
+        return jsonify({"error": "Instructor not found"}), 404
+    return jsonify(stats)
 
 
 @courses_bp.route("/all_majors", methods=["GET"])
@@ -109,7 +219,7 @@ def get_major_classes(major):
 
 @courses_bp.route("/prereq/<prereq>", methods=["GET"])
 def get_prereq(prereq):
-    return jsonify(prereq_dict[prereq])
+    return jsonify(current_prereq_dict()[prereq])
 
 
 @courses_bp.route("/course_details/<enroll_num>", methods=["GET"])
@@ -119,7 +229,7 @@ def get_course_details(enroll_num):
             session = db.session()
             try:
                 course = (
-                    session.query(CourseModel)
+                    served_courses(session, request.args.get("term", type=int))
                     .filter(CourseModel.enroll_num == enroll_num)
                     .first()
                 )
@@ -202,11 +312,12 @@ def get_ge_courses():
         with app.app_context():
             session = db.session()
             try:
+                term = request.args.get("term", type=int)
                 courses = (
-                    session.query(CourseModel).filter(CourseModel.ge.isnot(None)).all()
+                    served_courses(session, term).filter(CourseModel.ge.isnot(None)).all()
                 )
 
-                last_update = session.query(LastUpdateModel).first()
+                last_update = served_last_update(session, term)
                 formatted_last_update = None
                 if last_update:
                     formatted_last_update = last_update.update_time.strftime(
@@ -282,8 +393,9 @@ def get_all_courses():
         with app.app_context():
             session = db.session()
             try:
-                courses = session.query(CourseModel).all()
-                last_update = session.query(LastUpdateModel).first()
+                term = request.args.get("term", type=int)
+                courses = served_courses(session, term).all()
+                last_update = served_last_update(session, term)
 
                 formatted_last_update = None
                 if last_update:
@@ -365,7 +477,7 @@ def major_recommendations():
         )
 
     classes_taken = [c.strip() for c in classes_str.split(",")]
-    equiv, recs = compute_recommendations(classes_taken, major, prereq_dict)
+    equiv, recs = compute_recommendations(classes_taken, major, current_prereq_dict())
 
     return jsonify(
         {"equiv_classes": equiv, "recommended_classes": recs, "success": True}
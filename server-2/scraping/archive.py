@@ -0,0 +1,243 @@
+"""
+compressed, content addressed archive of the raw pages we scrape
+
+every listing and detail page the scraper fetches can be kept here so a
+parser fix can be applied by re-parsing the archive (ucsc_courses.
+iter_archived_courses / `flask --app app reparse-archive`) instead of
+re-scraping the whole term
+
+one sqlite file, two tables:
+    blobs: sha256 of the raw page -> compressed bytes (zstd, zlib without it)
+    pages: (term, kind, key) -> latest blob for that page + which scrape run
+identical pages (unchanged detail pages, the same listing fetched hourly)
+are stored once no matter how many times they were fetched
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, zlib is always there
+    zstandard = None
+
+# pages written before the pending inserts are committed
+COMMIT_EVERY = 200
+
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    term INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    run INTEGER NOT NULL,
+    hash TEXT NOT NULL REFERENCES blobs (hash),
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (term, kind, key)
+);
+CREATE INDEX IF NOT EXISTS pages_run ON pages (term, kind, run);
+"""
+
+
+def _compressobj(codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return zlib.compressobj(ZLIB_LEVEL)
+
+
+def _decompress(codec, data):
+    if codec == "zstd":
+        # streamed frames don't carry their size, so no one-shot decompress()
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return zlib.decompress(data)
+
+
+class PageArchive:
+    """
+    thread safe (detail pages are archived from the fetch pool) and picklable,
+    a copy sent to a listing shard process reopens the file on its own and
+    keeps writing under the same run. scrapes write through the handle
+    start_run returns, so two scrapes of a term at once keep their own runs
+    """
+
+    def __init__(self, path, runs=None):
+        self.path = str(path)
+        # pages from one scrape of a term share a run, re-parsing uses the
+        # latest listing run so classes dropped since then don't come back
+        # (per term since terms are scraped at the same time). only ever set
+        # on a start_run handle, never changed under a scrape that's running
+        self.runs = dict(runs or {})
+        self.codec = "zstd" if zstandard is not None else "zlib"
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def __getstate__(self):
+        return {"path": self.path, "runs": self.runs}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], runs=state["runs"])
+
+    def start_run(self, term):
+        """
+        handle on the archive for a new run of a term, call at the start of
+        every scrape and write its pages through the handle. it shares this
+        archive's connection, only the run ids are its own, so a refresh that
+        starts mid-build doesn't move the build's pages to its run
+        """
+        # not copy.copy, that goes through __setstate__ and opens a new connection
+        run = object.__new__(type(self))
+        run.__dict__.update(self.__dict__)
+        run.runs = {**self.runs, term: time.time_ns()}
+        run._pending = 0
+        return run
+
+    def _store(self, term, kind, key, content_hash, codec, data, size):
+        with self._lock:
+            if data is not None:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO blobs (hash, codec, size, data) VALUES (?, ?, ?, ?)",
+                    (content_hash, codec, size, data),
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (term, kind, key, run, hash, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (term, kind, str(key), self.runs.get(term, 0), content_hash, time.time()),
+            )
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def has_blob(self, content_hash):
+        with self._lock:
+            return (
+                self._conn.execute(
+                    "SELECT 1 FROM blobs WHERE hash = ?", (content_hash,)
+                ).fetchone()
+                is not None
+            )
+
+    def put(self, term, kind, key, content, content_hash=None):
+        """archive one fetched page (raw bytes), returns its hash"""
+        content_hash = content_hash or hashlib.sha256(content).hexdigest()
+        if self.has_blob(content_hash):
+            self._store(term, kind, key, content_hash, None, None, None)
+        else:
+            compressor = _compressobj(self.codec)
+            data = compressor.compress(content) + compressor.flush()
+            self._store(term, kind, key, content_hash, self.codec, data, len(content))
+        return content_hash
+
+    def link(self, term, kind, key, content_hash):
+        """
+        point a page at a blob we already have (a 304 for a page archived
+        by an earlier run), returns False if the blob isn't in the archive
+        """
+        if not content_hash or not self.has_blob(content_hash):
+            return False
+        self._store(term, kind, key, content_hash, None, None, None)
+        return True
+
+    def tee(self, chunks, term, kind, key):
+        """
+        pass a streamed response's chunks through unchanged while hashing and
+        compressing them on the side, the page is stored once the stream ends
+        so streaming parsers stay bounded in memory
+        """
+        digest = hashlib.sha256()
+        compressor = _compressobj(self.codec)
+        parts = []
+        size = 0
+        for chunk in chunks:
+            digest.update(chunk)
+            parts.append(compressor.compress(chunk))
+            size += len(chunk)
+            yield chunk
+        parts.append(compressor.flush())
+        self._store(term, kind, key, digest.hexdigest(), self.codec, b"".join(parts), size)
+
+    def get(self, term, kind, key):
+        """raw bytes of the latest archived page, None if we never saw it"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT blobs.codec, blobs.data FROM pages JOIN blobs USING (hash)"
+                " WHERE term = ? AND kind = ? AND key = ?",
+                (term, kind, str(key)),
+            ).fetchone()
+        return _decompress(*row) if row else None
+
+    def latest_run(self, term, kind):
+        """the most recent run that archived pages of a kind, None if none did"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT MAX(run) FROM pages WHERE term = ? AND kind = ?", (term, kind)
+            ).fetchone()[0]
+
+    def iter_pages(self, term, kind, latest_run=False, run=None):
+        """
+        (key, raw bytes) for every page of a kind, in key order
+        latest_run: only pages from the most recent run that wrote this kind
+        run: only pages from this run
+        """
+        query = (
+            "SELECT key, blobs.codec, blobs.data FROM pages JOIN blobs USING (hash)"
+            " WHERE term = ? AND kind = ?"
+        )
+        params = [term, kind]
+        if latest_run:
+            query += " AND run = (SELECT MAX(run) FROM pages WHERE term = ? AND kind = ?)"
+            params += [term, kind]
+        elif run is not None:
+            query += " AND run = ?"
+            params.append(run)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY key", params).fetchall()
+        for key, codec, data in rows:
+            yield key, _decompress(codec, data)
+
+    def prune(self):
+        """drop blobs no page points at anymore, returns how many"""
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM pages)"
+            ).rowcount
+            self._conn.commit()
+            self._pending = 0
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            pages, = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()
+            blobs, raw, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs"
+            ).fetchone()
+        return {
+            "pages": pages,
+            "blobs": blobs,
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "file_bytes": os.path.getsize(self.path),
+        }
+
+    def flush(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.flush()
+        self._conn.close()
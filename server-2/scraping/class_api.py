@@ -0,0 +1,428 @@
+"""
+course ingestion from the SCX_CLASS_LIST REST api instead of pisa's html
+
+one JSON request per subject (fetched in parallel) replaces the 2000 record
+listing pages: code, title, instructor, meeting, seats and status all come
+straight from the api. html is only used for what the api doesn't have:
+    - detail page fields (description, notes, requirements, ge, credits, ...)
+      still come from the (conditional, fingerprinted) detail pages
+    - a subject whose api request fails is searched on pisa like before, and
+      so is one with classes that can't be mapped, taking only those classes
+      from pisa
+
+the api also lists discussion/lab sections as classes of their own, so the
+seat count refresh (scrape_count) updates sections by their class number and
+only falls back to a detail page for sections the api didn't return
+
+set COURSE_SOURCE=api to build from here (see app.py)
+"""
+import base64
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+from scraping.terms import CURRENT_TERM
+from scraping.ucsc_courses import (
+    DETAIL_WORKERS,
+    SEARCH_URL,
+    Course,
+    apply_course_details,
+    create_session,
+    iter_course_details,
+    iter_archived_listing as iter_archived_listing_pages,
+    iter_listing,
+    iter_listing_page,
+    parse_subjects,
+    reduced_process_course_page,
+)
+
+API_URL = "https://my.ucsc.edu/PSIGW/RESTListeningConnector/PSFT_CSPRD/SCX_CLASS_LIST.v1/"
+
+# subjects fetched at the same time
+API_WORKERS = int(os.getenv("CLASS_API_WORKERS", 8))
+
+# components pisa lists under a class's "Associated Discussion Sections or Labs"
+# instead of as classes of their own
+SECTION_COMPONENTS = {"DIS", "LAB"}
+
+# instruction_mode codes -> what pisa shows as "Instruction Mode:"
+INSTRUCTION_MODES = {
+    "P": "In Person",
+    "AO": "Asynchronous Online",
+    "SO": "Synchronous Online",
+    "HY": "Hybrid",
+}
+
+
+def class_url(class_nbr, term=CURRENT_TERM):
+    """pisa detail page url for a class number"""
+    # php serialized array pisa expects in class_data
+    class_data = f'a:2:{{s:5:":STRM";s:4:"{term}";s:10:":CLASS_NBR";s:5:"{class_nbr}";}}'
+    encoded = base64.b64encode(class_data.encode()).decode()
+    return f"{SEARCH_URL}index.php?action=detail&class_data={encoded}"
+
+
+def subject_classes(payload):
+    """the list of classes in an api response ({"classes": [...]} or a bare list)"""
+    if isinstance(payload, dict):
+        payload = payload.get("classes")
+    return payload if isinstance(payload, list) else []
+
+
+def fetch_subject(session, subject, term=CURRENT_TERM, archive=None):
+    """every class of a subject, None if the request failed"""
+    try:
+        response = session.get(f"{API_URL}{term}", params={"subject": subject}, timeout=15)
+        if response.status_code != 200:
+            print(f"Class api returned {response.status_code} for {subject}")
+            return None
+        payload = response.json()
+    except Exception as e:
+        print(f"Error fetching {subject} from the class api: {e}")
+        return None
+
+    if archive is not None:
+        archive.put(term, "class_api", subject, response.content)
+    return subject_classes(payload)
+
+
+def iter_subject_classes(session, subjects, term=CURRENT_TERM, max_workers=API_WORKERS, archive=None):
+    """(subject, classes or None) for every subject, in order, fetched in parallel"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from zip(
+            subjects,
+            executor.map(
+                lambda subject: fetch_subject(session, subject, term, archive), subjects
+            ),
+        )
+
+
+def _first(items):
+    return items[0] if isinstance(items, list) and items else {}
+
+
+def _instructor(entry):
+    instructor = _first(entry.get("instructors"))
+    name = (instructor.get("name") if isinstance(instructor, dict) else instructor) or ""
+    name = name.strip()
+    if not name:
+        return "Staff"
+    # same "Last,First" -> "First Last" flip the listing parser does
+    if "," in name:
+        last, first = name.split(",", 1)
+        name = f"{first.strip()} {last.strip()}"
+    return name
+
+
+def _meeting(entry):
+    meeting = _first(entry.get("meetings"))
+    days = (meeting.get("days") or "").strip()
+    start = (meeting.get("start_time") or "").strip()
+    end = (meeting.get("end_time") or "").strip()
+    schedule = f"{days} {start}-{end}" if days and start and end else "Asynchronous"
+    return schedule, (meeting.get("location") or "").strip()
+
+
+def _seats(entry):
+    total = entry.get("enrl_total")
+    capacity = entry.get("enrl_capacity")
+    if total is None or capacity is None:
+        return "N/A"
+    return f"{total}/{capacity}"
+
+
+def is_section(entry):
+    return str(entry.get("component", "")).upper() in SECTION_COMPONENTS
+
+
+def course_fields(entry, term=CURRENT_TERM):
+    """
+    Course kwargs for one api class, same shapes the listing parser produces
+    None if the entry is missing what we need to identify the class
+    """
+    class_nbr = entry.get("class_nbr")
+    subject = (entry.get("subject") or "").strip()
+    catalog_nbr = (entry.get("catalog_nbr") or "").strip()
+    if not class_nbr or not subject or not catalog_nbr:
+        return None
+
+    schedule, location = _meeting(entry)
+    mode = entry.get("instruction_mode") or ""
+    return {
+        "code": f"{subject} {catalog_nbr}",
+        "name": (entry.get("title") or entry.get("title_long") or "").strip(),
+        "instructor": _instructor(entry),
+        "link": class_url(class_nbr, term),
+        "class_count": _seats(entry),
+        "enroll_num": str(class_nbr),
+        "class_type": INSTRUCTION_MODES.get(mode, mode),
+        "schedule": schedule,
+        "location": location,
+        "class_status": entry.get("enrl_status") or "Unknown",
+    }
+
+
+def section_fields(entry, section):
+    """a stored discussion section dict with the api's current seats/status"""
+    return {
+        **section,
+        "class_count": _seats(entry),
+        "wait_count": str(entry.get("waitlist_total", section.get("wait_count", ""))),
+        "class_status": entry.get("enrl_status") or section.get("class_status"),
+    }
+
+
+def map_classes(classes, term=CURRENT_TERM, reduced=False, sections=None):
+    """
+    (courses, unmapped) for a subject's api classes, mapped one at a time
+    unmapped: class numbers of the entries that couldn't be mapped, None
+    stands for one without a number (so every class pisa has is wanted)
+    sections: see iter_api_listing
+    """
+    courses = []
+    unmapped = set()
+    for entry in classes:
+        try:
+            if is_section(entry):
+                if sections is not None and entry.get("class_nbr"):
+                    sections[str(entry["class_nbr"])] = entry
+                continue
+            fields = course_fields(entry, term)
+        except (AttributeError, TypeError, ValueError):
+            fields = None
+        if fields is None:
+            class_nbr = entry.get("class_nbr") if isinstance(entry, dict) else None
+            unmapped.add(str(class_nbr) if class_nbr else None)
+            continue
+        if reduced:
+            fields = {
+                key: fields[key]
+                for key in ("link", "class_count", "enroll_num", "class_status")
+            }
+        courses.append(Course(**fields))
+    return courses, unmapped
+
+
+def unmapped_courses(courses, unmapped):
+    """the pisa courses standing in for a subject's unmapped api classes"""
+    if None in unmapped:
+        return courses
+    return (course for course in courses if str(course.enroll_num) in unmapped)
+
+
+def _subjects(session, subjects):
+    if subjects is not None:
+        return sorted(subjects)
+    # the search form's subject dropdown, the only html page we still need
+    return parse_subjects(session.get(SEARCH_URL).text)
+
+
+def iter_api_listing(
+    session,
+    term=CURRENT_TERM,
+    reduced=False,
+    max_workers=API_WORKERS,
+    subjects=None,
+    archive=None,
+    sections=None,
+):
+    """
+    the listing iter_listing would give, built from the api subject by subject
+    subjects the api can't serve are searched on pisa instead, and classes it
+    returns but can't be mapped are taken from the subject's pisa listing
+    sections: optional dict filled with class number -> api entry for every
+    discussion/lab section seen (for scrape_count)
+    archive: the pisa pages of a fallback are archived too, so a re-parse
+    (iter_archived_listing) gets the same courses
+    """
+    seen = set()
+    for subject, classes in iter_subject_classes(
+        session, _subjects(session, subjects), term, max_workers, archive
+    ):
+        if classes is None:
+            print(f"Falling back to pisa for {subject}")
+            courses = iter_listing(session, subject, reduced=reduced, archive=archive, term=term)
+        else:
+            courses, unmapped = map_classes(classes, term, reduced, sections)
+            if unmapped:
+                print(f"Falling back to pisa for {len(unmapped)} classes of {subject}")
+                courses = chain(
+                    courses,
+                    unmapped_courses(
+                        iter_listing(session, subject, reduced=reduced, archive=archive, term=term),
+                        unmapped,
+                    ),
+                )
+
+        for course in courses:
+            if course.enroll_num in seen:
+                continue
+            seen.add(course.enroll_num)
+            yield course
+
+
+def iter_api_courses(
+    max_workers=DETAIL_WORKERS,
+    fingerprints=None,
+    session=None,
+    archive=None,
+    term=CURRENT_TERM,
+    subjects=None,
+):
+    """
+    iter_all_courses with the listing taken from the api, detail pages are
+    still fetched (conditionally, with fingerprints) for the fields only
+    they have
+    """
+    if session is None:
+        session = create_session(pool_size=max(max_workers, API_WORKERS) + 1)
+    total = 0
+    if archive is not None:
+        archive = archive.start_run(term)
+
+    try:
+        listing = iter_api_listing(
+            session, term, subjects=subjects, archive=archive
+        )
+        for course, course_details in iter_course_details(
+            session,
+            listing,
+            max_workers=max_workers,
+            fingerprints=fingerprints,
+            archive=archive,
+            term=term,
+        ):
+            total += 1
+            yield apply_course_details(course, course_details)
+
+    except Exception as e:
+        print(f"Error loading courses from the class api: {e}")
+    finally:
+        if archive is not None:
+            archive.flush()
+
+    print(f"Finished loading {term} from the class api. Total courses found: {total}")
+
+
+def scrape_count(
+    max_workers=DETAIL_WORKERS,
+    session=None,
+    known_sections=None,
+    archive=None,
+    term=CURRENT_TERM,
+    subjects=None,
+):
+    """
+    the api version of ucsc_courses.scrape_count
+    known_sections: enroll_num -> the discussion_sections stored for it.
+    sections are refreshed from the api by their own class number, a detail
+    page is only fetched for a class with a section the api didn't list, or
+    for a class we haven't seen before
+    """
+    if session is None:
+        session = create_session(pool_size=max(max_workers, API_WORKERS) + 1)
+    known_sections = known_sections or {}
+    api_sections = {}
+    course_list = []
+    if archive is not None:
+        archive = archive.start_run(term)
+
+    def needs_detail_page(course):
+        stored = known_sections.get(str(course.enroll_num))
+        if stored is None:
+            return True
+        return any(str(section.get("enroll_num")) not in api_sections for section in stored)
+
+    try:
+        # the whole listing has to be in before we know which sections the api had
+        listing = list(
+            iter_api_listing(
+                session,
+                term,
+                reduced=True,
+                subjects=subjects,
+                archive=archive,
+                sections=api_sections,
+            )
+        )
+
+        for course, course_details in iter_course_details(
+            session,
+            listing,
+            process_page=reduced_process_course_page,
+            max_workers=max_workers,
+            should_fetch=needs_detail_page,
+            archive=archive,
+            term=term,
+        ):
+            if "discussion_sections" in course_details:
+                course.discussion_sections = course_details["discussion_sections"]
+            else:
+                # skipped (or failed) detail page, the api has every section
+                course.discussion_sections = [
+                    section_fields(api_sections[str(section.get("enroll_num"))], section)
+                    if str(section.get("enroll_num")) in api_sections
+                    else section
+                    for section in known_sections.get(str(course.enroll_num), [])
+                ]
+            course_list.append(course)
+
+    except Exception as e:
+        print(f"Error refreshing counts from the class api: {e}")
+    finally:
+        if archive is not None:
+            archive.flush()
+
+    print(f"Finished refreshing {term} from the class api. Total courses found: {len(course_list)}")
+    return course_list
+
+
+def iter_archived_listing(archive, term=CURRENT_TERM):
+    """
+    the listing of the latest archived api run, for
+    ucsc_courses.iter_archived_courses(archive, term, listing=...)
+    subjects (and unmapped classes) that fell back to pisa during that run
+    come from its listing pages, like they did in iter_api_listing
+    """
+    run = archive.latest_run(term, "class_api")
+    if run is None:
+        # never built from the api, the pisa listing is all there is
+        yield from iter_archived_listing_pages(archive, term)
+        return
+
+    unmapped = {}
+    for subject, payload in archive.iter_pages(term, "class_api", run=run):
+        try:
+            classes = subject_classes(json.loads(payload))
+        except ValueError as e:
+            print(f"Error reading archived class api response for {subject}: {e}")
+            continue
+        courses, unmapped[subject] = map_classes(classes, term)
+        yield from courses
+
+    # listing pages are keyed "<subject>/<page>", a subject without an api
+    # response fell back as a whole
+    for key, page in archive.iter_pages(term, "listing", run=run):
+        subject = key.rsplit("/", 1)[0]
+        try:
+            courses = list(iter_listing_page([page]))
+        except Exception as e:
+            print(f"Error parsing archived listing page {key}: {e}")
+            continue
+        if subject in unmapped:
+            courses = unmapped_courses(courses, unmapped[subject])
+        yield from courses
+
+
+if __name__ == "__main__":
+    # python -m scraping.class_api CSE [term]: dump what a subject maps to
+    import sys
+
+    subject = sys.argv[1]
+    term = int(sys.argv[2]) if len(sys.argv) > 2 else CURRENT_TERM
+    classes = fetch_subject(create_session(pool_size=1), subject, term)
+    if classes is None:
+        sys.exit(1)
+    for entry in classes:
+        print(json.dumps(course_fields(entry, term) if not is_section(entry) else entry))
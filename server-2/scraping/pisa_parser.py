@@ -0,0 +1,323 @@
+"""
+lxml backend for the pisa class search pages
+
+the BeautifulSoup functions in ucsc_courses.py walk each panel's columns five
+or six times and call .text on them over and over. these do a single pass over
+lxml's tree per panel, read every column's text once, and hand back plain
+field dicts so ucsc_courses can keep building the Course objects itself
+
+run `python -m scraping.pisa_parser listing.html detail.html ...` from
+server-2 to check that both backends give identical output on saved pages
+"""
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:  # lxml is optional, ucsc_courses falls back to html.parser
+    etree = lxml_html = None
+
+
+BASE_URL = "https://pisa.ucsc.edu/class_search/"
+
+# bs4's class_="a b" matches the whole (whitespace normalized) class attribute
+PANELS = '//div[normalize-space(@class)="panel panel-default row"]'
+LISTING_COLS = (
+    './/div[normalize-space(@class)="col-xs-6 col-sm-3"'
+    ' or normalize-space(@class)="col-xs-6 col-sm-6"'
+    ' or normalize-space(@class)="col-xs-6 col-sm-3 hide-print"]'
+)
+SECTION_COLS = './/div[normalize-space(@class)="col-xs-6 col-sm-3"]'
+HEADING = './/div[normalize-space(@class)="panel-heading panel-heading-custom"]'
+NEXT_BUTTON = '//a[contains(@onclick, "next")]'
+SUBJECT_OPTIONS = '//select[@name="binds[:subject]"]/option/@value'
+
+
+# bs4's class_="a" matches any element that has "a" as one of its classes
+def _with_class(name, tag="*"):
+    return f'.//{tag}[contains(concat(" ", normalize-space(@class), " "), " {name} ")]'
+
+
+def _text(element):
+    # plain str so results don't hold on to the tree (and can be pickled)
+    return str(element.text_content())
+
+
+def _first(elements):
+    return elements[0] if elements else None
+
+
+def parse_document(html):
+    return lxml_html.fromstring(html)
+
+
+def iter_panels(root):
+    return root.xpath(PANELS)
+
+
+def has_next_page(root):
+    return bool(root.xpath(NEXT_BUTTON))
+
+
+def subject_options(root):
+    return [str(value) for value in root.xpath(SUBJECT_OPTIONS) if value.strip()]
+
+
+def listing_panel_fields(panel, reduced=False):
+    """one pass over a listing panel, same fields as parse_course_panel"""
+    link_element = panel.find(".//a")
+    link_url = f"{BASE_URL}{link_element.attrib['href']}"
+
+    status_element = _first(panel.xpath(_with_class("sr-only", "span")))
+    class_status = _text(status_element) if status_element is not None else "Unknown"
+
+    enroll_num = None
+    teacher_name = "Staff"
+    class_count = "N/A"
+    schedule = "Asynchronous"
+    location = ""
+    class_type = ""
+    found = set()
+
+    for col in panel.xpath(LISTING_COLS):
+        text = _text(col)
+
+        if " ".join(col.get("class", "").split()).endswith("hide-print"):
+            if not reduced and "type" not in found and "Instruction Mode:" in text:
+                class_type = _text(col.find(".//b")).strip()
+                found.add("type")
+            continue
+
+        if "enroll_num" not in found and "Class Number: " in text:
+            enroll_num = text.replace("Class Number: ", "").strip()
+            found.add("enroll_num")
+
+        if "count" not in found and "Enrolled" in text:
+            try:
+                nums = [int(s) for s in text.split() if s.isdigit()]
+                if len(nums) >= 2:
+                    class_count = f"{nums[0]}/{nums[1]}"
+            except (ValueError, IndexError):
+                pass
+            found.add("count")
+
+        if reduced:
+            continue
+
+        if "instructor" not in found and "Instructor: " in text:
+            teacher_name = text.replace("Instructor: ", "").strip()
+            if "," in teacher_name:
+                names = teacher_name.split(",")
+                teacher_name = f"{names[1].strip()} {names[0].strip()}"
+            found.add("instructor")
+
+        if "schedule" not in found and "Day and Time: " in text:
+            schedule_text = text.replace("Day and Time: ", "").strip()
+            schedule = schedule_text if schedule_text else "Asynchronous"
+            found.add("schedule")
+
+        if "location" not in found and "Location: " in text:
+            location = text.replace("Location: ", "").strip()
+            found.add("location")
+
+    if reduced:
+        return {
+            "link": link_url,
+            "class_count": class_count,
+            "enroll_num": enroll_num,
+            "class_status": class_status,
+        }
+
+    parts = _text(link_element).strip().split(" - ", 1)
+    class_code = parts[0].strip()
+    class_name = parts[1].strip() if len(parts) > 1 else ""
+    class_name = " ".join(word for word in class_name.split() if not word[0].isdigit())
+
+    return {
+        "code": class_code,
+        "name": class_name,
+        "instructor": teacher_name,
+        "link": link_url,
+        "class_count": class_count,
+        "enroll_num": enroll_num,
+        "class_type": class_type,
+        "schedule": schedule,
+        "location": location,
+        "class_status": class_status,
+    }
+
+
+def iter_listing_panels(chunks, reduced=False, state=None, encoding=None):
+    """
+    streaming version of iter_panels + listing_panel_fields
+    chunks of the results page go through lxml's pull parser and every panel
+    is turned into fields as soon as its closing tag shows up, then dropped
+    from the tree, so a 2000 record page never exists in memory all at once
+    if a state dict is passed, state["has_next"] says whether there is a next page
+    encoding is the charset of the chunks' bytes, without one libxml2 reads
+    them as latin-1 and mangles every non-ascii name
+    """
+    if state is None:
+        state = {}
+    state["has_next"] = False
+
+    parser = etree.HTMLPullParser(events=("end",), encoding=encoding)
+    # same element classes lxml.html.fromstring gives us (text_content etc.)
+    parser.set_element_class_lookup(lxml_html.HtmlElementClassLookup())
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from _drain_listing_events(parser, reduced, state)
+
+    parser.close()
+    yield from _drain_listing_events(parser, reduced, state)
+
+
+def _drain_listing_events(parser, reduced, state):
+    for _, element in parser.read_events():
+        if element.tag == "a":
+            if "next" in (element.get("onclick") or ""):
+                state["has_next"] = True
+            continue
+
+        if element.tag != "div" or " ".join(element.get("class", "").split()) != (
+            "panel panel-default row"
+        ):
+            continue
+
+        fields = listing_panel_fields(element, reduced=reduced)
+
+        # free the panel and everything parsed before it, keep the tail text
+        # so lxml doesn't have to stitch siblings back together
+        element.clear(keep_tail=True)
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
+
+        yield fields
+
+
+def _discussion_sections(panel_body):
+    texts = [_text(div) for div in panel_body.xpath(SECTION_COLS)]
+    discussion_sections = []
+
+    for i in range(0, len(texts) - 6, 7):
+        group = texts[i : i + 7]
+        try:
+            section_code = group[0].strip()
+            discussion_sections.append(
+                {
+                    "code": " ".join(section_code.split()[1:]),
+                    "enroll_num": section_code.split()[0].replace("#", ""),
+                    "schedule": group[1].strip(),
+                    "instructor": group[2].strip(),
+                    "location": group[3].replace("Loc: ", "").strip(),
+                    "class_count": group[4].replace("Enrl: ", "").strip(),
+                    "wait_count": group[5].replace("Wait: ", "").strip(),
+                    "class_status": group[6].strip(),
+                }
+            )
+        except Exception:
+            continue
+
+    return discussion_sections
+
+
+def detail_page_fields(html, reduced=False):
+    """same dict process_course_page / reduced_process_course_page build"""
+    if reduced:
+        course_details = {"discussion_sections": []}
+    else:
+        course_details = {
+            "description": "",
+            "class_notes": "",
+            "enrollment_reqs": "",
+            "discussion_sections": [],
+            "general_education": None,
+            "credits": None,
+            "career": None,
+            "grading": None,
+            "type": None,
+        }
+
+    try:
+        if not html or not html.strip():
+            return course_details
+
+        for index, panel in enumerate(iter_panels(parse_document(html))):
+            header_div = _first(panel.xpath(HEADING))
+            header_elem = (header_div if header_div is not None else panel).find(".//h2")
+            header = _text(header_elem).strip() if header_elem is not None else None
+            if not header:
+                continue
+
+            panel_body = _first(panel.xpath(_with_class("panel-body")))
+            if panel_body is None:
+                continue
+
+            if "Associated Discussion Sections or Labs" in header:
+                course_details["discussion_sections"] = _discussion_sections(panel_body)
+            elif reduced:
+                continue
+            elif index == 0:  # First panel contains course info
+                for dl in panel_body.xpath(_with_class("dl-horizontal")):
+                    for dt, dd in zip(dl.findall(".//dt"), dl.findall(".//dd")):
+                        label = _text(dt).strip()
+                        value = _text(dd).strip()
+
+                        if label == "Credits":
+                            course_details["credits"] = (
+                                value.replace(" units", "").replace("units", "").strip()
+                            )
+                        elif label == "Career":
+                            course_details["career"] = value
+                        elif label == "General Education":
+                            course_details["general_education"] = value if value != "" else None
+                        elif label == "Grading":
+                            course_details["grading"] = value
+                        elif label == "Type":
+                            course_details["type"] = value
+            elif "Description" in header:
+                course_details["description"] = _text(panel_body).strip()
+            elif "Class Notes" in header:
+                course_details["class_notes"] = _text(panel_body).strip()
+            elif "Enrollment Requirements" in header:
+                course_details["enrollment_reqs"] = _text(panel_body).strip()
+
+    except Exception as e:
+        print(f"Error processing course page: {e}")
+
+    return course_details
+
+
+if __name__ == "__main__":
+    # equivalence check against the BeautifulSoup parser on captured pages
+    import sys
+    from scraping import ucsc_courses
+
+    mismatches = 0
+    for path in sys.argv[1:]:
+        with open(path, encoding="utf-8") as fp:
+            page = fp.read()
+
+        for reduced in (False, True):
+            if "Class Number: " in page:
+                expected, expected_next = ucsc_courses.parse_listing_page(
+                    page, reduced=reduced, backend="soup"
+                )
+                actual, actual_next = ucsc_courses.parse_listing_page(
+                    page, reduced=reduced, backend="lxml"
+                )
+                expected = [course.to_dict() for course in expected] + [expected_next]
+                actual = [course.to_dict() for course in actual] + [actual_next]
+            else:
+                expected = ucsc_courses.parse_course_page(page, reduced, backend="soup")
+                actual = ucsc_courses.parse_course_page(page, reduced, backend="lxml")
+
+            label = "reduced" if reduced else "full"
+            if expected == actual:
+                print(f"{path} ({label}): identical")
+            else:
+                mismatches += 1
+                print(f"{path} ({label}): MISMATCH")
+                print(f"  soup: {expected}")
+                print(f"  lxml: {actual}")
+
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,287 @@
+"""
+adaptive per-host request pacing for everything we scrape
+
+every upstream host (pisa, my.ucsc.edu, ratemyprofessors) gets one shared
+AdaptiveLimiter: a token bucket for requests/sec plus an AIMD window for how
+many requests can be in flight. successes with normal latency slowly open
+both up while the recent error rate is low, latency spikes cut them in half
+and 429/503s, 5xxs and timeouts cut them by more the higher the error rate
+has climbed, so we sit close to whatever the upstream tolerates without hand
+tuning
+
+sessions from create_limited_session() (ucsc_courses.create_session is one)
+go through RateLimitedAdapter, which does the acquire/release around each send
+and retries throttled answers itself, so every attempt is paced and counted.
+asyncio clients (rmp_client.RMPClient.aquery) await aacquire() instead
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# statuses that mean "slow down" rather than "broken request"
+THROTTLE_STATUSES = {429, 503}
+# statuses worth asking again
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# how often a coroutine waiting on a full window checks for a free slot
+ASYNC_POLL_SECONDS = 0.05
+# the limiter doesn't open up again until the error rate (EWMA of throttled
+# or failed answers) has decayed below this
+ERROR_RATE_HOLD = 0.05
+# retries of a throttled answer, and seconds before the first one (doubled
+# for every one after) when the server sends no Retry-After
+THROTTLE_RETRIES = 3
+THROTTLE_BACKOFF = 0.5
+
+# starting points, AIMD moves each host between min and max on its own
+# these are per process: sharded listing workers (ucsc_courses.iter_sharded_listing)
+# each get 1/workers of them through share_limits, so pisa sees the numbers
+# below from the workers together, plus whatever detail pages the parent fetches
+HOST_LIMITS = {
+    # the 2000 record listing page alone takes seconds to render
+    "pisa.ucsc.edu": {"rate": 8.0, "concurrency": 8, "target_latency": 5.0},
+    "my.ucsc.edu": {"rate": 4.0, "concurrency": 4},
+    "www.ratemyprofessors.com": {"rate": 5.0, "concurrency": 4},
+}
+DEFAULT_LIMITS = {"rate": 4.0, "concurrency": 4}
+
+RATE_LIMITING = os.getenv("RATE_LIMITING", "1") == "1"
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        rate=4.0,
+        concurrency=4,
+        min_rate=0.5,
+        max_rate=50.0,
+        max_concurrency=32,
+        target_latency=2.0,
+    ):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+
+        self.tokens = 1.0
+        self.in_flight = 0
+        self.latency = None  # EWMA of response time
+        self.error_rate = 0.0  # EWMA of throttled/failed responses
+        self._successes = 0
+        self._last_refill = time.monotonic()
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(
+            max(1.0, self.rate), self.tokens + (now - self._last_refill) * self.rate
+        )
+        self._last_refill = now
+
+    def _try_take(self):
+        # take a slot and a token if both are free, caller holds _cond
+        self._refill(time.monotonic())
+        if self.in_flight < self.concurrency and self.tokens >= 1:
+            self.tokens -= 1
+            self.in_flight += 1
+            return True
+        return False
+
+    def acquire(self):
+        """block until there is both a free slot and a token"""
+        with self._cond:
+            while not self._try_take():
+                if self.in_flight >= self.concurrency:
+                    self._cond.wait()
+                else:
+                    self._cond.wait((1 - self.tokens) / self.rate)
+
+    async def aacquire(self):
+        """acquire for asyncio callers, waits on the event loop instead of blocking it"""
+        while True:
+            with self._cond:
+                if self._try_take():
+                    return
+                # release() can't wake a coroutine, so a full window is polled
+                if self.in_flight >= self.concurrency:
+                    wait = ASYNC_POLL_SECONDS
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def release(self, latency, status=None, failed=False):
+        """
+        report how the request went
+        status: http status code, failed: connection error/timeout
+        """
+        throttled = failed or status in THROTTLE_STATUSES or (status or 0) >= 500
+        with self._cond:
+            self.in_flight -= 1
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self.error_rate = 0.9 * self.error_rate + (0.1 if throttled else 0.0)
+
+            if throttled:
+                # a lone error only trims, a run of them (the error rate
+                # climbing) halves
+                self._decrease(max(0.5, 1 - 2 * self.error_rate))
+            elif self.latency > self.target_latency:
+                self._decrease(0.5)
+            elif self.error_rate < ERROR_RATE_HOLD:
+                self._increase()
+            self._cond.notify_all()
+
+    def _increase(self):
+        # additive: +1 in flight per window's worth of successes, rate creeps up
+        self._successes += 1
+        if self._successes >= self.concurrency:
+            self._successes = 0
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+        self.rate = min(self.max_rate, self.rate + 1.0 / max(self.rate, 1.0))
+
+    def _decrease(self, factor):
+        # multiplicative, but only once per latency window so one burst of
+        # failures from requests already in flight doesn't collapse us to zero
+        now = time.monotonic()
+        if now - self._last_decrease < max(self.latency or 0.0, 1.0):
+            return
+        self._last_decrease = now
+        self._successes = 0
+        self.concurrency = max(1, int(self.concurrency * factor))
+        self.rate = max(self.min_rate, self.rate * factor)
+        logger.info(
+            f"Backing off: rate {self.rate:.2f}/s, concurrency {self.concurrency}, "
+            f"latency {self.latency:.2f}s, error rate {self.error_rate:.2f}"
+        )
+
+    def stats(self):
+        with self._cond:
+            return {
+                "rate": self.rate,
+                "concurrency": self.concurrency,
+                "in_flight": self.in_flight,
+                "latency": self.latency,
+                "error_rate": self.error_rate,
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+# fraction of every host's limits this process gets, see share_limits
+_limit_share = 1.0
+
+
+def share_limits(share):
+    """
+    give this process only share (0-1] of every host's rate and concurrency,
+    ceilings included, for when several processes hit the same hosts at once.
+    used as the process pool initializer of the sharded listing
+    """
+    global _limit_share
+    with _limiters_lock:
+        _limit_share = share
+        _limiters.clear()
+
+
+def limiter_for(url):
+    """the shared limiter for url's host"""
+    host = urlsplit(url).hostname or ""
+    with _limiters_lock:
+        if host not in _limiters:
+            limits = {**DEFAULT_LIMITS, **HOST_LIMITS.get(host, {})}
+            if _limit_share < 1:
+                limits["rate"] *= _limit_share
+                limits["concurrency"] = max(1, int(limits["concurrency"] * _limit_share))
+                limits["max_rate"] = limits.get("max_rate", 50.0) * _limit_share
+                limits["max_concurrency"] = max(1, int(limits.get("max_concurrency", 32) * _limit_share))
+                limits["min_rate"] = min(limits.get("min_rate", 0.5), limits["rate"])
+            _limiters[host] = AdaptiveLimiter(**limits)
+        return _limiters[host]
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that paces every send through the host's AdaptiveLimiter
+    throttled answers (THROTTLE_STATUSES) are retried here instead of by
+    urllib3's Retry, which would hide all but the last attempt from the limiter
+    throttle_methods: methods they're retried for, same as the Retry's
+    """
+
+    def __init__(self, throttle_retries=THROTTLE_RETRIES, throttle_methods=None, **kwargs):
+        super().__init__(**kwargs)
+        self.throttle_retries = throttle_retries
+        self.throttle_methods = throttle_methods or Retry.DEFAULT_ALLOWED_METHODS
+
+    def send(self, request, **kwargs):
+        retries = self.throttle_retries if request.method in self.throttle_methods else 0
+        for attempt in range(retries + 1):
+            response = self._send(request, **kwargs)
+            if response.status_code not in THROTTLE_STATUSES or attempt == retries:
+                return response
+            wait = _retry_after(response, THROTTLE_BACKOFF * 2**attempt)
+            response.close()
+            time.sleep(wait)
+
+    def _send(self, request, **kwargs):
+        if not RATE_LIMITING:
+            return super().send(request, **kwargs)
+
+        limiter = limiter_for(request.url)
+        limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = super().send(request, **kwargs)
+        except requests.RequestException:
+            limiter.release(time.monotonic() - start, failed=True)
+            raise
+        except Exception:
+            limiter.release(time.monotonic() - start)
+            raise
+        limiter.release(time.monotonic() - start, status=response.status_code)
+        return response
+
+
+def _retry_after(response, default):
+    # only the seconds form, an http date falls back to our own backoff
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", default)))
+    except ValueError:
+        return default
+
+
+def create_limited_session(pool_size=10, retries=3, retry_methods=None):
+    """
+    requests session with retries, a pool of pool_size connections and pacing
+    retry_methods: methods retries apply to, urllib3's idempotent ones by default
+    urllib3 retries connection errors and 5xxs, throttled answers are
+    RateLimitedAdapter's
+    """
+    session = requests.Session()
+    methods = frozenset(retry_methods) if retry_methods else Retry.DEFAULT_ALLOWED_METHODS
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=[status for status in RETRY_STATUSES if status not in THROTTLE_STATUSES],
+        allowed_methods=methods,
+        # it would still retry a 429/503 that has a Retry-After header
+        respect_retry_after_header=False,
+    )
+    adapter = RateLimitedAdapter(
+        throttle_retries=retries,
+        throttle_methods=methods,
+        max_retries=retry,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
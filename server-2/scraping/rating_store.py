@@ -0,0 +1,310 @@
+"""
+columnar storage and numpy analytics for a professor's reviews
+
+every review rmp has for a teacher (ratings.fetch_all_ratings pages through
+all of them, not just the first 10) is kept as one RatingColumns: a numpy
+array per field instead of a ProfessorRating per review, tags as ids into a
+per-teacher vocabulary (csr style: tag_ptr[i]:tag_ptr[i + 1] are review i's
+tags) and courses the same way. serialized with np.savez_compressed into the
+ratings cache so a view doesn't re-download the reviews
+
+the aggregates (tag frequencies, difficulty over time, per-course numbers)
+are bincounts over those arrays, no per-review python. records() turns the
+columns back into the per-review dicts /instructor_ratings serves
+"""
+import io
+
+import numpy as np
+
+# rmp joins a review's tags with "--"
+TAG_SEPARATOR = "--"
+# bumped whenever COLUMNS changes, older serialized reviews are fetched again
+FORMAT_VERSION = 2
+
+COLUMNS = (
+    "dates",
+    "difficulty",
+    "clarity",
+    "helpful",
+    "would_take_again",
+    "thumbs_up",
+    "thumbs_down",
+    "course_ids",
+    "tag_ptr",
+    "tag_ids",
+    "comments",
+    "online",
+    "for_credit",
+    "attendance",
+    "textbook_use",
+    "flag_status",
+)
+
+
+def normalize_class(name):
+    return (name or "").replace(" ", "").upper()
+
+
+def _date(value):
+    # "2024-05-01 00:00:00 +0000 UTC"
+    return (value or "")[:10] or "NaT"
+
+
+class RatingColumns:
+    def __init__(self, courses, tags, **columns):
+        self.courses = list(courses)
+        self.tags = list(tags)
+        for name in COLUMNS:
+            setattr(self, name, columns[name])
+
+    def __len__(self):
+        return len(self.dates)
+
+    @classmethod
+    def from_ratings(cls, ratings):
+        """build from raw rmp rating nodes"""
+        courses, course_index = [], {}
+        tags, tag_index = [], {}
+        course_ids = []
+        tag_ptr = [0]
+        tag_ids = []
+        for rating in ratings:
+            course = normalize_class(rating.get("class"))
+            if course not in course_index:
+                course_index[course] = len(courses)
+                courses.append(course)
+            course_ids.append(course_index[course])
+
+            for tag in filter(None, (rating.get("ratingTags") or "").split(TAG_SEPARATOR)):
+                tag = tag.strip()
+                if tag not in tag_index:
+                    tag_index[tag] = len(tags)
+                    tags.append(tag)
+                tag_ids.append(tag_index[tag])
+            tag_ptr.append(len(tag_ids))
+
+        def column(field, dtype, default=0):
+            return np.array([rating.get(field) or default for rating in ratings], dtype=dtype)
+
+        would_take_again = np.array(
+            [
+                -1 if rating.get("wouldTakeAgain") is None else int(rating["wouldTakeAgain"] == 1)
+                for rating in ratings
+            ],
+            dtype=np.int8,
+        )
+        return cls(
+            courses,
+            tags,
+            dates=np.array([_date(rating.get("date")) for rating in ratings], dtype="datetime64[D]"),
+            difficulty=column("difficultyRating", np.float32),
+            clarity=column("clarityRating", np.float32),
+            helpful=column("helpfulRating", np.float32),
+            would_take_again=would_take_again,
+            thumbs_up=column("thumbsUpTotal", np.int32),
+            thumbs_down=column("thumbsDownTotal", np.int32),
+            course_ids=np.array(course_ids, dtype=np.int32),
+            tag_ptr=np.array(tag_ptr, dtype=np.int32),
+            tag_ids=np.array(tag_ids, dtype=np.int32),
+            comments=np.array([rating.get("comment") or "" for rating in ratings], dtype=str),
+            online=np.array([bool(rating.get("isForOnlineClass")) for rating in ratings], dtype=bool),
+            for_credit=np.array([bool(rating.get("isForCredit")) for rating in ratings], dtype=bool),
+            attendance=np.array([rating.get("attendanceMandatory") or "" for rating in ratings], dtype=str),
+            textbook_use=np.array(
+                [-1 if rating.get("textbookUse") is None else rating["textbookUse"] for rating in ratings],
+                dtype=np.int16,
+            ),
+            flag_status=np.array([rating.get("flagStatus") or "" for rating in ratings], dtype=str),
+        )
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            version=np.array(FORMAT_VERSION),
+            courses=np.array(self.courses, dtype=str),
+            tags=np.array(self.tags, dtype=str),
+            **{name: getattr(self, name) for name in COLUMNS},
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """raises ValueError for reviews serialized by an older FORMAT_VERSION"""
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            if "version" not in arrays or int(arrays["version"]) != FORMAT_VERSION:
+                raise ValueError("reviews were stored in an older format")
+            return cls(
+                arrays["courses"].tolist(),
+                arrays["tags"].tolist(),
+                **{name: arrays[name] for name in COLUMNS},
+            )
+
+    def for_course(self, course):
+        """the reviews of one class (e.g. "CSE 101"), tag ids stay valid"""
+        course = normalize_class(course)
+        if course not in self.courses:
+            mask = np.zeros(len(self), dtype=bool)
+        else:
+            mask = self.course_ids == self.courses.index(course)
+        counts = np.diff(self.tag_ptr)
+        tag_mask = np.repeat(mask, counts)
+        return RatingColumns(
+            self.courses,
+            self.tags,
+            **{name: getattr(self, name)[mask] for name in COLUMNS if name not in ("tag_ptr", "tag_ids")},
+            tag_ptr=np.concatenate(([0], np.cumsum(counts[mask]))).astype(np.int32),
+            tag_ids=self.tag_ids[tag_mask],
+        )
+
+
+def records(columns):
+    """one dict per review, in rmp's order (newest first)"""
+    tag_ptr = columns.tag_ptr.tolist()
+    tag_ids = columns.tag_ids.tolist()
+    tags = [
+        TAG_SEPARATOR.join(columns.tags[i] for i in tag_ids[start:end])
+        for start, end in zip(tag_ptr, tag_ptr[1:])
+    ]
+    dates = [None if date == "NaT" else date for date in np.datetime_as_string(columns.dates).tolist()]
+    return [
+        {
+            "class_name": columns.courses[course_id],
+            "date": date,
+            "helpful_rating": helpful,
+            "clarity_rating": clarity,
+            "difficulty_rating": difficulty,
+            "overall_rating": overall,
+            "comment": comment,
+            "thumbs_up": thumbs_up,
+            "thumbs_down": thumbs_down,
+            "would_take_again": would_take_again == 1,
+            "is_online": online,
+            "is_for_credit": for_credit,
+            "attendance_mandatory": attendance,
+            "textbook_use": textbook_use,
+            "tags": review_tags,
+            "flag_status": flag_status,
+        }
+        for (
+            course_id, date, helpful, clarity, difficulty, overall, comment, thumbs_up, thumbs_down,
+            would_take_again, online, for_credit, attendance, textbook_use, review_tags, flag_status,
+        ) in zip(
+            columns.course_ids.tolist(),
+            dates,
+            columns.helpful.tolist(),
+            columns.clarity.tolist(),
+            columns.difficulty.tolist(),
+            ((columns.helpful + columns.clarity) / 2).tolist(),
+            columns.comments.tolist(),
+            columns.thumbs_up.tolist(),
+            columns.thumbs_down.tolist(),
+            columns.would_take_again.tolist(),
+            columns.online.tolist(),
+            columns.for_credit.tolist(),
+            columns.attendance.tolist(),
+            columns.textbook_use.tolist(),
+            tags,
+            columns.flag_status.tolist(),
+        )
+    ]
+
+
+def _mean(values):
+    return round(float(values.mean()), 2) if len(values) else None
+
+
+def _means(sums, counts):
+    return np.divide(sums, counts, out=np.full(len(sums), np.nan), where=counts > 0)
+
+
+def summary(columns):
+    known = columns.would_take_again >= 0
+    return {
+        "reviews": len(columns),
+        "difficulty": _mean(columns.difficulty),
+        "clarity": _mean(columns.clarity),
+        "helpful": _mean(columns.helpful),
+        "would_take_again_percent": (
+            round(float(columns.would_take_again[known].mean()) * 100, 1) if known.any() else None
+        ),
+    }
+
+
+def tag_frequencies(columns, limit=None):
+    """tags by how many reviews use them, with their share of all reviews"""
+    counts = np.bincount(columns.tag_ids, minlength=len(columns.tags))
+    order = np.argsort(-counts, kind="stable")
+    order = order[counts[order] > 0][:limit]
+    total = max(len(columns), 1)
+    return [
+        {"tag": columns.tags[i], "count": int(counts[i]), "share": round(float(counts[i]) / total, 3)}
+        for i in order
+    ]
+
+
+def difficulty_trend(columns):
+    """average difficulty and clarity per calendar quarter, oldest first"""
+    valid = ~np.isnat(columns.dates)
+    dates = columns.dates[valid]
+    if not len(dates):
+        return []
+    years = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+    months = dates.astype("datetime64[M]").astype(np.int64) % 12
+    periods, inverse = np.unique(years * 4 + months // 3, return_inverse=True)
+
+    counts = np.bincount(inverse)
+    difficulty = _means(np.bincount(inverse, weights=columns.difficulty[valid]), counts)
+    clarity = _means(np.bincount(inverse, weights=columns.clarity[valid]), counts)
+    return [
+        {
+            "period": f"{period // 4}-Q{period % 4 + 1}",
+            "reviews": int(count),
+            "difficulty": round(float(d), 2),
+            "clarity": round(float(c), 2),
+        }
+        for period, count, d, c in zip(periods, counts, difficulty, clarity)
+    ]
+
+
+def course_breakdown(columns):
+    """per class numbers, most reviewed first"""
+    size = len(columns.courses)
+    ids = columns.course_ids
+    counts = np.bincount(ids, minlength=size)
+    difficulty = _means(np.bincount(ids, weights=columns.difficulty, minlength=size), counts)
+    clarity = _means(np.bincount(ids, weights=columns.clarity, minlength=size), counts)
+    helpful = _means(np.bincount(ids, weights=columns.helpful, minlength=size), counts)
+
+    known = columns.would_take_again >= 0
+    known_counts = np.bincount(ids[known], minlength=size)
+    would_take_again = _means(
+        np.bincount(ids[known], weights=columns.would_take_again[known], minlength=size), known_counts
+    )
+
+    breakdown = []
+    for i in np.argsort(-counts, kind="stable"):
+        if not counts[i]:
+            continue
+        breakdown.append(
+            {
+                "course": columns.courses[i],
+                "reviews": int(counts[i]),
+                "difficulty": round(float(difficulty[i]), 2),
+                "clarity": round(float(clarity[i]), 2),
+                "helpful": round(float(helpful[i]), 2),
+                "would_take_again_percent": (
+                    round(float(would_take_again[i]) * 100, 1) if known_counts[i] else None
+                ),
+            }
+        )
+    return breakdown
+
+
+def review_stats(columns, tag_limit=20):
+    return {
+        **summary(columns),
+        "tags": tag_frequencies(columns, tag_limit),
+        "difficulty_trend": difficulty_trend(columns),
+        "courses": course_breakdown(columns),
+    }
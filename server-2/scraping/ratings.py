@@ -1,47 +1,83 @@
+import asyncio
+import logging
+import os
 import re
-import requests
-from typing import Optional, Dict, Any, List
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-
-
-@dataclass
-class ProfessorRating:
-    class_name: str
-    date: str
-    helpful_rating: float
-    clarity_rating: float
-    difficulty_rating: float
-    overall_rating: float
-    comment: str
-    thumbs_up: int
-    thumbs_down: int
-    would_take_again: bool
-    is_online: bool
-    is_for_credit: bool
-    attendance_mandatory: bool
-    textbook_use: str
-    tags: List[str]
-    flag_status: str
-
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            "class_name": self.class_name,
-            "date": self.date,
-            "helpful_rating": self.helpful_rating,
-            "clarity_rating": self.clarity_rating,
-            "difficulty_rating": self.difficulty_rating,
-            "overall_rating": self.overall_rating,
-            "comment": self.comment,
-            "thumbs_up": self.thumbs_up,
-            "thumbs_down": self.thumbs_down,
-            "would_take_again": self.would_take_again,
-            "is_online": self.is_online,
-            "is_for_credit": self.is_for_credit,
-            "attendance_mandatory": self.attendance_mandatory,
-            "textbook_use": self.textbook_use,
-            "tags": self.tags,
-            "flag_status": self.flag_status,
-        }
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+from scraping import rating_store
+from scraping.ratings_cache import RatingsCache
+from scraping.rmp_client import RMPClient, RMPError
+from scraping.teacher_directory import TeacherDirectory
+
+logger = logging.getLogger(__name__)
+
+# shared across threads so RMP lookups reuse connections and are paced together
+rmp_client = RMPClient()
+
+# durable lookup cache (scraping/ratings_cache.py), RMP_CACHE="" turns it off
+RATINGS_CACHE_PATH = os.getenv("RMP_CACHE", str(Path(__file__).parent.parent / "rmp_cache.db"))
+ratings_cache = None
+ratings_cache_lock = threading.Lock()
+
+# "search": ask rmp about every name, "directory": match names against a local
+# copy of every ucsc teacher on rmp, refreshed daily (scraping/teacher_directory.py)
+RMP_MATCH = os.getenv("RMP_MATCH", "search")
+DIRECTORY_PAGE_SIZE = 1000
+teacher_directory = None
+teacher_directory_lock = threading.Lock()
+
+# stale cache entries are refreshed here while the stale answer is served
+refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rmp-refresh")
+refreshing = set()
+refreshing_lock = threading.Lock()
+
+SCHOOL_ID = "U2Nob29sLTEwNzg="
+
+# searches packed into one aliased graphql document by get_basic_professor_info_batch
+RMP_BATCH_SIZE = 25
+
+BASIC_TEACHER_FIELDS = """
+    id
+    firstName
+    lastName
+    department
+    avgRating
+    avgDifficulty
+    numRatings
+    wouldTakeAgainPercent
+    courseCodes {
+        courseCount
+        courseName
+    }
+    ratingsDistribution {
+        r1 r2 r3 r4 r5
+    }
+"""
+
+RATING_FIELDS = """
+    comment
+    date
+    class
+    helpfulRating
+    clarityRating
+    difficultyRating
+    thumbsUpTotal
+    thumbsDownTotal
+    wouldTakeAgain
+    isForCredit
+    isForOnlineClass
+    attendanceMandatory
+    ratingTags
+    flagStatus
+    textbookUse
+"""
+
+# reviews per request when paging through all of a teacher's ratings
+RATINGS_PAGE_SIZE = 100
 
 
 @dataclass
@@ -70,54 +106,385 @@ class BasicProfessorInfo:
 
 @dataclass
 class DetailedProfessorData(BasicProfessorInfo):
-    all_ratings: List[ProfessorRating]
+    # every review (of the course when one was asked for), see scraping/rating_store.py
+    all_ratings: rating_store.RatingColumns
 
     def to_dict(self) -> Dict[str, Any]:
         basic_info = super().to_dict()
-        basic_info["all_ratings"] = [rating.to_dict() for rating in self.all_ratings]
+        basic_info["all_ratings"] = rating_store.records(self.all_ratings)
         return basic_info
 
 
+BASIC_SEARCH_QUERY = f"""
+    query NewSearchTeachersQuery($query: TeacherSearchQuery!) {{
+        newSearch {{
+            teachers(query: $query) {{
+                edges {{
+                    node {{ {BASIC_TEACHER_FIELDS} }}
+                }}
+            }}
+        }}
+    }}
+"""
+
+
 def get_basic_professor_info(professor_name: str, course_code:str) -> Optional[BasicProfessorInfo]:
     """Get basic professor information without detailed ratings."""
     if not professor_name or professor_name.lower() == "staff":
         raise ValueError("Invalid professor name")
 
-    SCHOOL_ID = "U2Nob29sLTEwNzg="
-    RMP_URL = "https://www.ratemyprofessors.com/graphql"
-
-    query = """
-        query NewSearchTeachersQuery($query: TeacherSearchQuery!) {
-            newSearch {
-                teachers(query: $query) {
-                    edges {
-                        node {
-                            id
-                            firstName
-                            lastName
-                            department
-                            avgRating
-                            avgDifficulty
-                            numRatings
-                            wouldTakeAgainPercent
-                            courseCodes {
-                                courseCount
-                                courseName
-                            }
-                            ratingsDistribution {
-                                r1 r2 r3 r4 r5
-                            }
-                        }
-                    }
-                }
-            }
-        }
+    professor_data = _basic_professor_node(professor_name, course_code, BASIC_SEARCH_QUERY)
+    return _basic_professor_info(professor_data) if professor_data else None
+
+
+async def aget_basic_professor_info(
+    professor_name: str, course_code: Optional[str], session=None
+) -> Optional[BasicProfessorInfo]:
+    """
+    get_basic_professor_info for asyncio callers, the rmp search doesn't block
+    the event loop. session: see RMPClient.async_session
     """
+    if not professor_name or professor_name.lower() == "staff":
+        raise ValueError("Invalid professor name")
+
+    professor_data = await _abasic_professor_node(professor_name, course_code, session)
+    return _basic_professor_info(professor_data) if professor_data else None
+
+
+async def aget_basic_professor_info_many(
+    lookups: List[Tuple[str, Optional[str]]]
+) -> List[Optional[BasicProfessorInfo]]:
+    """
+    aget_basic_professor_info for many (professor, course code) pairs with all
+    of them in flight at once over one connection pool, results line up with
+    lookups (None for a staff/empty name)
+    """
+
+    async with rmp_client.async_session() as session:
 
-    professor_data = _search_professor(professor_name, query, SCHOOL_ID, RMP_URL, course_code=course_code)
+        async def lookup(professor_name, course_code):
+            if not professor_name or professor_name.lower() == "staff":
+                return None
+            return await aget_basic_professor_info(professor_name, course_code, session)
+
+        return await asyncio.gather(*(lookup(*pair) for pair in lookups))
+
+
+def _basic_professor_node(professor_name: str, course_code: Optional[str], query: str) -> Optional[Dict[str, Any]]:
+    directory = get_teacher_directory() if RMP_MATCH == "directory" else None
+    if directory is not None:
+        return _match_in_directory(directory, professor_name, course_code)
+
+    return _cached_lookup(
+        "basic",
+        professor_name,
+        course_code,
+        lambda: _search_professor(
+            professor_name, query, SCHOOL_ID, course_code=course_code, raise_errors=True
+        ),
+    )
+
+
+async def _abasic_professor_node(
+    professor_name: str, course_code: Optional[str], session=None
+) -> Optional[Dict[str, Any]]:
+    directory = get_teacher_directory() if RMP_MATCH == "directory" else None
+    if directory is not None:
+        return _match_in_directory(directory, professor_name, course_code)
+
+    return await _acached_lookup(
+        "basic",
+        professor_name,
+        course_code,
+        lambda: _asearch_professor(session, professor_name, BASIC_SEARCH_QUERY, course_code=course_code),
+        lambda: _search_professor(
+            professor_name, BASIC_SEARCH_QUERY, SCHOOL_ID, course_code=course_code, raise_errors=True
+        ),
+    )
+
+
+def get_professor_review_stats(
+    professor_name: str, course_code: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Aggregates over every review of a professor: tag frequencies, difficulty per quarter
+    and per-course numbers (see scraping/rating_store.py), narrowed to course_code's
+    reviews when given. None if the professor can't be matched.
+    """
+    if not professor_name or professor_name.lower() == "staff":
+        raise ValueError("Invalid professor name")
+
+    professor_data = _basic_professor_node(professor_name, course_code, BASIC_SEARCH_QUERY)
     if not professor_data:
         return None
 
+    columns = get_professor_reviews(professor_data["id"])
+    if columns is None:
+        return None
+    if course_code:
+        columns = columns.for_course(course_code)
+    return {
+        "name": f"{professor_data['firstName']} {professor_data['lastName']}",
+        **rating_store.review_stats(columns),
+    }
+
+
+def get_professor_reviews(teacher_id: str) -> Optional[rating_store.RatingColumns]:
+    """
+    every review of a teacher as RatingColumns, from the ratings cache when it has them
+    (stale ones are refreshed in the background), None if rmp can't be reached
+    """
+    cache = get_ratings_cache()
+
+    def fetch_and_store():
+        columns = rating_store.RatingColumns.from_ratings(fetch_all_ratings(teacher_id))
+        if cache is not None:
+            cache.put_reviews(teacher_id, columns.to_bytes())
+        return columns
+
+    cached = _cached_reviews(cache, teacher_id, fetch_and_store)
+    if cached is not None:
+        return cached
+
+    try:
+        return fetch_and_store()
+    except RMPError as e:
+        logger.error(f"Error fetching reviews of {teacher_id}: {e}")
+        return None
+
+
+async def aget_professor_reviews(teacher_id: str, session=None) -> Optional[rating_store.RatingColumns]:
+    """
+    get_professor_reviews for asyncio callers: a miss pages through the reviews
+    with afetch_all_ratings, a stale entry is still refreshed on the refresh pool
+    """
+    cache = get_ratings_cache()
+
+    def fetch_and_store():
+        columns = rating_store.RatingColumns.from_ratings(fetch_all_ratings(teacher_id))
+        if cache is not None:
+            cache.put_reviews(teacher_id, columns.to_bytes())
+        return columns
+
+    cached = _cached_reviews(cache, teacher_id, fetch_and_store)
+    if cached is not None:
+        return cached
+
+    try:
+        columns = rating_store.RatingColumns.from_ratings(await afetch_all_ratings(teacher_id, session))
+    except RMPError as e:
+        logger.error(f"Error fetching reviews of {teacher_id}: {e}")
+        return None
+    if cache is not None:
+        cache.put_reviews(teacher_id, columns.to_bytes())
+    return columns
+
+
+def _cached_reviews(cache, teacher_id, refresh) -> Optional[rating_store.RatingColumns]:
+    """a teacher's stored reviews (None on a miss), stale ones get refresh() in the background"""
+    cached = cache.get_reviews(teacher_id) if cache is not None else None
+    if cached is None:
+        return None
+    data, stale = cached
+    try:
+        columns = rating_store.RatingColumns.from_bytes(data)
+    except ValueError:
+        # stored by an older rating_store, a miss
+        return None
+    if stale:
+        _refresh_in_background(("reviews", teacher_id), refresh)
+    return columns
+
+
+RATINGS_QUERY = f"""
+    query TeacherRatingsQuery($id: ID!, $first: Int!, $after: String) {{
+        node(id: $id) {{
+            ... on Teacher {{
+                ratings(first: $first, after: $after) {{
+                    edges {{
+                        node {{ {RATING_FIELDS} }}
+                    }}
+                    pageInfo {{
+                        hasNextPage
+                        endCursor
+                    }}
+                }}
+            }}
+        }}
+    }}
+"""
+
+
+def fetch_all_ratings(teacher_id: str) -> List[Dict[str, Any]]:
+    """every rating node of a teacher, paging through the ratings connection"""
+    ratings = []
+    after = None
+    while True:
+        data = rmp_client.query(
+            RATINGS_QUERY, {"id": teacher_id, "first": RATINGS_PAGE_SIZE, "after": after}, SCHOOL_ID
+        )
+        after = _ratings_page(data, ratings)
+        if after is None:
+            return ratings
+
+
+async def afetch_all_ratings(teacher_id: str, session=None) -> List[Dict[str, Any]]:
+    """fetch_all_ratings for asyncio callers, session: see RMPClient.async_session"""
+    ratings = []
+    after = None
+    while True:
+        data = await rmp_client.aquery(
+            RATINGS_QUERY,
+            {"id": teacher_id, "first": RATINGS_PAGE_SIZE, "after": after},
+            SCHOOL_ID,
+            session=session,
+        )
+        after = _ratings_page(data, ratings)
+        if after is None:
+            return ratings
+
+
+def _ratings_page(data: Dict[str, Any], ratings: List[Dict[str, Any]]) -> Optional[str]:
+    """adds a page's rating nodes to ratings, returns the cursor of the next page (None after the last)"""
+    page = (data.get("node") or {}).get("ratings")
+    if not page:
+        return None
+    ratings.extend(edge["node"] for edge in page["edges"])
+    if not page["pageInfo"]["hasNextPage"] or not page["edges"]:
+        return None
+    return page["pageInfo"]["endCursor"]
+
+
+def get_basic_professor_info_batch(
+    lookups: List[Tuple[str, Optional[str]]], batch_size: int = RMP_BATCH_SIZE
+) -> List[Optional[BasicProfessorInfo]]:
+    """
+    get_basic_professor_info for many (professor, course code) pairs at once.
+    Pairs the ratings cache can't answer are searched batch_size distinct searches to a
+    request as aliased newSearch fields, and each pair is scored against its alias's
+    teachers locally. Stale cached pairs are answered right away and refreshed in the background.
+    Results line up with lookups, None for no match, a staff/empty name or a failed batch.
+    With RMP_MATCH=directory every pair is matched against the local teacher directory instead.
+    """
+    directory = get_teacher_directory() if RMP_MATCH == "directory" else None
+    if directory is not None:
+        return [
+            get_basic_professor_info(professor_name, course_code)
+            if professor_name and professor_name.lower() != "staff"
+            else None
+            for professor_name, course_code in lookups
+        ]
+
+    cache = get_ratings_cache()
+    results = [None] * len(lookups)
+    pending = {}
+    stale = []
+    for i, (professor_name, course_code) in enumerate(lookups):
+        if not professor_name or professor_name.lower() == "staff":
+            continue
+        cached = cache.get("basic", professor_name, course_code) if cache is not None else None
+        if cached is None:
+            pending.setdefault((professor_name, course_code), []).append(i)
+            continue
+        results[i] = cached.node
+        if cached.stale:
+            stale.append((professor_name, course_code))
+
+    if stale:
+        _refresh_in_background(
+            ("basic", tuple(stale)), lambda: _fetch_basic_batch(stale, batch_size)
+        )
+
+    fetched = _fetch_basic_batch(list(pending), batch_size) if pending else {}
+    for lookup, indexes in pending.items():
+        for i in indexes:
+            results[i] = fetched.get(lookup)
+
+    return [
+        _basic_professor_info(professor_data) if professor_data else None
+        for professor_data in results
+    ]
+
+
+def _fetch_basic_batch(
+    lookups: List[Tuple[str, Optional[str]]], batch_size: int
+) -> Dict[Tuple[str, Optional[str]], Optional[Dict[str, Any]]]:
+    """
+    (professor, course code) -> best matching teacher node (None for no match) for
+    every pair rmp answered, pairs whose batch failed are left out.
+    Answers are saved to the ratings cache.
+    """
+    terms = {lookup: _search_terms(*lookup) for lookup in lookups}
+    # pairs that only differ by course share one search
+    searches = list(dict.fromkeys(term[2] for term in terms.values()))
+
+    teachers_by_search = {}
+    for start in range(0, len(searches), batch_size):
+        batch = searches[start : start + batch_size]
+        teachers_by_search.update(_search_teachers_batch(batch))
+
+    cache = get_ratings_cache()
+    matches = {}
+    for lookup, term in terms.items():
+        if term[2] not in teachers_by_search:
+            continue
+        professors = teachers_by_search[term[2]]
+        matches[lookup] = (
+            _best_match(professors, term[0], term[1], term[3], term[4])
+            if professors
+            else None
+        )
+        if cache is not None:
+            cache.put("basic", lookup[0], matches[lookup], course=lookup[1])
+    return matches
+
+
+def _search_teachers_batch(searches: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    search text -> teacher nodes for up to a batch of searches, in one request.
+    searches whose alias rmp didn't answer are missing
+    """
+    variables = {
+        f"q{i}": {"schoolID": SCHOOL_ID, "text": search, "fallback": True}
+        for i, search in enumerate(searches)
+    }
+    declarations = ", ".join(f"$q{i}: TeacherSearchQuery!" for i in range(len(searches)))
+    fields = "\n".join(
+        f"""
+            t{i}: newSearch {{
+                teachers(query: $q{i}) {{
+                    edges {{
+                        node {{ {BASIC_TEACHER_FIELDS} }}
+                    }}
+                }}
+            }}
+        """
+        for i in range(len(searches))
+    )
+    query = f"query BatchSearchTeachersQuery({declarations}) {{ {fields} }}"
+
+    try:
+        # a partial answer still has data for the aliases that worked, the ones
+        # that errored come back null and are left out like a failed batch, so
+        # they're never taken (and cached) as "no such teacher"
+        results = rmp_client.query(
+            query, variables, SCHOOL_ID, searches[0], partial_ok=True
+        )
+        return {
+            search: [
+                teacher["node"]
+                for teacher in (results[f"t{i}"].get("teachers") or {}).get("edges", [])
+            ]
+            for i, search in enumerate(searches)
+            if results.get(f"t{i}") is not None
+        }
+
+    except RMPError as e:
+        logger.error(f"Error making batch request: {e}")
+        return {}
+
+
+def _basic_professor_info(professor_data: Dict[str, Any]) -> BasicProfessorInfo:
     return BasicProfessorInfo(
         avg_rating=professor_data["avgRating"],
         num_ratings=professor_data["numRatings"],
@@ -139,122 +506,219 @@ def get_basic_professor_info(professor_name: str, course_code:str) -> Optional[B
 def get_detailed_professor_info(
     professor_name: str, course_code: Optional[str] = None
 ) -> Optional[DetailedProfessorData]:
-    """Get detailed professor information including ratings."""
+    """basic info plus every review (only course_code's when given), reviews come from the rating store"""
     if not professor_name or professor_name.lower() == "staff":
         raise ValueError("Invalid professor name")
 
-    SCHOOL_ID = "U2Nob29sLTEwNzg="
-    RMP_URL = "https://www.ratemyprofessors.com/graphql"
-
-    query = """
-        query NewSearchTeachersQuery($query: TeacherSearchQuery!, $courseFilter: String) {
-            newSearch {
-                teachers(query: $query) {
-                    edges {
-                        node {
-                            id
-                            firstName
-                            lastName
-                            department
-                            avgRating
-                            avgDifficulty
-                            numRatings
-                            wouldTakeAgainPercent
-                            courseCodes {
-                                courseCount
-                                courseName
-                            }
-                            ratingsDistribution {
-                                r1 r2 r3 r4 r5
-                            }
-                            ratings(first: 10, courseFilter: $courseFilter) {
-                                edges {
-                                    node {
-                                        comment
-                                        date
-                                        class
-                                        helpfulRating
-                                        clarityRating
-                                        difficultyRating
-                                        thumbsUpTotal
-                                        thumbsDownTotal
-                                        wouldTakeAgain
-                                        isForCredit
-                                        isForOnlineClass
-                                        attendanceMandatory
-                                        ratingTags
-                                        flagStatus
-                                        textbookUse
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    """
+    professor_data = _basic_professor_node(professor_name, course_code, BASIC_SEARCH_QUERY)
+    if not professor_data:
+        return None
+    return _detailed_professor_info(professor_data, get_professor_reviews(professor_data["id"]), course_code)
 
-    professor_data = _search_professor(
-        professor_name, query, SCHOOL_ID, RMP_URL, course_filter=course_code
-    )
+
+async def aget_detailed_professor_info(
+    professor_name: str, course_code: Optional[str] = None, session=None
+) -> Optional[DetailedProfessorData]:
+    """get_detailed_professor_info for asyncio callers, session: see RMPClient.async_session"""
+    if not professor_name or professor_name.lower() == "staff":
+        raise ValueError("Invalid professor name")
+
+    professor_data = await _abasic_professor_node(professor_name, course_code, session)
     if not professor_data:
         return None
+    reviews = await aget_professor_reviews(professor_data["id"], session)
+    return _detailed_professor_info(professor_data, reviews, course_code)
 
-    all_ratings = []
-    for rating_edge in professor_data["ratings"]["edges"]:
-        rating = rating_edge["node"]
-        all_ratings.append(
-            ProfessorRating(
-                class_name=rating["class"],
-                date=rating["date"],
-                helpful_rating=rating["helpfulRating"],
-                clarity_rating=rating["clarityRating"],
-                difficulty_rating=rating["difficultyRating"],
-                overall_rating=(rating["helpfulRating"] + rating["clarityRating"]) / 2,
-                comment=rating["comment"],
-                thumbs_up=rating["thumbsUpTotal"],
-                thumbs_down=rating["thumbsDownTotal"],
-                would_take_again=rating["wouldTakeAgain"] == 1,
-                is_online=rating["isForOnlineClass"],
-                is_for_credit=rating["isForCredit"],
-                attendance_mandatory=rating["attendanceMandatory"],
-                textbook_use=rating["textbookUse"],
-                tags=rating["ratingTags"],
-                flag_status=rating["flagStatus"],
-            )
+
+def _detailed_professor_info(
+    professor_data: Dict[str, Any],
+    reviews: Optional[rating_store.RatingColumns],
+    course_code: Optional[str] = None,
+) -> DetailedProfessorData:
+    # reviews is None when rmp couldn't be reached, the basic info is still served
+    if reviews is None:
+        reviews = rating_store.RatingColumns.from_ratings([])
+    elif course_code:
+        reviews = reviews.for_course(course_code)
+    basic_info = _basic_professor_info(professor_data)
+    return DetailedProfessorData(**vars(basic_info), all_ratings=reviews)
+
+
+def get_ratings_cache() -> Optional[RatingsCache]:
+    global ratings_cache
+    with ratings_cache_lock:
+        if ratings_cache is None and RATINGS_CACHE_PATH:
+            ratings_cache = RatingsCache(RATINGS_CACHE_PATH)
+    return ratings_cache
+
+
+def _refresh_in_background(key, refresh) -> None:
+    """run refresh() on the refresh pool unless a refresh for key is already running"""
+    with refreshing_lock:
+        if key in refreshing:
+            return
+        refreshing.add(key)
+
+    def run():
+        try:
+            refresh()
+        except Exception as e:
+            logger.error(f"Error refreshing cached ratings: {e}")
+        finally:
+            with refreshing_lock:
+                refreshing.discard(key)
+
+    refresh_pool.submit(run)
+
+
+def refresh_teacher_directory() -> TeacherDirectory:
+    """page every teacher of SCHOOL_ID into a new directory and save it to the ratings cache"""
+    global teacher_directory
+    directory = TeacherDirectory(_fetch_all_teachers())
+    cache = get_ratings_cache()
+    if cache is not None:
+        cache.replace_directory(directory)
+    teacher_directory = directory
+    logger.info(f"Loaded {len(directory)} teachers into the rmp directory")
+    return directory
+
+
+def get_teacher_directory() -> Optional[TeacherDirectory]:
+    """
+    the teacher directory, loaded from the ratings cache or fetched on first use.
+    a stale one is returned as is and refetched in the background, None if there
+    is none and rmp can't be reached
+    """
+    global teacher_directory
+    with teacher_directory_lock:
+        if teacher_directory is None:
+            cache = get_ratings_cache()
+            nodes, fetched_at = cache.load_directory() if cache is not None else ([], None)
+            if fetched_at is not None:
+                teacher_directory = TeacherDirectory(nodes, fetched_at)
+            else:
+                try:
+                    refresh_teacher_directory()
+                except Exception as e:
+                    logger.error(f"Error fetching the rmp teacher directory: {e}")
+                    return None
+
+    directory = teacher_directory
+    if directory.stale:
+        _refresh_in_background("directory", refresh_teacher_directory)
+    return directory
+
+
+def _fetch_all_teachers() -> List[Dict[str, Any]]:
+    query = f"""
+        query TeacherDirectoryQuery($query: TeacherSearchQuery!, $first: Int!, $after: String) {{
+            newSearch {{
+                teachers(query: $query, first: $first, after: $after) {{
+                    edges {{
+                        node {{ {BASIC_TEACHER_FIELDS} }}
+                    }}
+                    pageInfo {{
+                        hasNextPage
+                        endCursor
+                    }}
+                }}
+            }}
+        }}
+    """
+    teachers = []
+    after = None
+    while True:
+        data = rmp_client.query(
+            query,
+            {
+                "query": {"schoolID": SCHOOL_ID, "text": "", "fallback": False},
+                "first": DIRECTORY_PAGE_SIZE,
+                "after": after,
+            },
+            SCHOOL_ID,
         )
+        page = data["newSearch"]["teachers"]
+        teachers.extend(edge["node"] for edge in page["edges"])
+        if not page["pageInfo"]["hasNextPage"] or not page["edges"]:
+            return teachers
+        after = page["pageInfo"]["endCursor"]
 
-    return DetailedProfessorData(
-        avg_rating=professor_data["avgRating"],
-        num_ratings=professor_data["numRatings"],
-        department=professor_data["department"],
-        would_take_again_percent=professor_data["wouldTakeAgainPercent"],
-        difficulty_level=professor_data["avgDifficulty"],
-        name=f"{professor_data['firstName']} {professor_data['lastName']}",
-        rating_distribution=[
-            professor_data["ratingsDistribution"]["r1"],
-            professor_data["ratingsDistribution"]["r2"],
-            professor_data["ratingsDistribution"]["r3"],
-            professor_data["ratingsDistribution"]["r4"],
-            professor_data["ratingsDistribution"]["r5"],
-        ],
-        course_codes=professor_data["courseCodes"],
-        all_ratings=all_ratings,
+
+def _match_in_directory(
+    directory: TeacherDirectory, professor_name: str, course_code: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    first_initial, last_name, _, class_name, class_prefix = _search_terms(
+        professor_name, course_code
     )
+    professors = directory.candidates(last_name, first_initial)
+    if not professors:
+        return None
+    return _best_match(professors, first_initial, last_name, class_name, class_prefix)
 
-import re
-import requests
-from typing import Optional, Dict, Any, List
 
-def _search_professor(
-    professor_name: str,
-    query: str,
-    school_id: str,
-    rmp_url: str,
-    course_code: Optional[str] = None,
-    course_filter: Optional[str] = None,
-) -> Optional[Dict[str, Any]]:
+def _cached_lookup(kind: str, professor_name: str, course_code: Optional[str], fetch, scope: Optional[str] = ""):
+    """
+    teacher node for a lookup, from the ratings cache when it has one (a stale one is
+    returned as is and refreshed in the background), otherwise fetch() and cache it.
+    a failed fetch isn't cached, it's None until rmp answers
+    """
+    cache = get_ratings_cache()
+
+    def fetch_and_store():
+        professor_data = fetch()
+        if cache is not None:
+            cache.put(kind, professor_name, professor_data, course=course_code, scope=scope)
+        return professor_data
+
+    cached = _cache_hit(cache, kind, professor_name, course_code, scope, fetch_and_store)
+    if cached is not None:
+        return cached.node
+
+    try:
+        return fetch_and_store()
+    except RMPError as e:
+        logger.error(f"Error looking up {professor_name} on rmp: {e}")
+        return None
+
+
+async def _acached_lookup(
+    kind: str, professor_name: str, course_code: Optional[str], afetch, fetch, scope: Optional[str] = ""
+):
+    """
+    _cached_lookup for asyncio callers: a miss awaits afetch(), a stale entry is
+    still refreshed with the blocking fetch() on the refresh pool
+    """
+    cache = get_ratings_cache()
+
+    def fetch_and_store():
+        professor_data = fetch()
+        if cache is not None:
+            cache.put(kind, professor_name, professor_data, course=course_code, scope=scope)
+        return professor_data
+
+    cached = _cache_hit(cache, kind, professor_name, course_code, scope, fetch_and_store)
+    if cached is not None:
+        return cached.node
+
+    try:
+        professor_data = await afetch()
+    except RMPError as e:
+        logger.error(f"Error looking up {professor_name} on rmp: {e}")
+        return None
+    if cache is not None:
+        cache.put(kind, professor_name, professor_data, course=course_code, scope=scope)
+    return professor_data
+
+
+def _cache_hit(cache, kind, professor_name, course_code, scope, refresh):
+    """the cache's entry for a lookup (None on a miss), a stale one gets refresh() in the background"""
+    cached = cache.get(kind, professor_name, course_code, scope=scope) if cache is not None else None
+    if cached is not None and cached.stale:
+        _refresh_in_background((kind, professor_name, course_code, scope), refresh)
+    return cached
+
+def _search_terms(professor_name: str, course_code: Optional[str] = None):
+    """(first initial, last name, rmp search text, class name, class prefix) for a lookup"""
     name_parts = professor_name.split()
     if len(name_parts) >= 2 and "." in name_parts[0]:
         first_initial = name_parts[0][0].lower()
@@ -275,136 +739,171 @@ def _search_professor(
         class_name = course_code.replace(" ", "")
         class_prefix = re.sub(r"\d.*", "", class_name)
 
-    try:
-        variables = {
-            "query": {"schoolID": school_id, "text": search_query, "fallback": True, },
-        }
-        #filter by course code if any
-        if course_filter is not None:
-            variables["courseFilter"] = course_filter
+    return first_initial, last_name, search_query, class_name, class_prefix
 
+
+def _search_professor(
+    professor_name: str,
+    query: str,
+    school_id: str,
+    course_code: Optional[str] = None,
+    course_filter: Optional[str] = None,
+    raise_errors: bool = False,
+) -> Optional[Dict[str, Any]]:
+    terms = _search_terms(professor_name, course_code)
+
+    try:
         #query RMP using graphQL
-        response = requests.post(
-            rmp_url,
-            headers = {
-            "Authorization": "Basic dGVzdDp0ZXN0",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/87.0.4280.88 Safari/537.36",
-            "Content-Type": "application/json",
-            "Referer": f"https://www.ratemyprofessors.com/search/teachers/{school_id.replace('U2Nob29sLQ==', '')}?q={search_query}"
-        },
-            json={
-                "query": query,
-                "variables": variables,
-            },
+        data = rmp_client.query(
+            query, _search_variables(terms, school_id, course_filter), school_id, terms[2]
         )
-        response.raise_for_status()
+        return _match_search(data, terms)
 
-        data = response.json()
-        if "errors" in data:
-            raise ValueError(data["errors"][0].get("message", "GraphQL error"))
+    except RMPError as e:
+        if raise_errors:
+            raise
+        logger.error(f"Error making request: {e}")
+        return None
+    except (KeyError, TypeError, AttributeError) as e:
+        if raise_errors:
+            raise RMPError(f"unexpected rmp answer: {e}") from e
+        logger.error(f"Unexpected rmp answer for {professor_name}: {e}")
+        return None
+
+
+async def _asearch_professor(
+    session,
+    professor_name: str,
+    query: str,
+    course_code: Optional[str] = None,
+    course_filter: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """_search_professor(..., raise_errors=True) for asyncio callers, session: see RMPClient.async_session"""
+    terms = _search_terms(professor_name, course_code)
+    data = await rmp_client.aquery(
+        query, _search_variables(terms, SCHOOL_ID, course_filter), SCHOOL_ID, terms[2], session=session
+    )
+    try:
+        return _match_search(data, terms)
+    except (KeyError, TypeError, AttributeError) as e:
+        raise RMPError(f"unexpected rmp answer: {e}") from e
+
+
+def _search_variables(terms, school_id: str, course_filter: Optional[str] = None) -> Dict[str, Any]:
+    variables = {
+        "query": {"schoolID": school_id, "text": terms[2], "fallback": True, },
+    }
+    #filter by course code if any
+    if course_filter is not None:
+        variables["courseFilter"] = course_filter
+    return variables
+
+
+def _match_search(data: Dict[str, Any], terms) -> Optional[Dict[str, Any]]:
+    """best teacher node of a newSearch answer for _search_terms' terms"""
+    first_initial, last_name, _, class_name, class_prefix = terms
+    teachers = (
+        data.get("newSearch", {})
+        .get("teachers", {})
+        .get("edges", [])
+    )
+    if not teachers:
+        return None
+
+    professors = [teacher["node"] for teacher in teachers]
+    return _best_match(professors, first_initial, last_name, class_name, class_prefix)
 
-        teachers = (
-            data.get("data", {})
-            .get("newSearch", {})
-            .get("teachers", {})
-            .get("edges", [])
-        )
-        if not teachers:
-            return None
 
-        professors = [teacher["node"] for teacher in teachers]
+def _best_match(
+    professors: List[Dict[str, Any]],
+    first_initial: str,
+    last_name: str,
+    class_name: str,
+    class_prefix: str,
+) -> Optional[Dict[str, Any]]:
+    #calculate similarity scores for all professors so that 
+    #we get the teacher with same subject and same name
+    similarity_scores = []
+    for professor in professors:
+        score = 0
         
         
-        #calculate similarity scores for all professors so that 
-        #we get the teacher with same subject and same name
-        similarity_scores = []
-        for professor in professors:
-            score = 0
+        #check if last name matches (case insensitive)
+        prof_last_name = professor["lastName"].lower()
+        if prof_last_name.endswith(last_name):
+            score += 1
+        else:
+            continue
             
+        #check if first initial matches 
+        prof_first_initial = professor["firstName"][0].lower() if professor["firstName"] else ""
+        if prof_first_initial == first_initial:
+            score += 1
+        else:
+            continue
+        
+        #check course matches
+        if "courseCodes" in professor and class_name:
+            has_similar_course = False
+            has_exact_course = False
+            broader_dept_match = False
             
-            #check if last name matches (case insensitive)
-            prof_last_name = professor["lastName"].lower()
-            if prof_last_name.endswith(last_name):
-                score += 1
-            else:
-                continue
-                
-            #check if first initial matches 
-            prof_first_initial = professor["firstName"][0].lower() if professor["firstName"] else ""
-            if prof_first_initial == first_initial:
-                score += 1
-            else:
-                continue
+            #check if taught before
+            higher_level_courses = []
             
-            #check course matches
-            if "courseCodes" in professor and class_name:
-                has_similar_course = False
-                has_exact_course = False
-                broader_dept_match = False
+            for course in professor["courseCodes"]:
+                course_name = course["courseName"]
                 
-                #check if taught before
-                higher_level_courses = []
+                #check exact course match
+                if course_name == class_name:
+                    has_exact_course = True
                 
-                for course in professor["courseCodes"]:
-                    course_name = course["courseName"]
-                    
-                    #check exact course match
-                    if course_name == class_name:
-                        has_exact_course = True
-                    
-                    # Extract course prefix for matching (e.g., "Stats" from "Stats131")
-                    course_prefix = re.sub(r"\d.*", "", course_name)
-                    
-                    #check if department is same
-                    if course_prefix.lower() == class_prefix.lower():
-                        has_similar_course = True
-                        
-                        #if it's a higher-level course in the same department
-                        if class_name and course_name != class_name:
-                            #get course number as well
-                            try:
-                                class_num = int(re.search(r"\d+", class_name).group())
-                                course_num = int(re.search(r"\d+", course_name).group())
-                                
-                                if course_num > class_num:
-                                    higher_level_courses.append(course_name)
-                            except (AttributeError, ValueError):
-                                pass
+                # Extract course prefix for matching (e.g., "Stats" from "Stats131")
+                course_prefix = re.sub(r"\d.*", "", course_name)
                 
-                #score course matches
-                if has_similar_course:
-                    score += 1
-                else:
-                    score -= 1
-                
-                if has_exact_course:
-                    score += 5
-                else:
-                    score -= 1
-                
-                if higher_level_courses and not has_exact_course:
-                    score += 2
+                #check if department is same
+                if course_prefix.lower() == class_prefix.lower():
+                    has_similar_course = True
                     
-            similarity_scores.append(score)
-        
-        #get the professor with the highest similarity score
-        if similarity_scores:
-            best_match_index = similarity_scores.index(max(similarity_scores))
-            best_match = professors[best_match_index]
+                    #if it's a higher-level course in the same department
+                    if class_name and course_name != class_name:
+                        #get course number as well
+                        try:
+                            class_num = int(re.search(r"\d+", class_name).group())
+                            course_num = int(re.search(r"\d+", course_name).group())
+                            
+                            if course_num > class_num:
+                                higher_level_courses.append(course_name)
+                        except (AttributeError, ValueError):
+                            pass
             
+            #score course matches
+            if has_similar_course:
+                score += 1
+            else:
+                score -= 1
             
-            #last sanity check, checking first inital and last name
-            if (not best_match["lastName"].lower().endswith(last_name) or 
-                best_match["firstName"][0].lower() != first_initial):
-                return None
+            if has_exact_course:
+                score += 5
+            else:
+                score -= 1
+            
+            if higher_level_courses and not has_exact_course:
+                score += 2
                 
-            return best_match
-
-        return None
+        similarity_scores.append(score)
+    
+    #get the professor with the highest similarity score
+    if similarity_scores:
+        best_match_index = similarity_scores.index(max(similarity_scores))
+        best_match = professors[best_match_index]
+        
+        
+        #last sanity check, checking first inital and last name
+        if (not best_match["lastName"].lower().endswith(last_name) or 
+            best_match["firstName"][0].lower() != first_initial):
+            return None
+            
+        return best_match
 
-    except requests.RequestException as e:
-        print(f"Error making request: {e}")
-        return None
-    except Exception as e:
-        print(f"Error: {e}")
-        return None
\ No newline at end of file
+    return None
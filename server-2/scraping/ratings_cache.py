@@ -0,0 +1,179 @@
+"""
+durable cache of RateMyProfessors lookups, so builds and restarts don't have
+to ask rmp about every professor again
+
+one sqlite file, four tables:
+    lookups: (kind, normalized name, course) -> rmp teacher id the lookup
+             resolved to (NULL when rmp had no match)
+    teachers: (kind, teacher id, scope) -> the raw teacher node rmp returned
+    directory: every ucsc teacher on rmp (basic node), replaced as a whole
+               by each directory refresh (see scraping/teacher_directory.py)
+    reviews: teacher id -> all of the teacher's reviews, columnar
+             (serialized scraping/rating_store.RatingColumns)
+kind names the graphql fields the node was fetched with ("basic"), scope is
+"" for nodes that don't depend on the course. names that resolve to the same
+teacher ("J. Doe" / "Jane Doe") share one node
+
+entries past their ttl are still returned, marked stale, so callers can
+serve them right away and refresh in the background (see scraping/ratings.py)
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# how long a resolved teacher's ratings are considered fresh
+TTL_SECONDS = 7 * 24 * 3600
+# how long "rmp has nobody by that name" is believed
+MISS_TTL_SECONDS = 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lookups (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    course TEXT NOT NULL,
+    teacher_id TEXT,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (kind, name, course)
+);
+CREATE TABLE IF NOT EXISTS teachers (
+    kind TEXT NOT NULL,
+    teacher_id TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    node TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (kind, teacher_id, scope)
+);
+CREATE TABLE IF NOT EXISTS reviews (
+    teacher_id TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS directory (
+    teacher_id TEXT PRIMARY KEY,
+    node TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+
+# node: the cached teacher node, None for a cached miss
+CachedLookup = namedtuple("CachedLookup", ["node", "stale"])
+
+
+def normalize_name(name):
+    return " ".join((name or "").lower().split())
+
+
+def normalize_course(course):
+    return (course or "").replace(" ", "").upper()
+
+
+class RatingsCache:
+    """thread safe, lookups come from the enrichment pipeline and request threads"""
+
+    def __init__(self, path, ttl=TTL_SECONDS, miss_ttl=MISS_TTL_SECONDS):
+        self.path = str(path)
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def get(self, kind, name, course=None, scope=""):
+        """CachedLookup for a lookup, None if it was never cached"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lookups.teacher_id, lookups.fetched_at, teachers.node, teachers.fetched_at"
+                " FROM lookups LEFT JOIN teachers ON teachers.kind = lookups.kind"
+                " AND teachers.teacher_id = lookups.teacher_id AND teachers.scope = ?"
+                " WHERE lookups.kind = ? AND lookups.name = ? AND lookups.course = ?",
+                (normalize_course(scope), kind, normalize_name(name), normalize_course(course)),
+            ).fetchone()
+        if row is None:
+            return None
+
+        teacher_id, looked_up_at, node, fetched_at = row
+        now = time.time()
+        if teacher_id is None:
+            return CachedLookup(None, now - looked_up_at > self.miss_ttl)
+        if node is None:
+            # resolved before, but never with this scope
+            return None
+        return CachedLookup(
+            json.loads(node), now - min(looked_up_at, fetched_at) > self.ttl
+        )
+
+    def put(self, kind, name, node, course=None, scope=""):
+        """cache what a lookup resolved to, node None for no match"""
+        now = time.time()
+        teacher_id = str(node["id"]) if node is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO lookups (kind, name, course, teacher_id, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (kind, normalize_name(name), normalize_course(course), teacher_id, now),
+            )
+            if node is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO teachers (kind, teacher_id, scope, node, fetched_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (kind, teacher_id, normalize_course(scope), json.dumps(node), now),
+                )
+            self._conn.commit()
+
+    def get_reviews(self, teacher_id):
+        """(serialized reviews, stale) for a teacher, None if never stored"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, fetched_at FROM reviews WHERE teacher_id = ?", (str(teacher_id),)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], time.time() - row[1] > self.ttl
+
+    def put_reviews(self, teacher_id, data):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reviews (teacher_id, data, fetched_at) VALUES (?, ?, ?)",
+                (str(teacher_id), data, time.time()),
+            )
+            self._conn.commit()
+
+    def replace_directory(self, nodes):
+        """swap in a freshly fetched teacher directory"""
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM directory")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO directory (teacher_id, node, fetched_at) VALUES (?, ?, ?)",
+                    ((str(node["id"]), json.dumps(node), now) for node in nodes),
+                )
+
+    def load_directory(self):
+        """(teacher nodes, when they were fetched), ([], None) if never fetched"""
+        with self._lock:
+            rows = self._conn.execute("SELECT node, fetched_at FROM directory").fetchall()
+        if not rows:
+            return [], None
+        return [json.loads(node) for node, _ in rows], min(fetched_at for _, fetched_at in rows)
+
+    def stats(self):
+        with self._lock:
+            lookups, misses = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(teacher_id IS NULL), 0) FROM lookups"
+            ).fetchone()
+            teachers, = self._conn.execute("SELECT COUNT(*) FROM teachers").fetchone()
+            directory, = self._conn.execute("SELECT COUNT(*) FROM directory").fetchone()
+        return {
+            "lookups": lookups,
+            "misses": misses,
+            "teachers": teachers,
+            "directory": directory,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
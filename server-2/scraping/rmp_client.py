@@ -0,0 +1,146 @@
+"""
+RateMyProfessors graphql client
+
+one RMPClient holds a pooled keep-alive session (through rate_limit, so rmp is
+paced like every other host), a (connect, read) timeout so a hung request
+can't stall a build, and retries for throttled/5xx answers. graphql reads are
+safe to repeat, so POSTs are retried too
+
+query() is blocking, aquery() is the asyncio version: it sends through an
+httpx.AsyncClient (async_session) so any number of lookups can be in flight
+from one event loop without a thread each, paced by the same host limiter
+and retried the same way
+"""
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+import requests
+
+from scraping.rate_limit import RATE_LIMITING, RETRY_STATUSES, create_limited_session, limiter_for
+
+logger = logging.getLogger(__name__)
+
+RMP_URL = "https://www.ratemyprofessors.com/graphql"
+
+RMP_CONNECT_TIMEOUT = float(os.getenv("RMP_CONNECT_TIMEOUT", 5))
+RMP_READ_TIMEOUT = float(os.getenv("RMP_READ_TIMEOUT", 15))
+RMP_RETRIES = int(os.getenv("RMP_RETRIES", 3))
+RMP_POOL_SIZE = int(os.getenv("RMP_POOL_SIZE", 8))
+# seconds before the first retry of aquery, doubled for every one after
+RMP_RETRY_BACKOFF = 0.5
+
+
+class RMPError(Exception):
+    """rmp couldn't be reached or answered with a graphql error"""
+
+
+class RMPClient:
+    def __init__(
+        self,
+        url=RMP_URL,
+        pool_size=RMP_POOL_SIZE,
+        retries=RMP_RETRIES,
+        timeout=(RMP_CONNECT_TIMEOUT, RMP_READ_TIMEOUT),
+        session=None,
+    ):
+        self.url = url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.retries = retries
+        self.session = session or create_limited_session(
+            pool_size=pool_size, retries=retries, retry_methods={"GET", "POST"}
+        )
+
+    def headers(self, school_id, search_query=""):
+        return {
+            "Authorization": "Basic dGVzdDp0ZXN0",
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/87.0.4280.88 Safari/537.36",
+            "Content-Type": "application/json",
+            "Referer": f"https://www.ratemyprofessors.com/search/teachers/{school_id.replace('U2Nob29sLQ==', '')}?q={search_query}",
+        }
+
+    def query(self, query, variables, school_id, search_query="", partial_ok=False):
+        """
+        the "data" of a graphql answer, raises RMPError
+        partial_ok: return whatever data came back alongside errors (aliased
+        batches, one bad alias shouldn't sink the rest)
+        """
+        try:
+            response = self.session.post(
+                self.url,
+                headers=self.headers(school_id, search_query),
+                json={"query": query, "variables": variables},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise RMPError(f"rmp request failed: {e}") from e
+        return self._data(data, partial_ok)
+
+    def async_session(self):
+        """
+        httpx.AsyncClient for aquery with the same pool size and timeouts. it's
+        tied to the event loop it's used on, so open one per loop:
+
+            async with rmp_client.async_session() as session:
+                await asyncio.gather(*(rmp_client.aquery(..., session=session) ...))
+        """
+        connect, read = self.timeout
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(
+                max_connections=self.pool_size, max_keepalive_connections=self.pool_size
+            ),
+        )
+
+    async def aquery(self, query, variables, school_id, search_query="", partial_ok=False, session=None):
+        """query() for asyncio callers, session: see async_session (a one off one if None)"""
+        if session is None:
+            async with self.async_session() as session:
+                return await self.aquery(query, variables, school_id, search_query, partial_ok, session)
+
+        limiter = limiter_for(self.url) if RATE_LIMITING else None
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(RMP_RETRY_BACKOFF * 2 ** (attempt - 1))
+            if limiter is not None:
+                await limiter.aacquire()
+            start = time.monotonic()
+            try:
+                response = await session.post(
+                    self.url,
+                    headers=self.headers(school_id, search_query),
+                    json={"query": query, "variables": variables},
+                )
+            except httpx.HTTPError as e:
+                if limiter is not None:
+                    limiter.release(time.monotonic() - start, failed=True)
+                error = e
+                continue
+            if limiter is not None:
+                limiter.release(time.monotonic() - start, status=response.status_code)
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                continue
+            break
+        else:
+            raise RMPError(f"rmp request failed: {error}") from error
+
+        try:
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise RMPError(f"rmp request failed: {e}") from e
+        return self._data(data, partial_ok)
+
+    def _data(self, data, partial_ok):
+        if "errors" in data and not (partial_ok and data.get("data")):
+            raise RMPError(data["errors"][0].get("message", "GraphQL error"))
+        return data.get("data") or {}
+
+    def close(self):
+        self.session.close()
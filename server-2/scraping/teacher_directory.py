@@ -0,0 +1,53 @@
+"""
+in-memory index of every ucsc teacher on RateMyProfessors
+
+with RMP_MATCH=directory the basic ratings lookups (everything a build does)
+stop searching rmp per name: the whole school is paged in once a day
+(ratings.refresh_teacher_directory) and _best_match scores the candidates
+this index hands back, so matching an instructor during a build needs no
+network at all
+
+candidates are keyed by (last word of the last name, first initial), the same
+two things _best_match checks (last name endswith + first initial), so it
+sees the same people a search would have returned, minus rmp's paging limit
+"""
+import re
+import time
+
+# how old the directory can get before it's refetched (in the background)
+DIRECTORY_TTL_SECONDS = 24 * 3600
+
+
+def directory_key(last_name, first_initial):
+    words = [word for word in re.split(r"[\s\-]+", (last_name or "").lower()) if word]
+    return (words[-1] if words else "", (first_initial or "").lower())
+
+
+class TeacherDirectory:
+    def __init__(self, nodes, fetched_at=None, ttl=DIRECTORY_TTL_SECONDS):
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+        self.ttl = ttl
+        self.size = 0
+        self._index = {}
+        for node in nodes:
+            first_name = node.get("firstName") or ""
+            if not first_name or not node.get("lastName"):
+                continue
+            key = directory_key(node["lastName"], first_name[0])
+            self._index.setdefault(key, []).append(node)
+            self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for nodes in self._index.values():
+            yield from nodes
+
+    @property
+    def stale(self):
+        return time.time() - self.fetched_at > self.ttl
+
+    def candidates(self, last_name, first_initial):
+        """teacher nodes _best_match should score for a name"""
+        return self._index.get(directory_key(last_name, first_initial), [])
@@ -0,0 +1,33 @@
+"""
+pisa term codes (strm): "2" + two digit year + quarter digit
+e.g. 2252 = spring 2025, 2258 = fall 2025, 2260 = winter 2026
+
+PISA_TERM is the term the site should be serving, PISA_SCRAPE_TERMS the terms
+that get built every day (defaults to PISA_TERM and the one after it, so the
+upcoming term is already scraped and cached when it's time to switch)
+"""
+import os
+
+QUARTERS = {0: "Winter", 2: "Spring", 4: "Summer", 8: "Fall"}
+
+CURRENT_TERM = int(os.getenv("PISA_TERM", 2258))
+
+
+def next_term(term):
+    year, quarter = divmod(int(term), 10)
+    later = [q for q in sorted(QUARTERS) if q > quarter]
+    return year * 10 + later[0] if later else (year + 1) * 10 + min(QUARTERS)
+
+
+def term_name(term):
+    year, quarter = divmod(int(term) - 2000, 10)
+    return f"{QUARTERS.get(quarter, quarter)} {2000 + year}"
+
+
+SCRAPE_TERMS = [
+    int(term)
+    for term in os.getenv(
+        "PISA_SCRAPE_TERMS", f"{CURRENT_TERM},{next_term(CURRENT_TERM)}"
+    ).split(",")
+    if term.strip()
+]
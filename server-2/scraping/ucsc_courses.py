@@ -1,7 +1,34 @@
-from bs4 import BeautifulSoup
+import hashlib
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
+from scraping import pisa_parser
+from scraping.rate_limit import create_limited_session, share_limits
+from scraping.terms import CURRENT_TERM
+
+SEARCH_URL = "https://pisa.ucsc.edu/class_search/"
+
+# search every subject separately across a process pool instead of paging
+# through the whole catalog in one session
+SHARDED_LISTING = os.getenv("PISA_SHARDED_LISTING", "0") == "1"
+LISTING_PROCESSES = int(os.getenv("PISA_LISTING_PROCESSES", 4))
+
+# bytes handed to the streaming listing parser at a time
+LISTING_CHUNK_SIZE = 64 * 1024
+
+# how many detail pages get fetched at the same time
+# also sizes the connection pool so every worker gets its own keep-alive connection
+DETAIL_WORKERS = int(os.getenv("PISA_DETAIL_WORKERS", 8))
+
+# "lxml" (fast, single pass) or "soup" (the original BeautifulSoup parser)
+PARSER_BACKEND = os.getenv(
+    "PISA_PARSER", "lxml" if pisa_parser.lxml_html is not None else "soup"
+)
 
 
 class Course:
@@ -71,17 +98,9 @@ class Course:
         }
 
 
-def create_session():
-    session = requests.Session()
-    retry = Retry(
-        total=3,
-        backoff_factor=0.5,
-        status_forcelist=[500, 502, 503, 504],
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    return session
+# retrying, pooled session that is paced by the shared pisa limiter
+def create_session(pool_size=DETAIL_WORKERS):
+    return create_limited_session(pool_size=pool_size)
 
 
 
@@ -163,7 +182,7 @@ def parse_course_panel(panel):
 
 
 
-def process_course_page(session, url):
+def soup_parse_course_page(html):
     course_details = {
         "description": "",
         "class_notes": "",
@@ -177,8 +196,7 @@ def process_course_page(session, url):
     }
 
     try:
-        response = session.get(url)
-        soup = BeautifulSoup(response.text, "html.parser")
+        soup = BeautifulSoup(html, "html.parser")
         panels = soup.find_all("div", class_="panel panel-default row")
 
         for panel in panels:
@@ -270,138 +288,597 @@ def process_course_page(session, url):
 
     return course_details
 
-def scrape_all_courses():
-    session = create_session()
-    course_list = []
-    page = 1
-    count = 0
 
+def parse_course_page(html, reduced=False, backend=None):
+    backend = backend or PARSER_BACKEND
+    if backend == "lxml":
+        return pisa_parser.detail_page_fields(html, reduced=reduced)
+    if reduced:
+        return soup_reduced_parse_course_page(html)
+    return soup_parse_course_page(html)
+
+
+def parse_listing_page(html, reduced=False, backend=None):
+    """
+    parse one page of search results with the configured backend
+    returns (courses, has_next_page)
+    """
+    backend = backend or PARSER_BACKEND
+    if backend == "lxml":
+        root = pisa_parser.parse_document(html)
+        courses = [
+            Course(**pisa_parser.listing_panel_fields(panel, reduced=reduced))
+            for panel in pisa_parser.iter_panels(root)
+        ]
+        return courses, pisa_parser.has_next_page(root)
+
+    soup = BeautifulSoup(html, "html.parser")
+    parse_panel = reduced_parse_course_panel if reduced else parse_course_panel
+    courses = [
+        parse_panel(panel)
+        for panel in soup.find_all("div", class_="panel panel-default row")
+    ]
+    next_button = soup.find("a", {"onclick": lambda x: x and "next" in x})
+    return courses, next_button is not None
+
+
+def iter_listing_page(chunks, reduced=False, state=None, backend=None, encoding="utf-8"):
+    """
+    generator version of parse_listing_page that takes the page in chunks
+    (e.g. response.iter_content) and yields each Course as soon as its panel
+    is parsed. with lxml only one panel is held in memory at a time
+    state["has_next"] is filled in once the generator is exhausted
+    encoding: charset of the chunks, see response_encoding
+    """
+    if state is None:
+        state = {}
+    backend = backend or PARSER_BACKEND
+
+    if backend == "lxml":
+        for fields in pisa_parser.iter_listing_panels(chunks, reduced, state, encoding):
+            yield Course(**fields)
+        return
+
+    # html.parser has no incremental mode, so build the tree but tear down
+    # each panel once it has been read so the page shrinks as we go
+    soup = BeautifulSoup(b"".join(chunks), "html.parser", from_encoding=encoding)
+    next_button = soup.find("a", {"onclick": lambda x: x and "next" in x})
+    state["has_next"] = next_button is not None
+    parse_panel = reduced_parse_course_panel if reduced else parse_course_panel
+    for panel in soup.find_all("div", class_="panel panel-default row"):
+        course = parse_panel(panel)
+        panel.decompose()
+        yield course
+
+
+def response_encoding(response):
+    """
+    charset of a pisa page: the one in Content-Type if it names one, else
+    utf-8 (requests would guess iso-8859-1 for a bare text/html)
+    """
+    if "charset" in response.headers.get("Content-Type", "").lower():
+        return response.encoding
+    return "utf-8"
+
+
+# archive: optional scraping.archive.PageArchive, successful pages are kept
+# in it under term + key (the course's enroll_num)
+def _archive_page(archive, term, key, response, content_hash=None):
+    if archive is not None and response.status_code == 200:
+        archive.put(term, "detail", key, response.content, content_hash)
+
+
+def process_course_page(session, url, archive=None, key=None, term=CURRENT_TERM):
     try:
-        response = session.get("https://pisa.ucsc.edu/class_search/")
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        data = {
-            "action": "results",
-            "binds[:term]": 2258,
-            "binds[:reg_status]": "all",
-            "binds[:subject]": "",
-            "binds[:ge]": "",
-            "binds[:crse_units]": "",
-            "binds[:instrct_mode]": "",
-            "rec_dur": 2000,  # Increase this to fetch more courses per request
+        response = session.get(url)
+    except Exception as e:
+        print(f"Error processing course page: {e}")
+        return parse_course_page("")
+    if response.status_code != 200:
+        # an error page has none of the panels, don't parse it as the course
+        print(f"Error processing course page: {url} answered {response.status_code}")
+        return parse_course_page("")
+    _archive_page(archive, term, key, response)
+    return parse_course_page(response.text)
+
+
+def fetch_course_page(
+    session, url, fingerprint=None, archive=None, key=None, term=CURRENT_TERM
+):
+    """
+    conditional version of process_course_page
+    fingerprint is whatever this returned for the page last time:
+    {"hash": ..., "etag": ..., "last_modified": ..., "details": {...}}
+    the server gets If-None-Match/If-Modified-Since when we have them, and
+    the page is only parsed again if its content hash actually changed
+    returns (details, new fingerprint)
+    """
+    headers = {}
+    if fingerprint:
+        if fingerprint.get("etag"):
+            headers["If-None-Match"] = fingerprint["etag"]
+        if fingerprint.get("last_modified"):
+            headers["If-Modified-Since"] = fingerprint["last_modified"]
+
+    try:
+        response = session.get(url, headers=headers)
+    except Exception as e:
+        print(f"Error processing course page: {e}")
+        # keep what we had last time instead of wiping the course
+        if fingerprint and fingerprint.get("details") is not None:
+            return fingerprint["details"], fingerprint
+        return parse_course_page(""), None
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+
+    if (
+        response.status_code == 304
+        and fingerprint
+        and fingerprint.get("details") is not None
+    ):
+        # nothing was downloaded, the archive keeps the copy from last time
+        if archive is not None:
+            archive.link(term, "detail", key, fingerprint.get("hash"))
+        return fingerprint["details"], {
+            **fingerprint,
+            "etag": etag or fingerprint.get("etag"),
+            "last_modified": last_modified or fingerprint.get("last_modified"),
         }
 
-        while True:
-            response = session.post(
-                "https://pisa.ucsc.edu/class_search/index.php", data=data
+    if response.status_code != 200:
+        # same as a network error: an error page isn't the course's content,
+        # so it's neither fingerprinted nor parsed
+        print(f"Error processing course page: {url} answered {response.status_code}")
+        if fingerprint and fingerprint.get("details") is not None:
+            return fingerprint["details"], fingerprint
+        return parse_course_page(""), None
+
+    content_hash = hashlib.sha256(response.content).hexdigest()
+    _archive_page(archive, term, key, response, content_hash)
+    if (
+        fingerprint
+        and fingerprint.get("hash") == content_hash
+        and fingerprint.get("details") is not None
+    ):
+        course_details = fingerprint["details"]
+    else:
+        course_details = parse_course_page(response.text)
+
+    return course_details, {
+        "hash": content_hash,
+        "etag": etag,
+        "last_modified": last_modified,
+        "details": course_details,
+    }
+
+
+def iter_course_details(
+    session,
+    courses,
+    process_page=process_course_page,
+    max_workers=DETAIL_WORKERS,
+    fingerprints=None,
+    should_fetch=None,
+    archive=None,
+    term=CURRENT_TERM,
+):
+    """
+    fetch the detail page of every course with a bounded thread pool
+    yields (course, details) in the same order the courses came in,
+    a page that blows up only costs that one course its details
+
+    if a fingerprints dict (enroll_num -> fingerprint) is passed in, pages go
+    through fetch_course_page instead and the dict is updated in place
+    should_fetch(course) can return False to skip a page, that course gets {}
+    archive: optional PageArchive every downloaded page is saved to
+    """
+
+    def fetch(course):
+        try:
+            if fingerprints is None and archive is None:
+                return process_page(session, course.link)
+            if fingerprints is None:
+                return process_page(
+                    session,
+                    course.link,
+                    archive=archive,
+                    key=course.enroll_num,
+                    term=term,
+                )
+            course_details, fingerprint = fetch_course_page(
+                session,
+                course.link,
+                fingerprints.get(course.enroll_num),
+                archive=archive,
+                key=course.enroll_num,
+                term=term,
+            )
+            if fingerprint is not None:
+                fingerprints[course.enroll_num] = fingerprint
+            return course_details
+        except Exception as e:
+            print(f"Error fetching details for {course.link}: {e}")
+            return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for course in courses:
+            if should_fetch is not None and not should_fetch(course):
+                pending.append((course, None))
+            else:
+                pending.append((course, executor.submit(fetch, course)))
+            # only keep a couple pages queued per worker so we never run
+            # far ahead of whoever is consuming the results
+            if len(pending) >= max_workers * 2:
+                done_course, future = pending.popleft()
+                yield done_course, future.result() if future else {}
+
+        while pending:
+            done_course, future = pending.popleft()
+            yield done_course, future.result() if future else {}
+
+
+def apply_course_details(course, course_details):
+    course.description = course_details.get("description", "")
+    course.class_notes = course_details.get("class_notes", "")
+    course.enrollment_reqs = course_details.get("enrollment_reqs", "")
+    course.discussion_sections = course_details.get("discussion_sections", [])
+    course.ge = course_details.get("general_education")
+    course.credits = course_details.get("credits")
+    course.career = course_details.get("career")
+    course.grading = course_details.get("grading")
+    course.course_type = course_details.get("type")
+    return course
+
+
+def parse_subjects(html):
+    """subject codes from the search form's subject dropdown"""
+    if PARSER_BACKEND == "lxml":
+        return pisa_parser.subject_options(pisa_parser.parse_document(html))
+
+    soup = BeautifulSoup(html, "html.parser")
+    select = soup.find("select", attrs={"name": "binds[:subject]"})
+    if not select:
+        return []
+    return [
+        option["value"]
+        for option in select.find_all("option")
+        if option.get("value", "").strip()
+    ]
+
+
+def iter_listing(session, subject="", reduced=False, archive=None, term=CURRENT_TERM):
+    """
+    every course on the search results for one subject ("" = whole catalog) in a term
+    follows the next button page by page and yields courses as they're parsed
+    archive: optional PageArchive, pages are saved as "<subject>/<page>"
+    """
+    # picks up the session cookie the search form needs
+    session.get(SEARCH_URL)
+
+    data = {
+        "action": "results",
+        "binds[:term]": term,
+        "binds[:reg_status]": "all",
+        "binds[:subject]": subject,
+        "binds[:ge]": "",
+        "binds[:crse_units]": "",
+        "binds[:instrct_mode]": "",
+        "rec_dur": 2000,  # Increase this to fetch more courses per request
+    }
+    page = 1
+
+    while True:
+        response = session.post(f"{SEARCH_URL}index.php", data=data, stream=True)
+        # an error page would parse as an empty listing and quietly end the
+        # subject, fail loudly instead (and keep it out of the archive)
+        if response.status_code != 200:
+            response.close()
+            raise requests.HTTPError(
+                f"listing page {page} for {subject or 'all subjects'} answered {response.status_code}",
+                response=response,
             )
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            # Process the current page
-            course_panels = soup.find_all("div", class_="panel panel-default row")
-
-            if not course_panels:
-                print(f"No courses found on page {page}. Ending search.")
-                break
-            for panel in course_panels:
-                course = parse_course_panel(panel)
-                if course:
-                    course_details = process_course_page(session, course.link)
-                    course.description = course_details.get("description", "")
-                    course.class_notes = course_details.get("class_notes", "")
-                    course.enrollment_reqs = course_details.get("enrollment_reqs", "")
-                    course.discussion_sections = course_details.get(
-                        "discussion_sections", []
-                    )
-                    course.ge = course_details.get("general_education")
-                    course.credits = course_details.get("credits")
-                    course.career = course_details.get("career")
-                    course.grading = course_details.get("grading")
-                    course.course_type = course_details.get("type")
-                    course_list.append(course)
-
-            next_button = soup.find("a", {"onclick": lambda x: x and "next" in x})
-            if not next_button:
-                print(f"No next button found on page {page}. Ending search.")
-                break
-
-            # Prepare for the next page
-            data["action"] = "next"
-            page += 1
 
+        # Process the current page, courses come off the parser one panel at a time
+        listing_state = {}
+        page_count = 0
+        chunks = response.iter_content(LISTING_CHUNK_SIZE)
+        if archive is not None:
+            chunks = archive.tee(chunks, term, "listing", f"{subject}/{page:04d}")
+        for course in iter_listing_page(
+            chunks,
+            reduced=reduced,
+            state=listing_state,
+            encoding=response_encoding(response),
+        ):
+            page_count += 1
+            yield course
+
+        if not page_count:
+            print(f"No courses found on page {page}. Ending search.")
+            break
+
+        if not listing_state["has_next"]:
+            print(f"No next button found on page {page}. Ending search.")
+            break
+
+        # Prepare for the next page
+        data["action"] = "next"
+        page += 1
+
+
+def _listing_shard(subject, reduced, session_factory, archive=None, term=CURRENT_TERM):
+    # runs in a worker process, so it gets its own session (and pisa cookie)
+    # and its own connection to the archive
+    try:
+        return list(
+            iter_listing(session_factory(pool_size=1), subject, reduced, archive, term)
+        )
     except Exception as e:
-        print(f"Error scraping all courses: {e}")
+        print(f"Error scraping subject {subject}: {e}")
+        return []
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+def iter_sharded_listing(
+    session,
+    reduced=False,
+    processes=LISTING_PROCESSES,
+    session_factory=create_session,
+    archive=None,
+    term=CURRENT_TERM,
+):
+    """
+    same courses as iter_listing(session) but every subject is searched
+    separately in a process pool, results come back subject by subject and
+    are de-duplicated on enroll_num (cross-listed classes show up twice)
+    session_factory has to be picklable, it builds each worker's session
+    """
+    subjects = parse_subjects(session.get(SEARCH_URL).text)
+    if not subjects:
+        print("No subjects found, falling back to a single catalog search.")
+        yield from iter_listing(session, reduced=reduced, archive=archive, term=term)
+        return
+
+    seen = set()
+    workers = max(1, min(processes, len(subjects)))
+    # spawn so forking a threaded gunicorn worker doesn't copy held locks
+    # limiters are per process, so each worker only gets its share of pisa's
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=share_limits,
+        initargs=(1 / workers,),
+    ) as executor:
+        shards = executor.map(
+            _listing_shard,
+            subjects,
+            repeat(reduced),
+            repeat(session_factory),
+            repeat(archive),
+            repeat(term),
+        )
+        for courses in shards:
+            for course in courses:
+                if course.enroll_num in seen:
+                    continue
+                seen.add(course.enroll_num)
+                yield course
+
+
+def iter_all_courses(
+    max_workers=DETAIL_WORKERS,
+    fingerprints=None,
+    session=None,
+    sharded=SHARDED_LISTING,
+    session_factory=create_session,
+    archive=None,
+    term=CURRENT_TERM,
+):
+    """
+    generator version of scrape_all_courses, yields every course with its
+    details filled in as soon as its detail page is done, in listing order
+    fingerprints: optional enroll_num -> fingerprint dict from the last run,
+    unchanged detail pages are skipped and the dict is updated in place
+    session: defaults to create_session(), pass one in to mount a different
+    transport (see benchmarks/replay.py)
+    sharded: run the listing search per subject across LISTING_PROCESSES processes
+    archive: optional PageArchive that keeps every fetched page for re-parsing
+    term: pisa term code to scrape (see scraping/terms.py)
+    """
+    if session is None:
+        # one extra connection for the listing page that streams in while details are fetched
+        session = create_session(pool_size=max_workers + 1)
+    total = 0
+    if archive is not None:
+        archive = archive.start_run(term)
 
-    print(f"Finished scraping. Total courses found: {len(course_list)}")
-    return course_list
+    try:
+        if sharded:
+            listing = iter_sharded_listing(
+                session, session_factory=session_factory, archive=archive, term=term
+            )
+        else:
+            listing = iter_listing(session, archive=archive, term=term)
+
+        # detail pages are fetched in parallel, results keep listing order
+        for course, course_details in iter_course_details(
+            session,
+            listing,
+            max_workers=max_workers,
+            fingerprints=fingerprints,
+            archive=archive,
+            term=term,
+        ):
+            total += 1
+            yield apply_course_details(course, course_details)
 
+    except Exception as e:
+        print(f"Error scraping all courses: {e}")
+    finally:
+        if archive is not None:
+            archive.flush()
+
+    print(f"Finished scraping {term}. Total courses found: {total}")
+
+
+def scrape_all_courses(
+    max_workers=DETAIL_WORKERS,
+    fingerprints=None,
+    session=None,
+    sharded=SHARDED_LISTING,
+    session_factory=create_session,
+    archive=None,
+    term=CURRENT_TERM,
+):
+    return list(
+        iter_all_courses(
+            max_workers=max_workers,
+            fingerprints=fingerprints,
+            session=session,
+            sharded=sharded,
+            session_factory=session_factory,
+            archive=archive,
+            term=term,
+        )
+    )
 
 
-def scrape_count():
-    session = create_session()
+def scrape_count(
+    max_workers=DETAIL_WORKERS,
+    session=None,
+    sharded=SHARDED_LISTING,
+    session_factory=create_session,
+    has_sections=None,
+    archive=None,
+    term=CURRENT_TERM,
+):
+    """
+    has_sections: optional enroll_num -> bool map of which classes have
+    discussion sections/labs. detail pages are then only fetched for classes
+    marked True or not in the map yet, everything else comes purely from the
+    listing panels. discussion_sections is None for a class whose detail page
+    was skipped or couldn't be fetched, callers keep what they had for it
+    """
+
+    def should_fetch(course):
+        return has_sections.get(str(course.enroll_num), True)
+
+    if session is None:
+        # one extra connection for the listing page that streams in while details are fetched
+        session = create_session(pool_size=max_workers + 1)
     course_list = []
-    page = 1
-    count = 0
+    if archive is not None:
+        archive = archive.start_run(term)
 
     try:
-        response = session.get("https://pisa.ucsc.edu/class_search/")
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        data = {
-            "action": "results",
-            "binds[:term]": 2258,
-            "binds[:reg_status]": "all",
-            "binds[:subject]": "",
-            "binds[:ge]": "",
-            "binds[:crse_units]": "",
-            "binds[:instrct_mode]": "",
-            "rec_dur": 2000,  # Increase this to fetch more courses per request
-        }
-
-        while True:
-            response = session.post(
-                "https://pisa.ucsc.edu/class_search/index.php", data=data
+        if sharded:
+            listing = iter_sharded_listing(
+                session,
+                reduced=True,
+                session_factory=session_factory,
+                archive=archive,
+                term=term,
             )
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            #process current page
-            course_panels = soup.find_all("div", class_="panel panel-default row")
-
-            if not course_panels:
-                print(f"No courses found on page {page}. Ending search.")
-                break
-            for panel in course_panels:
-                course = reduced_parse_course_panel(panel)
-                if course:
-                    course_details = reduced_process_course_page(session, course.link)
-                    course.discussion_sections = course_details.get(
-                        "discussion_sections", []
-                    )
-                    course_list.append(course)
-
-            next_button = soup.find("a", {"onclick": lambda x: x and "next" in x})
-            if not next_button:
-                print(f"No next button found on page {page}. Ending search.")
-                break
-
-            
-            data["action"] = "next"
-            page += 1
+        else:
+            listing = iter_listing(session, reduced=True, archive=archive, term=term)
+
+        for course, course_details in iter_course_details(
+            session,
+            listing,
+            process_page=reduced_process_course_page,
+            max_workers=max_workers,
+            should_fetch=should_fetch if has_sections is not None else None,
+            archive=archive,
+            term=term,
+        ):
+            # None: skipped or failed detail page, the stored sections still stand
+            course.discussion_sections = course_details.get("discussion_sections")
+            course_list.append(course)
 
     except Exception as e:
         print(f"Error scraping all courses: {e}")
+    finally:
+        if archive is not None:
+            archive.flush()
 
-    print(f"Finished scraping. Total courses found: {len(course_list)}")
+    print(f"Finished scraping {term}. Total courses found: {len(course_list)}")
     return course_list
 
-def reduced_process_course_page(session, url):
+
+def iter_archived_listing(archive, term=CURRENT_TERM, reduced=False, run=None):
+    """
+    the courses on the archived listing pages of a run (default: the latest
+    run that archived listing pages), no network involved
+    """
+    if run is None:
+        pages = archive.iter_pages(term, "listing", latest_run=True)
+    else:
+        pages = archive.iter_pages(term, "listing", run=run)
+
+    for key, page in pages:
+        try:
+            yield from list(iter_listing_page([page], reduced=reduced))
+        except Exception as e:
+            print(f"Error parsing archived listing page {key}: {e}")
+
+
+def iter_archived_courses(archive, term=CURRENT_TERM, reduced=False, listing=None):
+    """
+    same courses iter_all_courses would yield, rebuilt purely from a
+    PageArchive: the listing pages of the latest archived run (or the given
+    listing) plus the latest detail page of every class
+    a class whose detail page was never archived gets empty details
+    """
+    if listing is None:
+        listing = iter_archived_listing(archive, term, reduced)
+
+    seen = set()
+    total = 0
+    for course in listing:
+        if course.enroll_num in seen:
+            continue
+        seen.add(course.enroll_num)
+
+        detail_page = archive.get(term, "detail", course.enroll_num)
+        course_details = (
+            parse_course_page(detail_page.decode("utf-8", "replace"), reduced)
+            if detail_page is not None
+            else {}
+        )
+        total += 1
+        yield apply_course_details(course, course_details)
+
+    print(f"Finished re-parsing archive. Total courses found: {total}")
+
+
+def reduced_process_course_page(
+    session, url, archive=None, key=None, term=CURRENT_TERM
+):
+    # a page we couldn't get has no details rather than no sections, so the
+    # sections stored for the class aren't wiped by a network error
+    try:
+        response = session.get(url)
+    except Exception as e:
+        print(f"Error processing course page: {e}")
+        return {}
+    if response.status_code != 200:
+        print(f"Error processing course page: {url} answered {response.status_code}")
+        return {}
+    _archive_page(archive, term, key, response)
+    return parse_course_page(response.text, reduced=True)
+
+
+def soup_reduced_parse_course_page(html):
     course_details = {
         "discussion_sections": [],
     }
 
     try:
-        response = session.get(url)
-        soup = BeautifulSoup(response.text, "html.parser")
+        soup = BeautifulSoup(html, "html.parser")
         panels = soup.find_all("div", class_="panel panel-default row")
 
         for panel in panels:
@@ -0,0 +1,124 @@
+"""
+shared read-only connections to slugtistics.db
+
+the grade data only changes when a new grade release is loaded, so the read
+paths (main.py, the gpa indexes) don't need a fresh read-write connection per
+request. ReadOnlyPool hands out long lived mode=ro connections (query_only,
+bigger page cache, mmap'd reads) to any thread and takes them back afterwards.
+each connection keeps its own compiled statement cache, so hot queries passed
+as the same sql string are prepared once per connection instead of per request
+
+when the db changes (a write, a checkpoint or the file being swapped, see
+data_version) idle connections are dropped and reopened on their next
+checkout. immutable=1 is deliberately not offered: grade releases are loaded
+by writing into this same file, and an immutable connection would never see
+them
+"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", 8))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+# negative: KiB, so 64MB of page cache per connection
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", -64 * 1024))
+# per connection prepared statement cache
+SQLITE_CACHED_STATEMENTS = 256
+
+
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "0"
+    return f"{stat.st_mtime_ns:x}.{stat.st_size:x}"
+
+
+def data_version(path):
+    """
+    changes whenever the db is written to, checkpointed or swapped. in WAL mode
+    commits only touch the -wal file until a checkpoint, so that's part of it
+    """
+    path = str(path)
+    return f"{_file_version(path)}-{_file_version(path + '-wal')}"
+
+
+class ReadOnlyPool:
+    def __init__(
+        self,
+        path,
+        size=SQLITE_POOL_SIZE,
+        mmap_size=SQLITE_MMAP_SIZE,
+        cache_size=SQLITE_CACHE_SIZE,
+    ):
+        self.path = str(path)
+        self.size = size
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # connections never cross a fork (gunicorn preloads the app)
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            f"file:{self.path}?mode=ro",
+            uri=True,
+            timeout=30,
+            check_same_thread=False,
+            cached_statements=SQLITE_CACHED_STATEMENTS,
+        )
+        conn.execute("PRAGMA query_only=1")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        conn.row_factory = sqlite3.Row
+        return conn, data_version(self.path)
+
+    @contextmanager
+    def connection(self):
+        """a pooled connection for the duration of the block, blocks while all size are out"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+        slots = self._slots
+        slots.acquire()
+        try:
+            try:
+                conn, version = self._idle.get_nowait()
+            except queue.Empty:
+                conn, version = self._connect()
+            if version != data_version(self.path):
+                conn.close()
+                conn, version = self._connect()
+
+            try:
+                yield conn
+            except sqlite3.Error:
+                conn.close()
+                raise
+            except BaseException:
+                self._idle.put((conn, version))
+                raise
+            else:
+                self._idle.put((conn, version))
+        finally:
+            slots.release()
+
+    def query(self, query, args=(), one=False):
+        with self.connection() as conn:
+            rows = conn.execute(query, args).fetchall()
+        return (rows[0] if rows else None) if one else rows
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# the server's modules import each other from server-2/ (scraping, app, ...)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# config.py binds courses.db at import, keep the tests off the real one
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/courses.db")
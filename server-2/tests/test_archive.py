@@ -0,0 +1,29 @@
+import pickle
+
+from scraping.archive import PageArchive
+
+
+def test_overlapping_runs_keep_their_own_run_ids(tmp_path):
+    archive = PageArchive(tmp_path / "pisa_archive.db")
+    build = archive.start_run(2258)
+    build.put(2258, "listing", "/0001", b"build page 1")
+
+    # an hourly refresh of the same term starts while the build is still going
+    refresh = archive.start_run(2258)
+    refresh.put(2258, "listing", "/0001", b"refresh page 1")
+    build.put(2258, "listing", "/0002", b"build page 2")
+    build.put(2258, "detail", "20001", b"build detail")
+
+    assert build.runs[2258] != refresh.runs[2258]
+    assert archive.runs == {}
+    assert list(build.iter_pages(2258, "listing", run=build.runs[2258])) == [("/0002", b"build page 2")]
+    assert list(archive.iter_pages(2258, "detail", run=build.runs[2258])) == [("20001", b"build detail")]
+
+    # a listing shard gets its own connection but stays on the build's run
+    build.flush()
+    shard = pickle.loads(pickle.dumps(build))
+    shard.put(2258, "listing", "CSE/0001", b"shard page")
+    shard.close()
+    archive.flush()
+    assert [key for key, _ in archive.iter_pages(2258, "listing", run=build.runs[2258])] == ["/0002", "CSE/0001"]
+    archive.close()
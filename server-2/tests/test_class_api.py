@@ -0,0 +1,96 @@
+import io
+import json
+from pathlib import Path
+
+import requests
+
+from benchmarks.replay import LISTING_PANEL
+from scraping import class_api
+from scraping.archive import PageArchive
+
+FIXTURES = Path(__file__).parent / "fixtures" / "class_api"
+TERM = 2248
+
+
+def _answer(body, status=200):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response.raw = io.BytesIO(body)
+    response.headers["Content-Type"] = "text/html; charset=utf-8"
+    return response
+
+
+def _listing(*classes):
+    panels = "".join(
+        LISTING_PANEL.format(
+            i=i, enroll=enroll, subject="CSE", number=number, link="#", status="Open", teacher=i, enrolled=5
+        )
+        for i, (enroll, number) in enumerate(classes)
+    )
+    return f'<html><body><div class="center-block">{panels}</div></body></html>'.encode()
+
+
+class Session:
+    """the class api answers from the fixture, pisa's search with one listing page"""
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.posts = []
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        if url.startswith(class_api.API_URL):
+            return _answer(json.dumps(self.payload).encode())
+        return _answer(b"<html></html>")
+
+    def post(self, url, data=None, stream=False):
+        self.posts.append(data["binds[:subject]"])
+        # the cse 101 lecture the api mapped fine is on pisa's page too
+        return _answer(_listing((21130, 101), (25002, 198)))
+
+
+def _payload():
+    return json.loads((FIXTURES / "CSE.json").read_text())
+
+
+def test_api_fields_map_like_the_listing():
+    payload = _payload()
+    # keep the unmappable class out, this is about the field names
+    payload["classes"] = [entry for entry in payload["classes"] if entry["class_nbr"] != 25002]
+    sections = {}
+    courses = list(class_api.iter_api_listing(Session(payload), TERM, subjects=["CSE"], sections=sections))
+
+    lecture, online = courses
+    assert lecture.code == "CSE 101"
+    assert lecture.instructor == "José Núñez"
+    assert lecture.schedule == "MWF 09:20AM-10:25AM"
+    assert lecture.location == "Thimann Lecture 003"
+    assert lecture.class_count == "148/150"
+    assert lecture.class_type == "In Person"
+    assert lecture.class_status == "Open"
+    assert online.instructor == "Staff"
+    assert online.schedule == "Asynchronous"
+    assert online.class_type == "Asynchronous Online"
+    # the discussion section is kept for the seat refresh, not listed as a class
+    assert list(sections) == ["21131"]
+    assert class_api.section_fields(sections["21131"], {"enroll_num": "21131"})["class_count"] == "31/35"
+
+
+def test_unmapped_classes_alone_fall_back_to_pisa(tmp_path):
+    session = Session(_payload())
+    archive = PageArchive(tmp_path / "pisa_archive.db").start_run(TERM)
+    courses = list(class_api.iter_api_listing(session, TERM, subjects=["CSE"], archive=archive))
+
+    # 25002 has no catalog number in the api, only it comes from the pisa listing
+    assert [(course.enroll_num, course.code) for course in courses] == [
+        ("21130", "CSE 101"),
+        ("21200", "CSE 130"),
+        ("25002", "CSE 198"),
+    ]
+    assert courses[0].class_count == "148/150"
+    assert session.posts == ["CSE"]
+
+    # the fallback's listing page went into the run, a re-parse gets the same classes
+    archive.flush()
+    reparsed = list(class_api.iter_archived_listing(archive, TERM))
+    assert [course.enroll_num for course in reparsed] == ["21130", "21200", "25002"]
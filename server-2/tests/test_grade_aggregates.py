@@ -0,0 +1,54 @@
+import sqlite3
+
+import pytest
+
+import grade_aggregates
+from grade_engine import GRADES, GradeBook
+
+ROWS = [
+    ("CSE 101", "Tantalo,Patrick", "Fall 2023", [30, 20, 10, 5, 5, 0, 0, 2, 0, 0, 0, 0, 3, 4, 1, 2]),
+    ("CSE 101", "Tantalo,Patrick", "Spring 2024", [10, 10, 5, 0, 5, 0, 0, 0, 0, 0, 0, 0, 1, 0, 0, 1]),
+    ("CSE 101", "Sesh,C.", "Winter 2024", [5, 8, 9, 7, 3, 2, 1, 0, 0, 0, 0, 0, -2, 0, 0, 0]),
+    ("CSE 101", None, "Fall 2022", [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0]),
+    ("MATH 19A", "Staff", "Fall 2023", [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 5, 2, 3]),
+]
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "slugtistics.db")
+    columns = ", ".join(f'"{grade}" INTEGER' for grade in GRADES)
+    conn.execute(f'CREATE TABLE GradeData ("SubjectCatalogNbr" TEXT, "Instructors" TEXT, "Term" TEXT, {columns})')
+    _insert(conn, ROWS)
+    yield conn
+    conn.close()
+
+
+def _insert(conn, rows):
+    placeholders = ", ".join("?" * (3 + len(GRADES)))
+    with conn:
+        conn.executemany(f"INSERT INTO GradeData VALUES ({placeholders})", [(*row[:3], *row[3]) for row in rows])
+
+
+def test_aggregate_book_matches_grade_data(conn):
+    assert grade_aggregates.ensure_grade_aggregates(conn)
+    assert not grade_aggregates.ensure_grade_aggregates(conn)
+
+    expected = GradeBook.load(conn)
+    actual = grade_aggregates.load_grade_book(conn)
+    for attr in ("by_course", "by_instructor"):
+        keys = getattr(expected, attr).keys
+        assert sorted(getattr(actual, attr).keys, key=str) == sorted(keys, key=str)
+        for key in keys:
+            lookup = key if isinstance(key, tuple) else (key,)
+            assert getattr(actual, attr).get(*lookup) == getattr(expected, attr).get(*lookup)
+    assert actual.gpa("CSE 101", "Tantalo,Patrick") == expected.gpa("CSE 101", "Tantalo,Patrick")
+    assert actual.course_instructors() == expected.course_instructors()
+
+
+def test_new_grade_release_rebuilds(conn):
+    grade_aggregates.ensure_grade_aggregates(conn)
+    _insert(conn, [("CSE 101", "Sesh,C.", "Fall 2024", [0] * 12 + [10, 0, 0, 0])])
+    assert grade_aggregates.ensure_grade_aggregates(conn)
+    book = grade_aggregates.load_grade_book(conn)
+    assert book.by_instructor.get("CSE 101", "Sesh,C.")["grades"]["F"] == 10
@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+from helper_functions import iter_in_background
+
+
+def _source(closed, pulled):
+    try:
+        for i in range(1000):
+            pulled.append(i)
+            yield i
+    finally:
+        closed.append(threading.current_thread().name)
+
+
+def test_early_stop_closes_the_source_and_the_producer():
+    closed, pulled = [], []
+    before = threading.active_count()
+    items = iter_in_background(_source(closed, pulled), maxsize=2)
+
+    assert [next(items) for _ in range(3)] == [0, 1, 2]
+    items.close()
+
+    # the source's finally ran on the producer thread, and that thread is gone
+    assert len(closed) == 1
+    assert closed[0] != threading.current_thread().name
+    assert threading.active_count() == before
+    # the producer stopped a bounded queue's length past what was consumed
+    assert len(pulled) <= 3 + 2 + 1
+
+
+def test_consumer_error_stops_the_producer():
+    closed, pulled = [], []
+    with pytest.raises(RuntimeError):
+        for item in iter_in_background(_source(closed, pulled), maxsize=2):
+            if item == 1:
+                raise RuntimeError("build gave up")
+    assert len(closed) == 1
+
+
+def test_producer_error_reaches_the_consumer():
+    def failing():
+        yield 1
+        raise ValueError("listing broke")
+
+    items = iter_in_background(failing())
+    assert next(items) == 1
+    with pytest.raises(ValueError, match="listing broke"):
+        next(items)
@@ -0,0 +1,188 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+import requests
+
+from benchmarks.replay import LISTING_PANEL, synthesize
+from scraping import ucsc_courses
+
+# pages laid out like pisa's own, with its quirks (meta charset, non-ascii
+# names, trailing spaces in class attributes, <br>s, multi section and
+# cancelled classes, an empty result). pages recorded with
+# `python -m benchmarks.replay record <dir>` can be dropped in next to them
+# as listing_*.html / detail_*.html and are checked the same way
+FIXTURES = Path(__file__).parent / "fixtures" / "pisa"
+LISTING_FIXTURES = sorted(FIXTURES.glob("listing_*.html"))
+DETAIL_FIXTURES = sorted(FIXTURES.glob("detail_*.html"))
+
+
+@pytest.fixture(scope="module")
+def pages(tmp_path_factory):
+    """(kind, html) of a small synthetic term: listing pages and detail pages"""
+    directory = str(tmp_path_factory.mktemp("pisa"))
+    synthesize(directory, courses=60, per_page=25, sections_every=3)
+    with open(os.path.join(directory, "index.json"), encoding="utf-8") as fp:
+        index = json.load(fp)
+
+    pages = []
+    for key, entries in index.items():
+        for entry in entries:
+            with open(os.path.join(directory, "pages", entry["file"]), encoding="utf-8") as fp:
+                html = fp.read()
+            if key.startswith("POST"):
+                pages.append(("listing", html))
+            elif "action=detail" in key:
+                pages.append(("detail", html))
+    return pages
+
+
+@pytest.mark.parametrize("reduced", [False, True])
+def test_listing_backends_match(pages, reduced):
+    listings = [html for kind, html in pages if kind == "listing"]
+    assert any("Class Number:" in html for html in listings)
+    for html in listings:
+        soup, soup_next = ucsc_courses.parse_listing_page(html, reduced=reduced, backend="soup")
+        lxml, lxml_next = ucsc_courses.parse_listing_page(html, reduced=reduced, backend="lxml")
+        assert [course.to_dict() for course in lxml] == [course.to_dict() for course in soup]
+        assert lxml_next == soup_next
+
+
+@pytest.mark.parametrize("reduced", [False, True])
+def test_streamed_listing_matches_soup(pages, reduced):
+    for html in (html for kind, html in pages if kind == "listing"):
+        soup, soup_next = ucsc_courses.parse_listing_page(html, reduced=reduced, backend="soup")
+        state = {}
+        data = html.encode()
+        chunks = [data[start : start + 512] for start in range(0, len(data), 512)]
+        streamed = list(ucsc_courses.iter_listing_page(chunks, reduced, state, backend="lxml"))
+        assert [course.to_dict() for course in streamed] == [course.to_dict() for course in soup]
+        assert state["has_next"] == soup_next
+
+
+@pytest.mark.parametrize("reduced", [False, True])
+def test_detail_backends_match(pages, reduced):
+    details = [html for kind, html in pages if kind == "detail"]
+    assert any("Associated Discussion Sections" in html for html in details)
+    for html in details:
+        soup = ucsc_courses.parse_course_page(html, reduced, backend="soup")
+        lxml = ucsc_courses.parse_course_page(html, reduced, backend="lxml")
+        assert lxml.keys() == soup.keys()
+        for field in soup:
+            assert lxml[field] == soup[field], field
+
+
+def _utf8_listing():
+    panels = "".join(
+        LISTING_PANEL.format(
+            i=i,
+            enroll=30000 + i,
+            link=f"index.php?action=detail&amp;class_data={i}",
+            status="Open",
+            subject="LIT",
+            number=61 + i,
+            teacher=i,
+            enrolled=12,
+        ).replace(f"Lastname{i},F.", name)
+        for i, name in enumerate(["Núñez,José", "Ørsted,Zoë", "Smith,Jane"])
+    )
+    return f'<html><body><div class="center-block">{panels}</div></body></html>'.encode("utf-8")
+
+
+@pytest.mark.parametrize("reduced", [False, True])
+def test_utf8_listing_backends_match(reduced):
+    data = _utf8_listing()
+    soup, _ = ucsc_courses.parse_listing_page(data.decode("utf-8"), reduced=reduced, backend="soup")
+    lxml, _ = ucsc_courses.parse_listing_page(data.decode("utf-8"), reduced=reduced, backend="lxml")
+    # odd chunk size so multibyte characters get split across chunks
+    chunks = [data[start : start + 37] for start in range(0, len(data), 37)]
+    streamed = list(ucsc_courses.iter_listing_page(chunks, reduced, backend="lxml"))
+    streamed_soup = list(ucsc_courses.iter_listing_page(chunks, reduced, backend="soup"))
+
+    expected = [course.to_dict() for course in soup]
+    for courses in (lxml, streamed, streamed_soup):
+        assert [course.to_dict() for course in courses] == expected
+    if not reduced:
+        assert [course.instructor for course in soup] == ["José Núñez", "Zoë Ørsted", "Jane Smith"]
+
+
+def test_response_encoding():
+    response = requests.Response()
+    response.headers["Content-Type"] = "text/html"
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    assert ucsc_courses.response_encoding(response) == "utf-8"
+    response.headers["Content-Type"] = "text/html; charset=windows-1252"
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    assert ucsc_courses.response_encoding(response) == "windows-1252"
+
+
+@pytest.mark.parametrize("reduced", [False, True])
+@pytest.mark.parametrize("path", LISTING_FIXTURES, ids=lambda path: path.name)
+def test_fixture_listing_backends_match(path, reduced):
+    data = path.read_bytes()
+    html = data.decode("utf-8")
+    soup, soup_next = ucsc_courses.parse_listing_page(html, reduced=reduced, backend="soup")
+    lxml, lxml_next = ucsc_courses.parse_listing_page(html, reduced=reduced, backend="lxml")
+    expected = [course.to_dict() for course in soup]
+    assert [course.to_dict() for course in lxml] == expected
+    assert lxml_next == soup_next
+
+    chunks = [data[start : start + 101] for start in range(0, len(data), 101)]
+    for backend in ("lxml", "soup"):
+        state = {}
+        streamed = list(ucsc_courses.iter_listing_page(chunks, reduced, state, backend=backend))
+        assert [course.to_dict() for course in streamed] == expected
+        assert state["has_next"] == soup_next
+
+
+@pytest.mark.parametrize("reduced", [False, True])
+@pytest.mark.parametrize("path", DETAIL_FIXTURES, ids=lambda path: path.name)
+def test_fixture_detail_backends_match(path, reduced):
+    html = path.read_text(encoding="utf-8")
+    soup = ucsc_courses.parse_course_page(html, reduced, backend="soup")
+    lxml = ucsc_courses.parse_course_page(html, reduced, backend="lxml")
+    assert lxml.keys() == soup.keys()
+    for field in soup:
+        assert lxml[field] == soup[field], field
+
+
+def test_fixture_listing_fields():
+    courses, has_next = ucsc_courses.parse_listing_page(
+        (FIXTURES / "listing_results.html").read_text(encoding="utf-8"), backend="lxml"
+    )
+    assert has_next
+    by_number = {course.enroll_num: course for course in courses}
+    assert by_number["21130"].instructor == "José Núñez"
+    assert by_number["21130"].class_count == "148/150"
+    assert by_number["21614"].class_status == "Wait List"
+    assert by_number["21614"].location == "SEM: Humanitiés 1 210"
+    cancelled = by_number["25002"]
+    assert (cancelled.instructor, cancelled.class_count, cancelled.schedule) == ("Staff", "0/0", "Asynchronous")
+
+    empty, empty_next = ucsc_courses.parse_listing_page(
+        (FIXTURES / "listing_empty.html").read_text(encoding="utf-8"), backend="lxml"
+    )
+    assert empty == [] and not empty_next
+
+    data = (FIXTURES / "listing_no_charset.html").read_bytes()
+    streamed = list(ucsc_courses.iter_listing_page([data], backend="lxml"))
+    assert [course.instructor for course in streamed] == ["Begoña Peña", "Thảo Nguyễn"]
+
+
+def test_fixture_detail_fields():
+    details = ucsc_courses.parse_course_page(
+        (FIXTURES / "detail_sections.html").read_text(encoding="utf-8"), backend="lxml"
+    )
+    sections = details["discussion_sections"]
+    assert [section["code"] for section in sections] == ["DIS 01A", "DIS 01B", "DIS 01C", "LAB 01D"]
+    assert sections[2]["instructor"] == "Ødegård,K."
+    assert sections[2]["wait_count"] == "3 / 10"
+    assert "naïve" in details["description"]
+    assert (details["credits"], details["general_education"]) == ("5", None)
+
+    cancelled = ucsc_courses.parse_course_page(
+        (FIXTURES / "detail_cancelled.html").read_text(encoding="utf-8"), backend="lxml"
+    )
+    assert cancelled["discussion_sections"] == []
+    assert cancelled["general_education"] == "MF"
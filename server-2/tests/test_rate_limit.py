@@ -0,0 +1,87 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scraping import rate_limit
+from scraping.rate_limit import AdaptiveLimiter, create_limited_session
+
+
+def _answer(limiter, status=200, latency=0.1):
+    # as if acquire() had let it through, without waiting on the token bucket
+    limiter.in_flight += 1
+    limiter.release(latency, status=status)
+    # let the next decrease through, they're spaced a latency window apart
+    limiter._last_decrease = 0.0
+
+
+def test_lone_error_trims_a_run_of_errors_halves():
+    limiter = AdaptiveLimiter(rate=40, concurrency=16, max_rate=40, max_concurrency=16)
+    _answer(limiter, 429)
+    assert 30 <= limiter.rate < 40
+
+    for _ in range(3):
+        _answer(limiter, 503)
+    assert limiter.error_rate > 0.25
+    before = limiter.rate
+    _answer(limiter, 503)
+    assert limiter.rate == pytest.approx(before / 2)
+
+
+def test_no_increase_until_the_error_rate_decays():
+    limiter = AdaptiveLimiter(rate=4, concurrency=4)
+    for _ in range(3):
+        _answer(limiter, 429)
+    held = limiter.rate
+    _answer(limiter)
+    assert limiter.rate == held
+
+    while limiter.error_rate >= rate_limit.ERROR_RATE_HOLD:
+        _answer(limiter)
+    _answer(limiter)
+    assert limiter.rate > held
+
+
+class Throttling(BaseHTTPRequestHandler):
+    """429 for the first `throttled` requests, then 200"""
+
+    throttled = 2
+    requests = 0
+
+    def do_GET(self):
+        cls = type(self)
+        cls.requests += 1
+        status = 429 if cls.requests <= cls.throttled else 200
+        self.send_response(status)
+        self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_every_throttled_attempt_reaches_the_limiter(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Throttling)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    Throttling.requests = 0
+    limiter = AdaptiveLimiter(rate=50, concurrency=4)
+    monkeypatch.setitem(rate_limit._limiters, "127.0.0.1", limiter)
+    statuses = []
+    release = limiter.release
+
+    def record(latency, status=None, failed=False):
+        statuses.append(status)
+        release(latency, status, failed)
+
+    monkeypatch.setattr(limiter, "release", record)
+    try:
+        response = create_limited_session(pool_size=1).get(f"http://127.0.0.1:{server.server_port}/")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert response.status_code == 200
+    assert statuses == [429, 429, 200]
+    assert limiter.error_rate > 0
@@ -0,0 +1,146 @@
+import io
+
+import numpy as np
+import pytest
+from flask import Flask
+
+import routes
+from scraping import rating_store, ratings
+from scraping.ratings_cache import RatingsCache
+
+TEACHER = {
+    "id": "VGVhY2hlci0x",
+    "firstName": "Ana",
+    "lastName": "Lee",
+    "department": "Computer Science",
+    "avgRating": 4.1,
+    "avgDifficulty": 2.9,
+    "numRatings": 3,
+    "wouldTakeAgainPercent": 80.0,
+    "courseCodes": [{"courseName": "CSE101", "courseCount": 2}],
+    "ratingsDistribution": {"r1": 0, "r2": 1, "r3": 0, "r4": 1, "r5": 1},
+}
+
+
+def _rating(course, date, helpful, clarity, tags, **fields):
+    return {
+        "comment": f"{course} on {date}",
+        "date": f"{date} 00:00:00 +0000 UTC",
+        "class": course,
+        "helpfulRating": helpful,
+        "clarityRating": clarity,
+        "difficultyRating": 3,
+        "thumbsUpTotal": 1,
+        "thumbsDownTotal": 0,
+        "wouldTakeAgain": 1,
+        "isForCredit": True,
+        "isForOnlineClass": False,
+        "attendanceMandatory": "non mandatory",
+        "ratingTags": tags,
+        "flagStatus": "UNFLAGGED",
+        "textbookUse": 0,
+        **fields,
+    }
+
+
+RATINGS = [
+    _rating("CSE101", "2024-05-01", 5, 4, "Tough grader--Caring"),
+    _rating("CSE 130", "2023-11-02", 2, 3, "", wouldTakeAgain=None, isForOnlineClass=True),
+    _rating("cse101", "2022-01-15", 4, 4, "Caring", attendanceMandatory="mandatory", textbookUse=None),
+]
+
+
+@pytest.fixture
+def rmp(tmp_path, monkeypatch):
+    cache = RatingsCache(str(tmp_path / "rmp_cache.db"))
+    monkeypatch.setattr(ratings, "ratings_cache", cache)
+    monkeypatch.setattr(ratings, "RMP_MATCH", "search")
+    monkeypatch.setattr(ratings.rmp_client, "retries", 0)
+    pages = []
+
+    def query(query, variables, school_id, search_query="", partial_ok=False):
+        if "TeacherRatingsQuery" in query:
+            # two pages, so the cursor is followed
+            pages.append(variables["after"])
+            edges = [{"node": rating} for rating in (RATINGS[:2] if variables["after"] is None else RATINGS[2:])]
+            return {
+                "node": {
+                    "ratings": {
+                        "edges": edges,
+                        "pageInfo": {"hasNextPage": variables["after"] is None, "endCursor": "c1"},
+                    }
+                }
+            }
+        assert "ratings(" not in query
+        return {"newSearch": {"teachers": {"edges": [{"node": TEACHER}]}}}
+
+    monkeypatch.setattr(ratings.rmp_client, "query", query)
+    return cache, pages
+
+
+def test_detailed_info_serves_every_review_from_the_store(rmp):
+    cache, pages = rmp
+    info = ratings.get_detailed_professor_info("A. Lee")
+
+    assert pages == [None, "c1"]
+    assert isinstance(info.all_ratings, rating_store.RatingColumns)
+    all_ratings = info.to_dict()["all_ratings"]
+    assert [rating["class_name"] for rating in all_ratings] == ["CSE101", "CSE130", "CSE101"]
+    assert all_ratings[0] == {
+        "class_name": "CSE101",
+        "date": "2024-05-01",
+        "helpful_rating": 5.0,
+        "clarity_rating": 4.0,
+        "difficulty_rating": 3.0,
+        "overall_rating": 4.5,
+        "comment": "CSE101 on 2024-05-01",
+        "thumbs_up": 1,
+        "thumbs_down": 0,
+        "would_take_again": True,
+        "is_online": False,
+        "is_for_credit": True,
+        "attendance_mandatory": "non mandatory",
+        "textbook_use": 0,
+        "tags": "Tough grader--Caring",
+        "flag_status": "UNFLAGGED",
+    }
+    assert all_ratings[1]["would_take_again"] is False
+    assert all_ratings[1]["is_online"] is True
+    assert all_ratings[1]["tags"] == ""
+    assert all_ratings[2]["textbook_use"] == -1
+
+    # the course narrows the stored reviews instead of asking rmp again
+    info = ratings.get_detailed_professor_info("A. Lee", "CSE 101")
+    assert pages == [None, "c1"]
+    assert [rating["date"] for rating in info.to_dict()["all_ratings"]] == ["2024-05-01", "2022-01-15"]
+    assert [rating["tags"] for rating in info.to_dict()["all_ratings"]] == ["Tough grader--Caring", "Caring"]
+
+
+def test_reviews_of_an_older_format_are_fetched_again(rmp):
+    cache, pages = rmp
+    columns = rating_store.RatingColumns.from_ratings(RATINGS)
+    older = {name: getattr(columns, name) for name in rating_store.COLUMNS[:11]}
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, courses=np.array(columns.courses), tags=np.array(columns.tags), **older)
+    cache.put_reviews(TEACHER["id"], buffer.getvalue())
+
+    with pytest.raises(ValueError):
+        rating_store.RatingColumns.from_bytes(buffer.getvalue())
+    reviews = ratings.get_professor_reviews(TEACHER["id"])
+    assert len(reviews) == 3
+    assert pages == [None, "c1"]
+    assert rating_store.records(rating_store.RatingColumns.from_bytes(cache.get_reviews(TEACHER["id"])[0])) == (
+        rating_store.records(reviews)
+    )
+
+
+@pytest.mark.parametrize("path", ["/instructor_ratings", "/instructor_review_stats"])
+@pytest.mark.parametrize("instructor", [None, "Staff"])
+def test_missing_or_staff_instructor_is_a_bad_request(path, instructor):
+    app = Flask(__name__)
+    app.register_blueprint(routes.courses_bp)
+    query = {"course": "CSE 101"}
+    if instructor:
+        query["instructor"] = instructor
+    response = app.test_client().get(path, query_string=query)
+    assert response.status_code == 400
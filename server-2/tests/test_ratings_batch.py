@@ -0,0 +1,41 @@
+from scraping import ratings
+from scraping.ratings_cache import RatingsCache
+
+TEACHER = {
+    "id": "VGVhY2hlci0x",
+    "firstName": "Ana",
+    "lastName": "Lee",
+    "department": "Computer Science",
+    "avgRating": 4.1,
+    "avgDifficulty": 2.9,
+    "numRatings": 12,
+    "wouldTakeAgainPercent": 80.0,
+    "courseCodes": [{"courseName": "CSE101", "courseCount": 3}],
+    "ratingsDistribution": {"r1": 0, "r2": 1, "r3": 2, "r4": 4, "r5": 5},
+}
+
+
+def test_partial_batch_answer_does_not_cache_a_miss(tmp_path, monkeypatch):
+    cache = RatingsCache(str(tmp_path / "rmp_cache.db"))
+    monkeypatch.setattr(ratings, "ratings_cache", cache)
+    monkeypatch.setattr(ratings, "RMP_MATCH", "search")
+
+    def query(query, variables, school_id, search_query="", partial_ok=False):
+        # t0 (lee a) errored and came back null, t1 (smith b) really has nobody
+        assert partial_ok
+        return {"t0": None, "t1": {"teachers": {"edges": []}}}
+
+    monkeypatch.setattr(ratings.rmp_client, "query", query)
+    results = ratings.get_basic_professor_info_batch([("A. Lee", "CSE 101"), ("B. Smith", "CSE 101")])
+
+    assert results == [None, None]
+    assert cache.get("basic", "A. Lee", "CSE 101") is None
+    assert cache.get("basic", "B. Smith", "CSE 101") is not None
+
+    # the errored alias is asked again and can still match
+    def answered(query, variables, school_id, search_query="", partial_ok=False):
+        return {"t0": {"teachers": {"edges": [{"node": TEACHER}]}}}
+
+    monkeypatch.setattr(ratings.rmp_client, "query", answered)
+    (info,) = ratings.get_basic_professor_info_batch([("A. Lee", "CSE 101")])
+    assert info is not None and info.name == "Ana Lee"
@@ -0,0 +1,48 @@
+import sqlite3
+
+import pytest
+
+import main
+from sqlite_pool import ReadOnlyPool
+
+
+@pytest.fixture
+def grade_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "slugtistics.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # writes stay in the -wal file, the main file's mtime doesn't move
+    conn.execute("PRAGMA wal_autocheckpoint=0")
+    conn.execute('CREATE TABLE GradeData ("SubjectCatalogNbr" TEXT)')
+    conn.execute("INSERT INTO GradeData VALUES ('CSE 101')")
+    conn.commit()
+
+    monkeypatch.setattr(main, "DB_PATH", path)
+    monkeypatch.setattr(main, "db_pool", ReadOnlyPool(path, size=2))
+    main.response_cache.clear()
+    yield conn
+    conn.close()
+
+
+def test_unchanged_data_answers_304(grade_db):
+    client = main.app.test_client()
+    first = client.get("/classes")
+    assert first.status_code == 200
+    assert first.get_json() == ["CSE 101"]
+
+    again = client.get("/classes", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+
+def test_write_changes_etag(grade_db):
+    client = main.app.test_client()
+    first = client.get("/classes")
+
+    grade_db.execute("INSERT INTO GradeData VALUES ('CSE 130')")
+    grade_db.commit()
+
+    after = client.get("/classes", headers={"If-None-Match": first.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != first.headers["ETag"]
+    assert after.get_json() == ["CSE 101", "CSE 130"]
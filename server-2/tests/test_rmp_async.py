@@ -0,0 +1,124 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scraping import rate_limit, ratings
+from scraping.rate_limit import AdaptiveLimiter
+from scraping.rmp_client import RMPClient
+
+DELAY = 0.3
+
+
+class FakeRMP(BaseHTTPRequestHandler):
+    """answers every newSearch with one teacher named after the search text, DELAY seconds late"""
+
+    in_flight = 0
+    most_in_flight = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.most_in_flight = max(cls.most_in_flight, cls.in_flight)
+        try:
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            last_name, first_initial = body["variables"]["query"]["text"].split()
+            node = {
+                "id": f"T-{last_name}",
+                "firstName": first_initial.upper() + "ana",
+                "lastName": last_name.capitalize(),
+                "department": "Computer Science",
+                "avgRating": 4.0,
+                "avgDifficulty": 3.0,
+                "numRatings": 7,
+                "wouldTakeAgainPercent": 75.0,
+                "courseCodes": [{"courseName": "CSE101", "courseCount": 2}],
+                "ratingsDistribution": {"r1": 0, "r2": 1, "r3": 1, "r4": 2, "r5": 3},
+            }
+            time.sleep(DELAY)
+            answer = json.dumps({"data": {"newSearch": {"teachers": {"edges": [{"node": node}]}}}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(answer)))
+            self.end_headers()
+            self.wfile.write(answer)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_rmp(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRMP)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    FakeRMP.most_in_flight = 0
+
+    monkeypatch.setattr(ratings, "rmp_client", RMPClient(url=f"http://127.0.0.1:{server.server_port}/graphql"))
+    monkeypatch.setattr(ratings, "RATINGS_CACHE_PATH", "")
+    monkeypatch.setattr(ratings, "ratings_cache", None)
+    monkeypatch.setattr(ratings, "RMP_MATCH", "search")
+    # roomier than the default limits, so the test measures the client and not the pacing
+    monkeypatch.setitem(rate_limit._limiters, "127.0.0.1", AdaptiveLimiter(rate=50, concurrency=8))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_async_lookups_run_concurrently(fake_rmp):
+    names = ["A. Lee", "B. Park", "C. Diaz", "D. Kim", "E. Wong", "F. Shah", "Staff", "G. Ruiz", "H. Cho"]
+    lookups = [(name, "CSE 101") for name in names]
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        start = time.monotonic()
+        results = await ratings.aget_basic_professor_info_many(lookups)
+        elapsed = time.monotonic() - start
+        ticking.cancel()
+        return results, elapsed, ticks
+
+    results, elapsed, ticks = asyncio.run(run())
+
+    assert results[6] is None
+    assert [info.name for info in results if info] == [
+        "Aana Lee", "Bana Park", "Cana Diaz", "Dana Kim", "Eana Wong", "Fana Shah", "Gana Ruiz", "Hana Cho",
+    ]
+    # 8 searches at DELAY each would take 2.4s one after another
+    assert elapsed < 4 * DELAY
+    assert FakeRMP.most_in_flight >= 4
+    # the event loop kept running while the requests were out
+    assert ticks >= elapsed / 0.01 / 2
+
+
+def test_aquery_retries_and_raises(fake_rmp, monkeypatch):
+    client = ratings.rmp_client
+    monkeypatch.setattr("scraping.rmp_client.RMP_RETRY_BACKOFF", 0.01)
+
+    calls = []
+
+    def flaky(self):
+        calls.append(self.path)
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    monkeypatch.setattr(FakeRMP, "do_POST", flaky)
+    with pytest.raises(ratings.RMPError):
+        asyncio.run(client.aquery("query { x }", {}, ratings.SCHOOL_ID))
+    assert len(calls) == client.retries + 1
@@ -0,0 +1,80 @@
+import io
+
+import pytest
+import requests
+
+from benchmarks.replay import replay_session, synthesize
+from scraping import ucsc_courses
+
+
+def test_failed_detail_page_keeps_stored_sections(tmp_path):
+    directory = str(tmp_path)
+    synthesize(directory, courses=12, per_page=50, sections_every=3)
+    session = replay_session(directory)
+    get = session.get
+    failing = set()
+
+    def flaky_get(url, *args, **kwargs):
+        # course 0 has sections, its detail page times out
+        if "action=detail" in url and not failing:
+            failing.add(url)
+            raise requests.ConnectionError("timed out")
+        return get(url, *args, **kwargs)
+
+    session.get = flaky_get
+    courses = ucsc_courses.scrape_count(session=session, sharded=False, has_sections={}, max_workers=1)
+
+    assert len(courses) == 12
+    failed = [course for course in courses if course.discussion_sections is None]
+    assert [str(course.enroll_num) for course in failed] == ["20000"]
+    # every third synthetic class has sections, the ones that were fetched still have them
+    for course in courses:
+        if course not in failed and (int(course.enroll_num) - 20000) % 3 == 0:
+            assert course.discussion_sections
+
+
+def _answer(status, body=b""):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response.raw = io.BytesIO(body)
+    response.url = ucsc_courses.SEARCH_URL
+    return response
+
+
+def test_error_status_keeps_previous_details():
+    directory_page = _answer(200, b"<html><body></body></html>")
+    previous = {"hash": "abc", "etag": '"1"', "last_modified": None, "details": {"description": "kept"}}
+
+    class Session:
+        answer = _answer(503, b"<html><body>Service Unavailable</body></html>")
+
+        def get(self, url, headers=None):
+            return self.answer
+
+    session = Session()
+    details, fingerprint = ucsc_courses.fetch_course_page(session, "detail", previous)
+    assert details == {"description": "kept"}
+    assert fingerprint is previous
+
+    # nothing to keep: empty details and no fingerprint, so the next run fetches it again
+    details, fingerprint = ucsc_courses.fetch_course_page(session, "detail")
+    assert details == ucsc_courses.parse_course_page("")
+    assert fingerprint is None
+    assert ucsc_courses.process_course_page(session, "detail") == ucsc_courses.parse_course_page("")
+
+    session.answer = directory_page
+    _, fingerprint = ucsc_courses.fetch_course_page(session, "detail", previous)
+    assert fingerprint["hash"] != "abc"
+
+
+def test_listing_stops_on_error_status():
+    class Session:
+        def get(self, url, headers=None):
+            return _answer(200)
+
+        def post(self, url, data=None, stream=False):
+            return _answer(502, b"<html><body>Bad Gateway</body></html>")
+
+    with pytest.raises(requests.HTTPError):
+        list(ucsc_courses.iter_listing(Session(), "CSE"))
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import event
+
+import app as build_app
+import routes
+from config import app, db
+from models.data_models import CourseModel, TermModel
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(routes, "prereq_dict", {})
+    monkeypatch.setattr(routes, "prereq_build", None)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(TermModel(term=2248, build=1, is_active=True, status="ready"))
+        _add_build(1, "CSE 12")
+        db.session.commit()
+        yield db.session
+        db.session.remove()
+
+
+def _add_build(build, prereq):
+    for number in ("101", "102"):
+        db.session.add(
+            CourseModel(
+                term=2248,
+                build=build,
+                subject="CSE",
+                catalog_num=number,
+                enroll_num=int(f"{build}{number}"),
+                enrollment_reqs={"courses": [prereq]},
+            )
+        )
+
+
+def test_served_courses_is_one_select(session):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        courses = routes.served_courses(session).all()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    assert sorted(course.enroll_num for course in courses) == [1101, 1102]
+    # the build pointer isn't read on its own, a flip can't land between it and the rows
+    assert len([statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]) == 1
+
+
+def test_build_flip_serves_new_rows_and_prereqs(session):
+    assert routes.current_prereq_dict()["CSE 101"] == ["CSE 12"]
+
+    _add_build(2, "CSE 13S")
+    session.commit()
+    build_app.finish_build(2248, 2, 2)
+
+    assert sorted(course.enroll_num for course in routes.served_courses(session).all()) == [2101, 2102]
+    assert routes.served_courses(session, 2248).count() == 2
+    assert routes.served_courses(session, 2252).count() == 0
+    assert routes.current_prereq_dict()["CSE 101"] == ["CSE 13S"]
+
+
+def test_untracked_rows_served_before_first_build(session):
+    session.query(TermModel).delete()
+    session.commit()
+    assert routes.served_courses(session).count() == 2
+    assert routes.served_courses(session, 2248).count() == 0
@@ -0,0 +1,40 @@
+import sqlite3
+
+from sqlite_pool import ReadOnlyPool, data_version
+
+
+def wal_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # keep every commit in the -wal file, like between two checkpoints
+    conn.execute("PRAGMA wal_autocheckpoint=0")
+    conn.execute('CREATE TABLE GradeData ("SubjectCatalogNbr" TEXT)')
+    conn.execute("INSERT INTO GradeData VALUES ('CSE 101')")
+    conn.commit()
+    return conn
+
+
+def test_wal_commit_changes_data_version(tmp_path):
+    path = str(tmp_path / "slugtistics.db")
+    writer = wal_db(path)
+    pool = ReadOnlyPool(path, size=2)
+    before = data_version(path)
+    assert pool.query("SELECT COUNT(*) FROM GradeData", one=True)[0] == 1
+
+    writer.execute("INSERT INTO GradeData VALUES ('CSE 130')")
+    writer.commit()
+
+    assert data_version(path) != before
+    assert pool.query("SELECT COUNT(*) FROM GradeData", one=True)[0] == 2
+
+
+def test_pool_connections_are_read_only(tmp_path):
+    path = str(tmp_path / "slugtistics.db")
+    wal_db(path)
+    pool = ReadOnlyPool(path, size=1)
+    try:
+        pool.query("INSERT INTO GradeData VALUES ('CSE 30')")
+    except sqlite3.OperationalError:
+        pass
+    else:
+        raise AssertionError("pooled connection accepted a write")
@@ -0,0 +1,68 @@
+import sqlite3
+
+import pytest
+
+import main
+from grade_engine import GRADES
+from sqlite_pool import ReadOnlyPool
+
+# (term, instructor, A count): winter 2024 is the latest term, so a one year
+# window starts after winter 2023 and takes in spring 2023 on
+ROWS = [
+    ("Fall 2022", "Lee,Ana", 1),
+    ("Winter 2023", "Lee,Ana", 2),
+    ("Spring 2023", "Park,Bo", 4),
+    ("Fall 2023", "Lee,Ana", 8),
+    ("Winter 2024", "Park,Bo", 16),
+]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    path = str(tmp_path / "slugtistics.db")
+    conn = sqlite3.connect(path)
+    columns = ", ".join(f'"{grade}" INTEGER' for grade in GRADES)
+    conn.execute(f'CREATE TABLE GradeData ("SubjectCatalogNbr" TEXT, "Instructors" TEXT, "Term" TEXT, {columns})')
+    for term, instructor, a_count in ROWS:
+        conn.execute(
+            'INSERT INTO GradeData ("SubjectCatalogNbr", "Instructors", "Term", "A") VALUES (?, ?, ?, ?)',
+            ("CSE 101", instructor, term, a_count),
+        )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(main, "DB_PATH", path)
+    monkeypatch.setattr(main, "db_pool", ReadOnlyPool(path, size=2))
+    monkeypatch.setattr(main, "grade_indexes", None)
+    main.response_cache.clear()
+    return main.app.test_client()
+
+
+def _terms(response):
+    return [row["Term"] for row in response.get_json()]
+
+
+def test_years_window_at_a_year_boundary(client):
+    gpa = client.get("/class-gpa/CSE 101", query_string={"years": 1}).get_json()
+    # latest term 2240 (winter 2024) - 10 + 1
+    assert gpa["from"] == 2231
+    assert gpa["grades"]["A"] == 4 + 8 + 16
+
+    info = client.get("/class-info/CSE 101", query_string={"years": 1})
+    assert _terms(info) == ["Spring 2023", "Fall 2023", "Winter 2024"]
+
+    two_years = client.get("/class-info/CSE 101", query_string={"years": 2})
+    assert _terms(two_years) == ["Fall 2022", "Winter 2023", "Spring 2023", "Fall 2023", "Winter 2024"]
+
+
+def test_class_info_takes_the_same_range_as_class_gpa(client):
+    query = {"since": "Park,Bo", "to": "Fall 2023"}
+    gpa = client.get("/class-gpa/CSE 101", query_string=query).get_json()
+    info = client.get("/class-info/CSE 101", query_string=query)
+
+    assert (gpa["from"], gpa["to"]) == (2232, 2238)
+    assert _terms(info) == ["Spring 2023", "Fall 2023"]
+    assert sum(row["Grades"]["A"] for row in info.get_json()) == gpa["grades"]["A"]
+
+    missing = client.get("/class-info/CSE 101", query_string={"since": "Nobody,A"})
+    assert missing.status_code == 404